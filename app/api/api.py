@@ -5,9 +5,12 @@
 # Version: 0.1.0
 
 from fastapi import APIRouter
-from app.api.routes import optimization
+from app.api.routes import optimization, jobs, single_point, results
 
 api_router = APIRouter()
 
 # Include routers from different modules here
 api_router.include_router(optimization.router, prefix="/optimize", tags=["Optimization"])
+api_router.include_router(jobs.router, prefix="/optimize/jobs", tags=["Jobs"])
+api_router.include_router(single_point.router, prefix="/single-point", tags=["Single Point"])
+api_router.include_router(results.router, prefix="/results", tags=["Results"])
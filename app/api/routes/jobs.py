@@ -0,0 +1,285 @@
+# app/api/routes/jobs.py
+# This file defines the asynchronous job endpoints (submit / poll / result).
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+
+import json
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.api.routes.optimization import (
+    CLIENT_ID_DESCRIPTION, PRIORITY_DESCRIPTION, client_id, resolve_run_limits, structure_rejected_error,
+    validate_optimization_inputs, validate_priority, validate_response_mode
+)
+from app.schemas.jobs import JobStatusSchema
+from app.schemas.optimization import OptimizationResponseSchema
+from app.core.progress import follow_stage_records
+from app.core.admission import AdmissionRejected, memory_admission
+from app.core.preprocessing import StructureRejected, preprocess_structure, read_structure
+from app.services.dftb_service import run_estimate
+from app.services.run_store import run_store
+from app.utils.file_convertor import read_gen_file
+from app.services.job_manager import job_manager, ACTIVE_STATES, JOB_CANCELLED, JOB_FAILED, JOB_SUCCEEDED
+
+router = APIRouter()
+
+
+def _prepare_structure(content: bytes, method: str, primitive_cell: bool, remove_solvent: bool):
+    atoms = read_structure(content)
+    return preprocess_structure(atoms, method, primitive_cell, remove_solvent)[0]
+
+
+async def _check_admission(
+    input_file: UploadFile, method: str, fmax: float, primitive_cell: bool = False, remove_solvent: bool = False
+) -> dict:
+    """
+    Rejects unusable structures with a 422 error and structures predicted to need more
+    memory than a run may use with a 413 error, so the client learns it at submission
+    rather than when the job fails.
+
+    Returns:
+        The predicted resources of the run, which place the job in the queue.
+    """
+    try:
+        atoms = await run_in_threadpool(
+            _prepare_structure, await input_file.read(), method, primitive_cell, remove_solvent
+        )
+    except StructureRejected as e:
+        raise structure_rejected_error(e)
+    finally:
+        await input_file.seek(0)
+    estimate = run_estimate(atoms, method, fmax)
+    try:
+        memory_admission.check(estimate)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=413,
+            detail={"message": str(e), "estimate": e.estimate}
+        )
+    return estimate
+
+
+def _get_job_or_404(job_id: str) -> dict:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job '{job_id}' not found."
+        )
+    return job
+
+
+@router.post(
+    "",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=JobStatusSchema,
+    responses={
+        413: {"description": "The structure is predicted to need more memory than a single run may use."},
+        422: {"description": "The structure was rejected by the pre-run checks; the detail gives the reason."},
+    },
+    summary="Submit a DFTB+ Geometry Optimization Job",
+    description="Queues a CIF file for optimization and returns immediately with a job id. "
+                "Poll the job status and fetch the result once it has succeeded."
+)
+async def submit_optimization_job(
+    request: Request,
+    input_file: UploadFile = File(..., description="Input structure file in CIF format."),
+    fmax: float = Form(0.1, description="Force convergence threshold in eV/Angstrom."),
+    method: str = Form("GFN1-xTB", description="GFN-xTB method (GFN1-xTB or GFN2-xTB)."),
+    prerelax: bool = Form(False, description="Pre-relax the atoms with a cheap GFN1-xTB stage first."),
+    primitive_cell: bool = Form(False, description="Reduce the structure to its primitive cell first (needs spglib)."),
+    remove_solvent: bool = Form(False, description="Remove small solvent/guest molecules from the framework first."),
+    response_mode: str = Form(
+        "inline",
+        description="'inline' embeds the optimized CIF in the result; 'artifacts' lists download URLs instead."
+    ),
+    wall_time_limit_s: Optional[float] = Form(
+        None, gt=0, description="Wall-clock limit of the optimization in seconds (capped by the server)."
+    ),
+    cpu_time_limit_s: Optional[float] = Form(
+        None, gt=0, description="CPU-time limit of the DFTB+ processes in seconds (capped by the server)."
+    ),
+    priority: str = Form("normal", description=PRIORITY_DESCRIPTION),
+    x_client_id: Optional[str] = Header(None, description=CLIENT_ID_DESCRIPTION),
+):
+    validate_optimization_inputs(input_file, method)
+    validate_response_mode(response_mode)
+    validate_priority(priority)
+    estimate = await _check_admission(input_file, method, fmax, primitive_cell, remove_solvent)
+    wall_time_limit_s, cpu_time_limit_s = resolve_run_limits(wall_time_limit_s, cpu_time_limit_s)
+    job = job_manager.submit(
+        input_file=input_file, fmax=fmax, method=method, prerelax=prerelax, response_mode=response_mode,
+        wall_time_limit_s=wall_time_limit_s, cpu_time_limit_s=cpu_time_limit_s,
+        primitive_cell=primitive_cell, remove_solvent=remove_solvent,
+        tenant=client_id(request, x_client_id), priority=priority, estimate=estimate
+    )
+    return job_manager.get(job["job_id"])
+
+
+@router.post(
+    "/{job_id}/continue",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=JobStatusSchema,
+    responses={404: {"description": "No restart data is stored for this job."}},
+    summary="Continue a Finished Job as a New Job",
+    description="Queues a new job that restarts from the final geometry (and, for the same "
+                "method, the SCC charges) of a finished job. Works for any stored run id."
+)
+async def continue_optimization_job(
+    request: Request,
+    job_id: str,
+    fmax: Optional[float] = Form(None, description="Force convergence threshold; defaults to that of the previous run."),
+    method: Optional[str] = Form(None, description="GFN-xTB method; defaults to that of the previous run."),
+    response_mode: str = Form(
+        "inline",
+        description="'inline' embeds the optimized CIF in the result; 'artifacts' lists download URLs instead."
+    ),
+    wall_time_limit_s: Optional[float] = Form(
+        None, gt=0, description="Wall-clock limit of the optimization in seconds (capped by the server)."
+    ),
+    cpu_time_limit_s: Optional[float] = Form(
+        None, gt=0, description="CPU-time limit of the DFTB+ processes in seconds (capped by the server)."
+    ),
+    priority: str = Form("normal", description=PRIORITY_DESCRIPTION),
+    x_client_id: Optional[str] = Header(None, description=CLIENT_ID_DESCRIPTION),
+):
+    validate_response_mode(response_mode)
+    validate_priority(priority)
+    previous = run_store.load(job_id)
+    geometry = run_store.restart_files(job_id)["geometry"]
+    if previous is None or geometry is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No restart data stored for run '{job_id}'."
+        )
+    fmax = previous["fmax_eV_A"] if fmax is None else fmax
+    method = previous["method"] if method is None else method
+    if method not in ["GFN1-xTB", "GFN2-xTB"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid method '{method}'. Please choose 'GFN1-xTB' or 'GFN2-xTB'."
+        )
+    wall_time_limit_s, cpu_time_limit_s = resolve_run_limits(wall_time_limit_s, cpu_time_limit_s)
+    estimate = await run_in_threadpool(lambda: run_estimate(read_gen_file(geometry), method, fmax))
+    job = job_manager.submit_continuation(
+        job_id, fmax, method, response_mode,
+        wall_time_limit_s=wall_time_limit_s, cpu_time_limit_s=cpu_time_limit_s,
+        tenant=client_id(request, x_client_id), priority=priority, estimate=estimate
+    )
+    return job_manager.get(job["job_id"])
+
+
+@router.get(
+    "/{job_id}",
+    response_model=JobStatusSchema,
+    responses={404: {"description": "Unknown job id."}},
+    summary="Get Job Status and Progress",
+)
+async def get_optimization_job(job_id: str):
+    return _get_job_or_404(job_id)
+
+
+@router.delete(
+    "/{job_id}",
+    response_model=JobStatusSchema,
+    responses={
+        202: {"description": "The running job is being stopped."},
+        404: {"description": "Unknown job id."},
+        409: {"description": "The job has already finished."},
+    },
+    summary="Cancel a Job",
+    description="Cancels a queued job right away. A running job is stopped by killing its "
+                "DFTB+ process; its status turns 'cancelled' shortly after, with the last "
+                "geometry step reached in 'partial_progress'."
+)
+async def cancel_optimization_job(job_id: str, response: Response):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job '{job_id}' not found."
+        )
+    if job["status"] not in ACTIVE_STATES + (JOB_CANCELLED,):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job '{job_id}' has already {job['status']}."
+        )
+    # Returned through response_model, so only the documented fields reach the client
+    response.status_code = status.HTTP_200_OK if job["status"] == JOB_CANCELLED else status.HTTP_202_ACCEPTED
+    return job_manager.get(job_id)
+
+
+@router.get(
+    "/{job_id}/result",
+    responses={
+        200: {
+            "description": "The job succeeded.",
+            "model": OptimizationResponseSchema,
+        },
+        404: {"description": "Unknown job id."},
+        409: {"description": "The job has not finished yet or was cancelled."},
+        422: {"description": "The DFTB+ calculation failed."},
+    },
+    summary="Get the Result of a Finished Job",
+)
+async def get_optimization_job_result(job_id: str):
+    job = _get_job_or_404(job_id)
+
+    if job["status"] == JOB_FAILED:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Job '{job_id}' failed: {job['error']}"
+        )
+    if job["status"] == JOB_CANCELLED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job '{job_id}' was cancelled."
+        )
+    if job["status"] != JOB_SUCCEEDED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job '{job_id}' is still {job['status']}."
+        )
+
+    return JSONResponse(status_code=status.HTTP_200_OK, content=job_manager.get_result(job_id))
+
+
+@router.get(
+    "/{job_id}/progress",
+    responses={
+        200: {
+            "description": "A Server-Sent Events stream of geometry optimization steps.",
+            "content": {"text/event-stream": {}},
+        },
+        404: {"description": "Unknown job id."},
+    },
+    summary="Stream Geometry Optimization Progress",
+    description="Follows the DFTB+ output of every stage of a job (pre-relaxation, coarse SCC, "
+                "final) in order and emits one `step` event per geometry step (stage, step "
+                "index, total energy, max gradient, SCC iterations, wall time). "
+                "A final `end` event carries the job status. Steps completed before the "
+                "client connected are replayed first."
+)
+async def stream_optimization_job_progress(job_id: str):
+    _get_job_or_404(job_id)
+
+    def is_finished():
+        job = job_manager.store.load(job_id)
+        return job is None or job["status"] not in ACTIVE_STATES
+
+    async def event_stream():
+        async for record in follow_stage_records(lambda: job_manager.store.stdout_log_paths(job_id), is_finished):
+            yield f"event: step\ndata: {json.dumps(record)}\n\n"
+        job = job_manager.store.load(job_id)
+        end = {"job_id": job_id, "status": job["status"] if job else None}
+        yield f"event: end\ndata: {json.dumps(end)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -5,20 +5,104 @@
 # Version: 0.1.0
 
 
+import io
 import os
-import shutil
+import json
 import uuid
-import base64
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status
-from fastapi.responses import JSONResponse
+import asyncio
+from typing import Awaitable, List, Optional, Tuple
+
+import numpy as np
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 from app.schemas.optimization import OptimizationResponseSchema
-from app.services import dftb_service
-from app.utils.logger import console
+from app.services import dftb_service, batch_service
+from app.services.run_store import ARTIFACTS, run_store
+from app.services.job_manager import job_manager
+from app.core.dftb_runner import dftb_limiter, core_allocator
+from app.core.run_limits import RunLimitExceeded, enforce_limits, resolve_limit
+from app.core.executors import executor
+from app.core.socket_driver import socket_pool
+from app.core.admission import AdmissionRejected, memory_admission
+from app.core.preprocessing import StructureRejected
+from app.core.scheduler import DEFAULT_TENANT, PRIORITY_CLASSES, PRIORITY_LOW, scheduler, scheduling
+from app.core import artifacts, trajectory
+from app.core.workspace import workspace_manager
+from app.utils.logger import console, set_request_id
+from app.core import config
+from app.core.config import WORKSPACE_BASE
 
 router = APIRouter()
 
-WORKSPACE_BASE = os.path.join("app", "workspace")
+# Status nginx uses for requests the client abandoned; only ever seen in logs and metrics.
+CLIENT_CLOSED_REQUEST = 499
+
+PRIORITY_DESCRIPTION = "Scheduling class: 'high', 'normal' or 'low'."
+CLIENT_ID_DESCRIPTION = "Client (tenant) the optimization is scheduled for; defaults to the client address."
+
+
+def validate_optimization_inputs(input_file: UploadFile, method: str):
+    """
+    Rejects unsupported methods and non-CIF uploads with a 400 error.
+    """
+    if method not in ["GFN1-xTB", "GFN2-xTB"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid method '{method}'. Please choose 'GFN1-xTB' or 'GFN2-xTB'."
+        )
+
+    if not input_file.filename or not input_file.filename.lower().endswith('.cif'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid file type. Please upload a .cif file."
+        )
+
+
+def structure_rejected_error(e: StructureRejected) -> HTTPException:
+    """422 error telling the client why its structure was rejected before any run."""
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail={"message": str(e), "reason": e.reason, "details": e.details}
+    )
+
+
+def validate_response_mode(response_mode: str):
+    if response_mode not in dftb_service.RESPONSE_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid response_mode '{response_mode}'. Please choose 'inline' or 'artifacts'."
+        )
+
+
+def validate_priority(priority: str):
+    if priority not in PRIORITY_CLASSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid priority '{priority}'. Please choose 'high', 'normal' or 'low'."
+        )
+
+
+def client_id(request: Request, x_client_id: Optional[str]) -> str:
+    """
+    Tenant the work of a request is scheduled for: the X-Client-Id header, or the
+    client's address without it.
+    """
+    if x_client_id and x_client_id.strip():
+        return x_client_id.strip()
+    return request.client.host if request.client else DEFAULT_TENANT
+
+
+def resolve_run_limits(
+    wall_time_limit_s: Optional[float], cpu_time_limit_s: Optional[float]
+) -> Tuple[Optional[float], Optional[float]]:
+    """Requested limits of a run, capped at (or defaulting to) the configured maximums."""
+    return (
+        resolve_limit(wall_time_limit_s, config.RUN_WALL_TIME_LIMIT_S),
+        resolve_limit(cpu_time_limit_s, config.RUN_CPU_TIME_LIMIT_S),
+    )
+
 
 @router.post(
     "/",
@@ -28,72 +112,152 @@ WORKSPACE_BASE = os.path.join("app", "workspace")
             "model": OptimizationResponseSchema,
         },
         422: {
-            "description": "Calculation failed due to input structure or resource issues.",
+            "description": "The structure was rejected by the pre-run checks (the detail gives the reason), "
+                           "or the calculation failed due to input structure or resource issues.",
             "content": {
                 "application/json": {
                     "example": {"detail": "DFTB+ calculation failed for the provided structure..."}
                 }
             },
         },
+        413: {"description": "The structure is predicted to need more memory than a single run may use."},
         500: {
             "description": "An unexpected internal server error occurred.",
-        }
+        },
+        504: {"description": "The run exceeded its wall-clock or CPU-time limit; the detail reports how far it got."},
     },
     summary="Run DFTB+ Geometry Optimization and Get All Results",
     description="Submits a CIF file for optimization. On success, returns a single JSON "
                 "response containing analysis results and the Base64-encoded "
-                "optimized structure file."
+                "optimized structure file, or with response_mode=artifacts, URLs from which "
+                "the structure files are downloaded. The calculation is stopped if the "
+                "client disconnects."
 )
 async def run_dftb_optimization_and_get_results(
+    request: Request,
     input_file: UploadFile = File(..., description="Input structure file in CIF format."),
     fmax: float = Form(0.1, description="Force convergence threshold in eV/Angstrom."),
-    method: str = Form("GFN1-xTB", description="GFN-xTB method (GFN1-xTB or GFN2-xTB).")
+    method: str = Form("GFN1-xTB", description="GFN-xTB method (GFN1-xTB or GFN2-xTB)."),
+    prerelax: bool = Form(False, description="Pre-relax the atoms with a cheap GFN1-xTB stage first."),
+    primitive_cell: bool = Form(False, description="Reduce the structure to its primitive cell first (needs spglib)."),
+    remove_solvent: bool = Form(False, description="Remove small solvent/guest molecules from the framework first."),
+    response_mode: str = Form(
+        "inline",
+        description="'inline' embeds the optimized CIF Base64-encoded; 'artifacts' returns "
+                    "download URLs for the CIF, GEN and trajectory instead."
+    ),
+    wall_time_limit_s: Optional[float] = Form(
+        None, gt=0, description="Wall-clock limit of the optimization in seconds (capped by the server)."
+    ),
+    cpu_time_limit_s: Optional[float] = Form(
+        None, gt=0, description="CPU-time limit of the DFTB+ processes in seconds (capped by the server)."
+    ),
+    priority: str = Form("normal", description=PRIORITY_DESCRIPTION),
+    x_client_id: Optional[str] = Header(None, description=CLIENT_ID_DESCRIPTION),
 ):
     """
     Receives a CIF file and parameters, performs a DFTB+ geometry optimization,
     and returns a single, self-contained JSON response.
     """
-    if method not in ["GFN1-xTB", "GFN2-xTB"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid method '{method}'. Please choose 'GFN1-xTB' or 'GFN2-xTB'."
-        )
-
-    if not input_file.filename or not input_file.filename.lower().endswith('.cif'):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Please upload a .cif file."
-        )
+    validate_optimization_inputs(input_file, method)
+    validate_response_mode(response_mode)
+    validate_priority(priority)
 
     request_id = str(uuid.uuid4())
-    workspace_dir = os.path.join(WORKSPACE_BASE, request_id)
-    os.makedirs(workspace_dir)
+    set_request_id(request_id)
 
-    try:
-        parsed_data, output_cif_path = await dftb_service.perform_optimization(
-            input_file=input_file, fmax=fmax, method=method, workspace_dir=workspace_dir
-        )
-        with open(output_cif_path, 'rb') as f:
-            cif_content_bytes = f.read()
+    with scheduling(client_id(request, x_client_id), priority):
+        async with workspace_manager.workspace(request_id) as workspace_dir:
+            return await _optimization_response(
+                request_id, input_file.filename, method, fmax,
+                dftb_service.perform_optimization(
+                    input_file=input_file, fmax=fmax, method=method,
+                    workspace_dir=workspace_dir, run_id=request_id, prerelax=prerelax,
+                    primitive_cell=primitive_cell, remove_solvent=remove_solvent
+                ),
+                prerelax=prerelax,
+                response_mode=response_mode,
+                request=request,
+                workspace_dir=workspace_dir,
+                limits=resolve_run_limits(wall_time_limit_s, cpu_time_limit_s),
+            )
 
-        cif_b64_string = base64.b64encode(cif_content_bytes).decode('utf-8')
 
+async def cancel_on_disconnect(request: Request, task: asyncio.Task):
+    # With the body read, the next ASGI message only arrives when the client goes away.
+    # (Request.is_disconnected() cannot see it through the HTTP middleware.)
+    message = await request.receive()
+    if message["type"] == "http.disconnect" and not task.done():
+        task.cancel()
+
+
+async def _optimization_response(
+    request_id: str,
+    original_filename: Optional[str],
+    method: str,
+    fmax: float,
+    optimization: Awaitable[Tuple[dict, bytes, dict]],
+    prerelax: bool = False,
+    response_mode: str = dftb_service.RESPONSE_INLINE,
+    request: Optional[Request] = None,
+    workspace_dir: Optional[str] = None,
+    limits: Tuple[Optional[float], Optional[float]] = (None, None),
+) -> JSONResponse:
+    """
+    Awaits an optimization within its (wall-clock, CPU-time) limits and maps failures
+    to HTTP errors. If the client of `request` disconnects, the optimization is
+    cancelled, which stops its DFTB+ process.
+    """
+    task = asyncio.ensure_future(enforce_limits(optimization, *limits))
+    watcher = asyncio.create_task(cancel_on_disconnect(request, task)) if request is not None else None
+    try:
+        parsed_data, output_cif, run_info = await task
         # Construct the successful response object.
-        response_data = {
-            "status": "success",
-            "request_id": request_id,
-            "input_parameters": {
-                "original_filename": input_file.filename,
-                "method": method,
-                "fmax_eV_A": fmax
-            },
-            "detailed_results": parsed_data,
-            "optimized_structure_cif_b64": cif_b64_string,
-        }
+        response_data = await run_in_threadpool(
+            dftb_service.build_response_payload,
+            request_id=request_id,
+            original_filename=original_filename,
+            method=method,
+            fmax=fmax,
+            parsed_data=parsed_data,
+            output_cif=output_cif,
+            run_info=run_info,
+            prerelax=prerelax,
+            response_mode=response_mode,
+        )
         return JSONResponse(status_code=status.HTTP_200_OK, content=response_data)
 
+    except asyncio.CancelledError:
+        current = asyncio.current_task()
+        if not task.cancelled() or (current is not None and current.cancelling()):
+            raise
+        progress = dftb_service.partial_progress(workspace_dir) if workspace_dir else None
+        console.warning("Client of request %s disconnected; optimization stopped at %s.", request_id, progress)
+        return JSONResponse(
+            status_code=CLIENT_CLOSED_REQUEST,
+            content={"detail": "Client closed the request.", "partial_progress": progress},
+        )
+    except RunLimitExceeded as e:
+        console.error("Request %s stopped: %s", request_id, e)
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail={
+                "message": str(e),
+                "termination": f"{e.limit}_limit",
+                "partial_progress": dftb_service.partial_progress(workspace_dir) if workspace_dir else None,
+            }
+        )
+    except StructureRejected as e:
+        console.warning("Rejected structure of request %s (%s): %s", request_id, e.reason, e)
+        raise structure_rejected_error(e)
+    except AdmissionRejected as e:
+        console.warning("Rejected request %s: %s", request_id, e)
+        raise HTTPException(
+            status_code=413,
+            detail={"message": str(e), "estimate": e.estimate}
+        )
     except RuntimeError as e:
-        console.error(f"DFTB+ runtime error for request {request_id}: {e}")
+        console.error("DFTB+ runtime error for request %s: %s", request_id, e)
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail=f"DFTB+ calculation failed for the provided structure. This is likely due to "
@@ -101,12 +265,337 @@ async def run_dftb_optimization_and_get_results(
                    f"Internal error: {str(e)}"
         )
     except Exception as e:
-        console.exception(f"An unexpected error occurred for request {request_id}")
+        console.exception("An unexpected error occurred for request %s", request_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An unexpected server error occurred: {str(e)}"
         )
     finally:
-        if os.path.exists(workspace_dir):
-            shutil.rmtree(workspace_dir)
-            console.info(f"Cleaned up workspace directory: {workspace_dir}")
\ No newline at end of file
+        if watcher is not None:
+            watcher.cancel()
+
+
+@router.post(
+    "/runs/{run_id}/continue",
+    responses={
+        200: {
+            "description": "The continued optimization was successful.",
+            "model": OptimizationResponseSchema,
+        },
+        404: {"description": "No restart data is stored for this run."},
+        422: {"description": "Calculation failed."},
+        504: {"description": "The run exceeded its wall-clock or CPU-time limit."},
+    },
+    summary="Continue a Previous Optimization",
+    description="Restarts an earlier run (identified by its request_id or job_id) from its final "
+                "geometry. When the method is unchanged, the SCC starts from the stored charges. "
+                "Use it for runs that hit MaxSteps without converging or to tighten fmax."
+)
+async def continue_dftb_optimization(
+    request: Request,
+    run_id: str,
+    fmax: Optional[float] = Form(None, description="Force convergence threshold; defaults to that of the previous run."),
+    method: Optional[str] = Form(None, description="GFN-xTB method; defaults to that of the previous run."),
+    response_mode: str = Form(
+        "inline",
+        description="'inline' embeds the optimized CIF Base64-encoded; 'artifacts' returns "
+                    "download URLs for the CIF, GEN and trajectory instead."
+    ),
+    wall_time_limit_s: Optional[float] = Form(
+        None, gt=0, description="Wall-clock limit of the optimization in seconds (capped by the server)."
+    ),
+    cpu_time_limit_s: Optional[float] = Form(
+        None, gt=0, description="CPU-time limit of the DFTB+ processes in seconds (capped by the server)."
+    ),
+    priority: str = Form("normal", description=PRIORITY_DESCRIPTION),
+    x_client_id: Optional[str] = Header(None, description=CLIENT_ID_DESCRIPTION),
+):
+    validate_response_mode(response_mode)
+    validate_priority(priority)
+    previous = run_store.load(run_id)
+    if previous is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No restart data stored for run '{run_id}'."
+        )
+    fmax = previous["fmax_eV_A"] if fmax is None else fmax
+    method = previous["method"] if method is None else method
+    if method not in ["GFN1-xTB", "GFN2-xTB"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid method '{method}'. Please choose 'GFN1-xTB' or 'GFN2-xTB'."
+        )
+
+    request_id = str(uuid.uuid4())
+    set_request_id(request_id)
+
+    with scheduling(client_id(request, x_client_id), priority):
+        async with workspace_manager.workspace(request_id) as workspace_dir:
+            return await _optimization_response(
+                request_id, None, method, fmax,
+                dftb_service.continue_optimization(
+                    run_id, fmax, method, workspace_dir, run_id=request_id
+                ),
+                response_mode=response_mode,
+                request=request,
+                workspace_dir=workspace_dir,
+                limits=resolve_run_limits(wall_time_limit_s, cpu_time_limit_s),
+            )
+
+@router.get(
+    "/runs/{run_id}/artifacts/{kind}",
+    responses={
+        200: {"description": "The artifact file."},
+        206: {"description": "The requested byte range of the artifact."},
+        304: {"description": "The client's copy (If-None-Match) is current."},
+        400: {"description": "Unsupported compression."},
+        404: {"description": "The run or artifact is not stored."},
+    },
+    summary="Download a Stored Run Artifact",
+    description="Streams the optimized CIF ('cif'), the final DFTB+ geometry ('gen') or the "
+                "optimization trajectory ('trajectory', XYZ) of a finished run from disk. "
+                "Compression is negotiated via Accept-Encoding (gzip, or zstd when available) "
+                "or forced with the 'compression' parameter; ETag/If-None-Match and Range "
+                "requests are supported."
+)
+async def download_run_artifact(
+    request: Request,
+    run_id: str,
+    kind: str,
+    compression: Optional[str] = Query(
+        None, description="'gzip', 'zstd' or 'none'; by default negotiated from Accept-Encoding."
+    ),
+):
+    path = run_store.artifact_path(run_id, kind)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No '{kind}' artifact stored for run '{run_id}'."
+        )
+
+    if compression is None:
+        encoding = artifacts.negotiate_encoding(request.headers.get("accept-encoding", ""))
+    elif compression == "none":
+        encoding = None
+    elif compression in artifacts.supported_encodings():
+        encoding = compression
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported compression '{compression}'. Choose one of "
+                   f"{artifacts.supported_encodings() + ['none']}."
+        )
+
+    name, media_type = ARTIFACTS[kind]
+    if encoding is not None:
+        path = await run_in_threadpool(artifacts.compressed_copy, path, encoding)
+    return artifacts.file_response(request, path, media_type, f"{run_id}-{name}", encoding)
+
+
+@router.get(
+    "/runs/{run_id}/trajectory",
+    responses={
+        200: {
+            "description": "The selected frames as JSON (NaN entries as null) or as an .npz archive.",
+            "content": {"application/json": {}, "application/octet-stream": {}},
+        },
+        400: {"description": "Unknown field or format."},
+        404: {"description": "No trajectory is stored for this run."},
+    },
+    summary="Get the Optimization Trajectory of a Run",
+    description="Returns per-step positions, cells, energies, maximal force components, forces "
+                "and Mulliken charges of a finished run, sliced by frame range. Frames are read "
+                "from memory-mapped arrays, so only the selected range is loaded."
+)
+async def get_run_trajectory(
+    run_id: str,
+    start: int = Query(0, description="First frame (negative values count from the end)."),
+    stop: Optional[int] = Query(None, description="Frame after the last one returned."),
+    step: int = Query(1, ge=1, description="Stride between returned frames."),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated subset of " + ", ".join(trajectory.FRAME_ARRAYS) + "."
+    ),
+    format: str = Query("json", description="'json' or 'npz'."),
+):
+    directory = run_store.trajectory_dir(run_id)
+    metadata = trajectory.load_metadata(directory)
+    if metadata is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No trajectory stored for run '{run_id}'."
+        )
+    selected = [name.strip() for name in fields.split(",") if name.strip()] if fields else list(trajectory.FRAME_ARRAYS)
+    unknown = set(selected) - set(trajectory.FRAME_ARRAYS)
+    if unknown or format not in ("json", "npz"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown field(s) {sorted(unknown)}." if unknown else f"Invalid format '{format}'. Please choose 'json' or 'npz'."
+        )
+
+    frames = await run_in_threadpool(trajectory.load_frames, directory, start, stop, step, selected)
+    frame_range = range(metadata["n_frames"])[start:stop:step]
+    if format == "npz":
+        buffer = io.BytesIO()
+        np.savez(buffer, frame_indices=np.asarray(frame_range), **frames)
+        return Response(
+            content=buffer.getvalue(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="{run_id}-trajectory.npz"'},
+        )
+    return {
+        "run_id": run_id,
+        **metadata,
+        "frame_indices": list(frame_range),
+        "data": {
+            name: np.where(np.isnan(array), None, array.astype(object)).tolist()
+            for name, array in frames.items()
+        },
+    }
+
+
+@router.post(
+    "/batch",
+    responses={
+        200: {
+            "description": "Newline-delimited JSON: one line per structure in completion order, "
+                           "then a final line with status 'batch_finished'.",
+            "content": {"application/x-ndjson": {}},
+        },
+        400: {"description": "No structures were provided or the parameters are malformed."},
+    },
+    summary="Run DFTB+ Geometry Optimizations for Many Structures",
+    description="Accepts several CIF files and/or one zip/tar archive of CIF files. All structures "
+                "are optimized concurrently on the DFTB+ worker pool and each result is streamed "
+                "back as an NDJSON line as soon as it finishes. Failures are reported inline "
+                "without aborting the batch."
+)
+async def run_batch_optimization(
+    request: Request,
+    input_files: List[UploadFile] = File([], description="CIF files to optimize."),
+    archive: Optional[UploadFile] = File(None, description="A .zip, .tar, .tar.gz or .tgz archive of CIF files."),
+    fmax: float = Form(0.1, description="Shared force convergence threshold in eV/Angstrom."),
+    method: str = Form("GFN1-xTB", description="Shared GFN-xTB method (GFN1-xTB or GFN2-xTB)."),
+    prerelax: bool = Form(False, description="Shared switch for the cheap GFN1-xTB pre-relaxation stage."),
+    primitive_cell: bool = Form(False, description="Shared switch for reducing structures to their primitive cell."),
+    remove_solvent: bool = Form(False, description="Shared switch for removing small solvent/guest molecules."),
+    parameters: Optional[str] = Form(
+        None,
+        description='Optional per-structure overrides as JSON, e.g. {"a.cif": {"fmax": 0.05, "method": "GFN2-xTB", "prerelax": true}}.'
+    ),
+    response_mode: str = Form(
+        "inline",
+        description="'inline' embeds the optimized CIF Base64-encoded; 'artifacts' returns "
+                    "download URLs for the CIF, GEN and trajectory instead."
+    ),
+    wall_time_limit_s: Optional[float] = Form(
+        None, gt=0, description="Shared wall-clock limit per structure in seconds (capped by the server)."
+    ),
+    cpu_time_limit_s: Optional[float] = Form(
+        None, gt=0, description="Shared CPU-time limit per structure in seconds (capped by the server)."
+    ),
+    priority: str = Form(
+        PRIORITY_LOW, description=PRIORITY_DESCRIPTION + " Batches default to 'low', so single requests go first."
+    ),
+    x_client_id: Optional[str] = Header(None, description=CLIENT_ID_DESCRIPTION),
+):
+    """
+    Receives many structures and streams their optimization results as NDJSON.
+    """
+    validate_response_mode(response_mode)
+    validate_priority(priority)
+    overrides = {}
+    if parameters:
+        try:
+            overrides = json.loads(parameters)
+            if not isinstance(overrides, dict) or not all(isinstance(v, dict) for v in overrides.values()):
+                raise ValueError("expected an object mapping file names to parameter objects")
+            for values in overrides.values():
+                unknown = set(values) - {
+                    "fmax", "method", "prerelax", "primitive_cell", "remove_solvent",
+                    "wall_time_limit_s", "cpu_time_limit_s",
+                }
+                if unknown:
+                    raise ValueError(f"unknown parameter(s) {sorted(unknown)}")
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid 'parameters' field: {e}"
+            )
+
+    if archive is not None and not batch_service.is_archive(str(archive.filename)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid archive type. Please upload a .zip, .tar, .tar.gz or .tgz file."
+        )
+
+    batch_id = str(uuid.uuid4())
+    set_request_id(batch_id)
+    batch_dir = os.path.join(WORKSPACE_BASE, batch_id)
+    inputs_dir = os.path.join(batch_dir, "inputs")
+    os.makedirs(inputs_dir, exist_ok=True)
+
+    try:
+        input_paths = await run_in_threadpool(batch_service.collect_structures, input_files, archive, inputs_dir)
+    except Exception as e:
+        workspace_manager.discard(batch_dir)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Could not read the uploaded structures: {str(e)}"
+        )
+    if not input_paths:
+        workspace_manager.discard(batch_dir)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No structures found. Upload CIF files or an archive containing CIF files."
+        )
+    console.info("Batch %s: %d structure(s) received.", batch_id, len(input_paths))
+
+    async def ndjson_lines():
+        async for result in batch_service.run_batch(
+            batch_id, input_paths, fmax, method, overrides, batch_dir,
+            default_prerelax=prerelax, response_mode=response_mode,
+            default_preprocessing={"primitive_cell": primitive_cell, "remove_solvent": remove_solvent},
+            default_limits={"wall_time_limit_s": wall_time_limit_s, "cpu_time_limit_s": cpu_time_limit_s},
+            tenant=client_id(request, x_client_id), priority=priority,
+        ):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
+@router.get(
+    "/queue",
+    summary="Get DFTB+ Execution Queue Depth",
+    description="Reports how many DFTB+ processes are running, how many are waiting for a "
+                "free slot, how much predicted memory is reserved, how many workspaces are in use or "
+                "waiting for cleanup, how many asynchronous jobs are queued and how many warm socket-driven "
+                "DFTB+ processes are idle or busy, and how many optimizations wait in the fair-share "
+                "scheduler. With the queue "
+                "executor, also the state of the shared work queue and its live workers."
+)
+async def get_queue_status():
+    return {
+        "executor": await run_in_threadpool(executor.stats),
+        "dftb_processes": dftb_limiter.stats(),
+        "cores": core_allocator.stats(),
+        "jobs_queued": job_manager.queued_count,
+        "memory": memory_admission.stats(),
+        "workspaces": workspace_manager.stats(),
+        "socket_processes": socket_pool.stats(),
+        "scheduler": scheduler.stats(tenants=False),
+    }
+
+
+@router.get(
+    "/queue/tenants",
+    summary="Get Per-Client Scheduling Statistics",
+    description="Reports the fair-share schedulers of optimizations and of asynchronous jobs: "
+                "slots, running and waiting work per priority class, and per client (X-Client-Id or "
+                "address) the waiting and running work, mean and maximum queue wait, mean turnaround "
+                "(queue wait plus run time) and finished work per minute over the statistics window."
+)
+async def get_tenant_stats():
+    return {
+        "optimizations": scheduler.stats(),
+        "jobs": job_manager.scheduler.stats(),
+    }
@@ -0,0 +1,212 @@
+# app/api/routes/results.py
+# This file defines the endpoints that query the store of finished optimizations.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+
+import json
+from typing import Optional
+
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+
+from app.api.routes.optimization import structure_rejected_error
+from app.core import config
+from app.core.preprocessing import StructureRejected, preprocess_structure, read_structure
+from app.services.dftb_service import structure_identity
+from app.services.results_store import INCLUDES, ORDER_COLUMNS, InvalidQuery, results_store
+
+router = APIRouter()
+
+
+def _require_store():
+    if not results_store.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="The results store is disabled (DFTBOPT_RESULTS_DB_PATH is empty)."
+        )
+
+
+def _parse_include(include: Optional[str]) -> tuple:
+    return tuple(name.strip() for name in include.split(",") if name.strip()) if include else ()
+
+
+@router.get(
+    "",
+    responses={
+        200: {
+            "description": "Newline-delimited JSON: one line per stored result, then a final line "
+                           "with status 'page_finished', the row count and the cursor of the next page.",
+            "content": {"application/x-ndjson": {}},
+        },
+        400: {"description": "Unknown ordering or include, or an invalid cursor."},
+        404: {"description": "The results store is disabled."},
+    },
+    summary="Query Stored Optimization Results",
+    description="Filters the stored results of finished optimizations by formula, method, "
+                "structure fingerprint, convergence and energy ranges and streams one page of "
+                "them. Pages are keyset-paginated: pass the 'next_cursor' of the final line to "
+                "get the next page. Parsed results, run info and the optimized CIF are only "
+                "returned when listed in 'include'."
+)
+async def query_results(
+    formula: Optional[str] = Query(None, description="Chemical formula as written by ASE, e.g. 'H2O' or 'Si8'."),
+    method: Optional[str] = Query(None, description="GFN-xTB method."),
+    fingerprint: Optional[str] = Query(None, description="Canonical structure fingerprint (see /lookup)."),
+    convergence_status: Optional[str] = Query(None, description="'Geometry converged' or 'Not converged'."),
+    calculation_status: Optional[str] = Query(None, description="Status reported by the parser, e.g. 'Success'."),
+    scc_converged: Optional[bool] = Query(None),
+    min_total_energy_eV: Optional[float] = Query(None),
+    max_total_energy_eV: Optional[float] = Query(None),
+    min_total_mermin_free_energy_eV: Optional[float] = Query(None),
+    max_total_mermin_free_energy_eV: Optional[float] = Query(None),
+    min_force_related_energy_eV: Optional[float] = Query(None),
+    max_force_related_energy_eV: Optional[float] = Query(None),
+    min_band_energy_eV: Optional[float] = Query(None),
+    max_band_energy_eV: Optional[float] = Query(None),
+    created_after: Optional[float] = Query(None, description="Unix time."),
+    created_before: Optional[float] = Query(None, description="Unix time."),
+    order_by: str = Query("id", description="One of " + ", ".join(ORDER_COLUMNS) + "."),
+    descending: bool = Query(False),
+    limit: int = Query(100, ge=1, description="Rows per page (capped by the server)."),
+    cursor: Optional[str] = Query(None, description="'next_cursor' of the previous page."),
+    include: Optional[str] = Query(
+        None, description="Comma-separated subset of " + ", ".join(INCLUDES) + "."
+    ),
+):
+    _require_store()
+    filters = {
+        "formula": formula,
+        "method": method,
+        "fingerprint": fingerprint,
+        "convergence_status": convergence_status,
+        "calculation_status": calculation_status,
+        "scc_converged": scc_converged,
+        "min_total_energy_eV": min_total_energy_eV,
+        "max_total_energy_eV": max_total_energy_eV,
+        "min_total_mermin_free_energy_eV": min_total_mermin_free_energy_eV,
+        "max_total_mermin_free_energy_eV": max_total_mermin_free_energy_eV,
+        "min_force_related_energy_eV": min_force_related_energy_eV,
+        "max_force_related_energy_eV": max_force_related_energy_eV,
+        "min_band_energy_eV": min_band_energy_eV,
+        "max_band_energy_eV": max_band_energy_eV,
+        "created_after": created_after,
+        "created_before": created_before,
+    }
+    limit = min(limit, config.RESULTS_MAX_PAGE)
+    try:
+        rows = results_store.query(filters, order_by, descending, limit, cursor, _parse_include(include))
+    except InvalidQuery as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    # A sync generator: Starlette reads it in a worker thread, so rows are fetched lazily
+    # without blocking the event loop.
+    def ndjson_lines():
+        count = 0
+        for row in rows:
+            if "id" not in row:
+                yield json.dumps({"status": "page_finished", "count": count, **row}) + "\n"
+            else:
+                count += 1
+                yield json.dumps(row) + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
+@router.get(
+    "/stats",
+    summary="Count Stored Results",
+    description="Number of stored results in total, per method and per convergence status."
+)
+async def get_results_stats():
+    return await run_in_threadpool(results_store.stats)
+
+
+@router.post(
+    "/lookup",
+    responses={
+        400: {"description": "Invalid file type."},
+        404: {"description": "The results store is disabled."},
+        422: {"description": "The structure was rejected by the pre-run checks."},
+    },
+    summary="Find Stored Results for a Structure",
+    description="Runs the pre-run structure checks and clean-up on an uploaded CIF, computes "
+                "its fingerprint and returns the stored results of the same structure (optionally "
+                "for one method), newest first. Use it to skip optimizations that were already run."
+)
+async def lookup_results(
+    input_file: UploadFile = File(..., description="The CIF file to look up."),
+    method: Optional[str] = Form(None, description="Only results of this GFN-xTB method."),
+    primitive_cell: bool = Form(False, description="Reduce to the primitive cell first, as the optimization would."),
+    remove_solvent: bool = Form(False, description="Remove solvent molecules first, as the optimization would."),
+    limit: int = Form(20, ge=1, description="Most results returned (capped by the server)."),
+):
+    _require_store()
+    if not input_file.filename or not input_file.filename.lower().endswith('.cif'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid file type. Please upload a .cif file."
+        )
+
+    def identify(content: bytes) -> dict:
+        atoms = read_structure(content)
+        atoms, _ = preprocess_structure(atoms, method or "", primitive_cell, remove_solvent)
+        return structure_identity(atoms)
+
+    try:
+        identity = await run_in_threadpool(identify, await input_file.read())
+    except StructureRejected as e:
+        raise structure_rejected_error(e)
+
+    rows = await run_in_threadpool(
+        lambda: [
+            row for row in results_store.query(
+                {"fingerprint": identity["fingerprint"], "method": method},
+                descending=True, limit=min(limit, config.RESULTS_MAX_PAGE),
+            ) if "id" in row
+        ]
+    )
+    return {**identity, "results": rows}
+
+
+@router.get(
+    "/{request_id}",
+    responses={404: {"description": "No result is stored for this id."}},
+    summary="Get a Stored Result",
+    description="Returns one stored result (by request or job id) with its input parameters, "
+                "parsed results, run info and optimized CIF."
+)
+async def get_result(request_id: str):
+    _require_store()
+    record = await run_in_threadpool(results_store.get, request_id)
+    if record is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No result stored for '{request_id}'."
+        )
+    return record
+
+
+@router.get(
+    "/{request_id}/structure",
+    responses={
+        200: {"description": "The optimized structure.", "content": {"chemical/x-cif": {}}},
+        404: {"description": "No result is stored for this id."},
+    },
+    summary="Download the Optimized Structure of a Stored Result",
+)
+async def get_result_structure(request_id: str):
+    _require_store()
+    content = await run_in_threadpool(results_store.structure, request_id)
+    if content is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No result stored for '{request_id}'."
+        )
+    return Response(
+        content=content,
+        media_type="chemical/x-cif",
+        headers={"Content-Disposition": f'attachment; filename="{request_id}-optimized.cif"'},
+    )
@@ -0,0 +1,111 @@
+# app/api/routes/single_point.py
+# This file defines the single-point endpoint served by warm, socket-driven DFTB+ processes.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+
+import uuid
+import asyncio
+from typing import List, Optional
+
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from app.api.routes.optimization import CLIENT_CLOSED_REQUEST, cancel_on_disconnect, structure_rejected_error
+from app.schemas.single_point import SinglePointResponseSchema
+from app.services import single_point_service
+from app.core import config
+from app.core.admission import AdmissionRejected
+from app.core.preprocessing import StructureRejected
+from app.core.run_limits import RunLimitExceeded, enforce_limits, resolve_limit
+from app.utils.logger import console, set_request_id
+
+router = APIRouter()
+
+
+@router.post(
+    "",
+    responses={
+        200: {"description": "Energies and forces of all structures.", "model": SinglePointResponseSchema},
+        400: {"description": "Invalid method or file type."},
+        413: {"description": "A structure is predicted to need more memory than a single run may use."},
+        422: {"description": "A structure was rejected by the pre-run checks, or DFTB+ failed."},
+        500: {"description": "An unexpected internal server error occurred."},
+        504: {"description": "The request exceeded its wall-clock limit."},
+    },
+    summary="Compute Energies and Forces (Single Points)",
+    description="Computes the energy, forces and (for periodic structures) stress of every "
+                "structure in the uploaded CIF files; a file may hold several data blocks, "
+                "e.g. the frames of a scan. Structures with the same atoms, periodicity and "
+                "electronic settings run in order on one long-lived DFTB+ process driven over "
+                "a socket, which is kept warm for later requests; each SCC starts from the "
+                "charges of the previous geometry."
+)
+async def compute_single_points(
+    request: Request,
+    input_files: List[UploadFile] = File(..., description="CIF files; every data block is one structure."),
+    method: str = Form("GFN1-xTB", description="GFN-xTB method (GFN1-xTB or GFN2-xTB)."),
+    include_forces: bool = Form(True, description="Return per-atom forces (the maximal force is always returned)."),
+    wall_time_limit_s: Optional[float] = Form(
+        None, gt=0, description="Wall-clock limit of the request in seconds (capped by the server)."
+    ),
+):
+    if method not in ["GFN1-xTB", "GFN2-xTB"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid method '{method}'. Please choose 'GFN1-xTB' or 'GFN2-xTB'."
+        )
+    if not all(f.filename and f.filename.lower().endswith(".cif") for f in input_files):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid file type. Please upload .cif files."
+        )
+
+    request_id = str(uuid.uuid4())
+    set_request_id(request_id)
+    files = [(str(f.filename), await f.read()) for f in input_files]
+    try:
+        frames = await run_in_threadpool(single_point_service.read_frames, files, method)
+    except StructureRejected as e:
+        console.warning("Rejected structure of request %s (%s): %s", request_id, e.reason, e)
+        raise structure_rejected_error(e)
+
+    wall_time_limit_s = resolve_limit(wall_time_limit_s, config.RUN_WALL_TIME_LIMIT_S)
+    task = asyncio.ensure_future(enforce_limits(
+        single_point_service.compute_single_points(request_id, frames, method, include_forces),
+        wall_time_limit_s,
+    ))
+    watcher = asyncio.create_task(cancel_on_disconnect(request, task))
+    try:
+        return JSONResponse(status_code=status.HTTP_200_OK, content=await task)
+    except asyncio.CancelledError:
+        current = asyncio.current_task()
+        if not task.cancelled() or (current is not None and current.cancelling()):
+            raise
+        console.warning("Client of request %s disconnected; single points stopped.", request_id)
+        return JSONResponse(status_code=CLIENT_CLOSED_REQUEST, content={"detail": "Client closed the request."})
+    except RunLimitExceeded as e:
+        console.error("Request %s stopped: %s", request_id, e)
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail={"message": str(e), "termination": f"{e.limit}_limit"}
+        )
+    except AdmissionRejected as e:
+        console.warning("Rejected request %s: %s", request_id, e)
+        raise HTTPException(status_code=413, detail={"message": str(e), "estimate": e.estimate})
+    except RuntimeError as e:
+        console.error("DFTB+ runtime error for request %s: %s", request_id, e)
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"DFTB+ single-point calculation failed: {str(e)}"
+        )
+    except Exception as e:
+        console.exception("An unexpected error occurred for request %s", request_id)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An unexpected server error occurred: {str(e)}"
+        )
+    finally:
+        watcher.cancel()
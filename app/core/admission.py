@@ -0,0 +1,319 @@
+# app/core/admission.py
+# Predicts DFTB+ memory and run time from the structure and admits runs within a memory budget.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import os
+import json
+import math
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+from ase import Atoms
+
+from app.core import config
+from app.core import metrics
+from app.utils.logger import console
+
+NOBLE_GAS_CORES = (0, 2, 10, 18, 36, 54, 86, 118)
+
+# Prior model, used until enough finished runs have been observed for a method.
+BASE_MEMORY_BYTES = 100 * 1024 ** 2   # binary, parameters, small arrays
+DENSE_MATRICES = 6                    # H, S, eigenvectors, density and work copies
+SPARSE_BLOCK_BYTES = 4 * 9 * 9 * 8    # H, S, rho, energy-weighted rho per neighbour pair
+CPU_SECONDS_PER_UNIT = 1.5e-9         # per N_orb^2 * (N_orb + N_occ) and geometry step
+NEIGHBOUR_CUTOFF = 10.0               # Angstrom
+DEFAULT_GEOMETRY_STEPS = 50
+
+MIN_SAMPLES = 5
+MAX_SAMPLES = 200
+CALIBRATION_PERCENTILE = 90
+
+
+class AdmissionRejected(Exception):
+    """The structure is predicted to need more memory than the node can give one run."""
+
+    def __init__(self, message: str, estimate: Dict[str, Any]):
+        super().__init__(message)
+        self.estimate = estimate
+
+
+def valence_electrons(z: int) -> int:
+    """Valence electrons as treated by GFN-xTB (filled d and f shells count as core)."""
+    core = max(n for n in NOBLE_GAS_CORES if n < z) if z > 0 else 0
+    valence = z - core
+    if core >= 54 and valence > 16:
+        valence -= 14
+    if core >= 18 and valence > 12:
+        valence -= 10
+    return valence
+
+
+def basis_functions(z: int, method: str) -> int:
+    """Approximate number of atomic orbitals per element in the GFN-xTB minimal basis."""
+    if z <= 2:
+        return 2 if method == "GFN1-xTB" else 1
+    if z <= 10:
+        return 4
+    valence = valence_electrons(z)
+    # s-block elements of higher periods carry s and p shells, everything else s, p and d.
+    return 4 if valence <= 2 else 9
+
+
+def structure_features(atoms: Atoms, method: str, kpoints: int = 1) -> Dict[str, Any]:
+    numbers = atoms.get_atomic_numbers()
+    unique, counts = np.unique(numbers, return_counts=True)
+    n_orbitals = int(sum(basis_functions(int(z), method) * int(c) for z, c in zip(unique, counts)))
+    electrons = int(sum(valence_electrons(int(z)) * int(c) for z, c in zip(unique, counts)))
+
+    n_atoms = len(atoms)
+    neighbours = n_atoms
+    if atoms.cell.rank == 3 and atoms.pbc.any():
+        density = n_atoms / atoms.cell.volume
+        neighbours = max(1, int(density * 4.0 / 3.0 * math.pi * NEIGHBOUR_CUTOFF ** 3))
+    return {
+        "n_atoms": n_atoms,
+        "basis_functions": n_orbitals,
+        "electrons": electrons,
+        "kpoints": max(1, kpoints),
+        "neighbours_per_atom": neighbours,
+    }
+
+
+def _raw_memory_bytes(features: Dict[str, Any]) -> float:
+    n = features["basis_functions"]
+    kpoints = features["kpoints"]
+    # Complex matrices beyond the Gamma point take twice the space.
+    dense = DENSE_MATRICES * n * n * 8 * kpoints * (2 if kpoints > 1 else 1)
+    sparse = features["n_atoms"] * features["neighbours_per_atom"] * SPARSE_BLOCK_BYTES
+    return BASE_MEMORY_BYTES + dense + sparse
+
+
+def _raw_cpu_seconds_per_step(features: Dict[str, Any]) -> float:
+    n = features["basis_functions"]
+    occupied = features["electrons"] / 2
+    return CPU_SECONDS_PER_UNIT * n * n * (n + occupied) * features["kpoints"]
+
+
+class ResourceModel:
+    """
+    Predicts peak memory and CPU time of a DFTB+ optimization.
+
+    Dense matrices make memory grow as N^2 and diagonalisation makes time grow as N^3
+    in the number of basis functions N. The prior constants are calibrated per method
+    from finished runs: the prediction is scaled by a high percentile of the observed
+    to predicted ratios, so estimates stay on the safe side.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._samples: Dict[str, List[Dict[str, float]]] = self._load()
+
+    def _load(self) -> Dict[str, List[Dict[str, float]]]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, content: str):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, self.path)
+
+    def flush(self):
+        """
+        Writes the samples to disk if they changed since the last write. Blocking; runs
+        finished while a write is in progress are picked up by the next flush.
+        """
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                content = json.dumps(self._samples)
+                self._dirty = False
+            try:
+                self._save(content)
+            except OSError as e:
+                console.warning("Could not save the admission model to %s: %s", self.path, e)
+                with self._lock:
+                    self._dirty = True
+
+    def _calibration(self, method: str) -> Tuple[float, float, float]:
+        """(memory factor, CPU time factor, expected geometry steps) for a method."""
+        with self._lock:
+            samples = list(self._samples.get(method, []))
+        if len(samples) < MIN_SAMPLES:
+            return 1.0, 1.0, float(DEFAULT_GEOMETRY_STEPS)
+        memory = float(np.percentile([s["memory_ratio"] for s in samples], CALIBRATION_PERCENTILE))
+        cpu = float(np.percentile([s["cpu_ratio"] for s in samples], CALIBRATION_PERCENTILE))
+        steps = float(np.median([s["steps"] for s in samples]))
+        return memory, cpu, steps
+
+    def estimate(
+        self, atoms: Atoms, method: str, threads: int = 1, max_steps: int = 200, kpoints: int = 1
+    ) -> Dict[str, Any]:
+        features = structure_features(atoms, method, kpoints)
+        memory_factor, cpu_factor, expected_steps = self._calibration(method)
+        memory_bytes = _raw_memory_bytes(features) * memory_factor
+        cpu_per_step = _raw_cpu_seconds_per_step(features) * cpu_factor
+        cpu_time = cpu_per_step * min(expected_steps, max_steps)
+        return {
+            **features,
+            "estimated_memory_mb": round(memory_bytes / 1024 ** 2, 1),
+            "estimated_cpu_time_s": round(cpu_time, 1),
+            "estimated_wall_time_s": round(cpu_time / max(1, threads), 1),
+        }
+
+    def observe(self, method: str, estimate: Dict[str, Any], max_rss_mb: float, cpu_time_s: float, steps: int):
+        """
+        Records a finished run to calibrate later predictions for the same method. Only
+        kept in memory; call flush to persist it.
+        """
+        if steps <= 0:
+            return
+        sample = {
+            "memory_ratio": max_rss_mb * 1024 ** 2 / _raw_memory_bytes(estimate),
+            "cpu_ratio": (cpu_time_s / steps) / max(_raw_cpu_seconds_per_step(estimate), 1e-9),
+            "steps": steps,
+        }
+        with self._lock:
+            samples = self._samples.setdefault(method, [])
+            samples.append(sample)
+            del samples[:-MAX_SAMPLES]
+            self._dirty = True
+
+
+class MemoryAdmission:
+    """
+    Admits DFTB+ runs in FIFO order while the sum of their predicted memory fits into
+    the budget, so the node never overcommits RAM. Runs predicted above the large-run
+    threshold first pass through a lane that admits only a few of them at a time.
+    """
+
+    def __init__(self, budget_mb: int, large_run_mb: int, large_concurrency: int):
+        self.budget_bytes = budget_mb * 1024 ** 2
+        self.large_run_bytes = large_run_mb * 1024 ** 2
+        self.large_concurrency = large_concurrency
+        self.reserved_bytes = 0
+        self.large_running = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+        self._large_lane: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget_bytes > 0
+
+    def lane(self, estimate: Dict[str, Any]) -> str:
+        needed = estimate["estimated_memory_mb"] * 1024 ** 2
+        return "large" if self.large_run_bytes and needed > self.large_run_bytes else "standard"
+
+    def check(self, estimate: Dict[str, Any]):
+        """Raises AdmissionRejected if the run could never be admitted."""
+        needed = estimate["estimated_memory_mb"] * 1024 ** 2
+        if self.enabled and needed > self.budget_bytes:
+            raise AdmissionRejected(
+                f"Structure with {estimate['n_atoms']} atoms ({estimate['basis_functions']} basis functions) "
+                f"is predicted to need {estimate['estimated_memory_mb']:.0f} MB, more than the "
+                f"{self.budget_bytes // 1024 ** 2} MB available to a single DFTB+ run.",
+                estimate,
+            )
+
+    def _get_large_lane(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._large_lane is None or self._loop is not loop:
+            self._large_lane = asyncio.Semaphore(self.large_concurrency)
+            self._waiters.clear()
+            self._loop = loop
+        return self._large_lane
+
+    def _wake(self):
+        while self._waiters:
+            needed, future = self._waiters[0]
+            if self.reserved_bytes + needed > self.budget_bytes and self.reserved_bytes > 0:
+                break
+            self._waiters.popleft()
+            if not future.done():
+                self.reserved_bytes += needed
+                future.set_result(None)
+
+    async def _acquire(self, needed: int):
+        if not self._waiters and (self.reserved_bytes + needed <= self.budget_bytes or self.reserved_bytes == 0):
+            self.reserved_bytes += needed
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = (needed, future)
+        self._waiters.append(entry)
+        console.info(
+            "Waiting for %.0f MB of memory (%.0f of %.0f MB reserved).",
+            needed / 1024 ** 2, self.reserved_bytes / 1024 ** 2, self.budget_bytes / 1024 ** 2,
+        )
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(needed)
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                self._wake()
+            raise
+
+    def _release(self, needed: int):
+        self.reserved_bytes = max(0, self.reserved_bytes - needed)
+        self._wake()
+
+    @asynccontextmanager
+    async def reserve(self, estimate: Dict[str, Any]):
+        """Holds the run's predicted memory for the duration of the with-block."""
+        if not self.enabled:
+            yield
+            return
+        needed = int(estimate["estimated_memory_mb"] * 1024 ** 2)
+        lane = self._get_large_lane()
+        large = self.lane(estimate) == "large"
+        if large:
+            await lane.acquire()
+            self.large_running += 1
+        try:
+            await self._acquire(needed)
+            try:
+                yield
+            finally:
+                self._release(needed)
+        finally:
+            if large:
+                self.large_running -= 1
+                lane.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "budget_mb": self.budget_bytes // 1024 ** 2,
+            "reserved_mb": round(self.reserved_bytes / 1024 ** 2, 1),
+            "waiting": len(self._waiters),
+            "large_lane_running": self.large_running,
+            "large_lane_capacity": self.large_concurrency,
+        }
+
+
+resource_model = ResourceModel(config.ADMISSION_MODEL_PATH)
+memory_admission = MemoryAdmission(config.MEMORY_BUDGET_MB, config.LARGE_RUN_MB, config.LARGE_LANE_CONCURRENCY)
+
+metrics.registry.gauge(
+    "dftbopt_memory_reserved_bytes", "Predicted memory of admitted DFTB+ runs.",
+    callback=lambda: memory_admission.reserved_bytes,
+)
+metrics.registry.gauge(
+    "dftbopt_memory_waiting", "Runs waiting for memory to become available.",
+    callback=lambda: memory_admission.stats()["waiting"],
+)
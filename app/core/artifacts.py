@@ -0,0 +1,108 @@
+# app/core/artifacts.py
+# Serves stored run artifacts from disk, optionally compressed, with ETag and Range support.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import os
+import gzip
+import shutil
+from typing import Dict, List, Optional
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+CHUNK_SIZE = 1024 * 1024
+
+# Content-Encoding -> suffix of the compressed copy kept next to the artifact
+ENCODINGS: Dict[str, str] = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def zstd_available() -> bool:
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def supported_encodings() -> List[str]:
+    """Encodings in order of preference; zstd needs the optional `zstandard` package."""
+    return (["zstd"] if zstd_available() else []) + ["gzip"]
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Picks the preferred supported encoding the client accepts (None for identity)."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compressed_copy(path: str, encoding: str) -> str:
+    """
+    Returns the path of a compressed copy of `path`, creating it on first use.
+
+    Artifacts do not change once stored, so the copy is reused by later downloads and
+    can be served with byte ranges like any other file.
+    """
+    target = path + ENCODINGS[encoding]
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+        return target
+
+    tmp_path = f"{target}.tmp-{os.getpid()}"
+    with open(path, "rb") as source:
+        if encoding == "gzip":
+            # mtime=0 keeps the output reproducible
+            with gzip.GzipFile(tmp_path, "wb", compresslevel=6, mtime=0) as sink:
+                shutil.copyfileobj(source, sink, CHUNK_SIZE)
+        else:
+            import zstandard
+
+            with open(tmp_path, "wb") as sink:
+                zstandard.ZstdCompressor(level=3).copy_stream(source, sink, read_size=CHUNK_SIZE)
+    os.replace(tmp_path, target)
+    return target
+
+
+def file_response(
+    request: Request,
+    path: str,
+    media_type: str,
+    filename: str,
+    encoding: Optional[str] = None,
+) -> Response:
+    """
+    Streams a file from disk in chunks. The ETag derives from the file's size and
+    modification time, so a matching If-None-Match is answered with 304 without
+    reading the file; Range requests are handled by FileResponse.
+    """
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    response = FileResponse(
+        path,
+        media_type=media_type,
+        filename=filename,
+        headers=headers,
+        stat_result=os.stat(path),
+    )
+    response.chunk_size = CHUNK_SIZE
+
+    etag = response.headers.get("etag")
+    if_none_match = request.headers.get("if-none-match")
+    if etag and if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or etag in tags:
+            return Response(status_code=304, headers={"ETag": etag, **headers})
+    return response
@@ -0,0 +1,167 @@
+# app/core/config.py
+# Runtime settings for the service, read once from environment variables.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import os
+import tempfile
+
+
+def _env_str(name: str, default: str) -> str:
+    return os.environ.get(name, default)
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return int(value)
+
+
+# Base directory for per-request scratch workspaces.
+WORKSPACE_BASE = _env_str("DFTBOPT_WORKSPACE_BASE", os.path.join("app", "workspace"))
+
+# Scratch directories of running DFTB+ calculations; point it at a fast local filesystem
+# (tmpfs, local NVMe). A pool of slots is created up front and released workspaces are
+# deleted in the background. A quota of 0 means unlimited.
+SCRATCH_BASE = _env_str("DFTBOPT_SCRATCH_BASE", os.path.join(WORKSPACE_BASE, "scratch"))
+WORKSPACE_QUOTA_MB = max(0, _env_int("DFTBOPT_WORKSPACE_QUOTA_MB", 0))
+
+# Workspaces of failed runs are archived here for debugging and kept for a limited
+# time and total size; a retention of 0 hours discards them right away.
+FAILED_RUNS_DIR = _env_str("DFTBOPT_FAILED_RUNS_DIR", os.path.join(WORKSPACE_BASE, "failed"))
+FAILED_RETENTION_HOURS = max(0, _env_int("DFTBOPT_FAILED_RETENTION_HOURS", 24))
+FAILED_RUNS_MAX_MB = max(0, _env_int("DFTBOPT_FAILED_RUNS_MAX_MB", 1024))
+
+# Directory holding persistent job records (one sub-directory per job).
+JOBS_BASE = _env_str("DFTBOPT_JOBS_BASE", os.path.join("app", "workspace", "jobs"))
+
+# Number of asynchronous jobs running at once; queued jobs start in fair-share order
+# (see the scheduler settings below).
+JOB_WORKERS = max(1, _env_int("DFTBOPT_JOB_WORKERS", 2))
+
+# Maximum number of DFTB+ processes allowed to run at the same time; further runs queue.
+MAX_CONCURRENT_RUNS = max(1, _env_int("DFTBOPT_MAX_CONCURRENT_RUNS", os.cpu_count() or 1))
+
+# Fair-share scheduler in front of the DFTB+ runs of optimizations: at most
+# SCHEDULER_SLOTS optimizations run at once (0 admits all of them in arrival order), the
+# others wait per client and priority class. A waiting optimization moves up one priority
+# class every SCHEDULER_AGING_S seconds; the slot time a client used counts against it
+# with a half-life of SCHEDULER_USAGE_HALF_LIFE_S seconds. Throughput statistics cover the
+# last SCHEDULER_STATS_WINDOW_S seconds.
+SCHEDULER_SLOTS = max(0, _env_int("DFTBOPT_SCHEDULER_SLOTS", MAX_CONCURRENT_RUNS))
+SCHEDULER_AGING_S = max(0.0, float(_env_str("DFTBOPT_SCHEDULER_AGING_S", "300")))
+SCHEDULER_USAGE_HALF_LIFE_S = max(0.0, float(_env_str("DFTBOPT_SCHEDULER_USAGE_HALF_LIFE_S", "600")))
+SCHEDULER_STATS_WINDOW_S = max(1.0, float(_env_str("DFTBOPT_SCHEDULER_STATS_WINDOW_S", "900")))
+
+# Pre-created workspace slots per process; runs beyond it get a freshly created directory.
+WORKSPACE_POOL_SIZE = max(0, _env_int("DFTBOPT_WORKSPACE_POOL_SIZE", 2 * MAX_CONCURRENT_RUNS))
+
+# Where DFTB+ runs: "local" starts it on this host, "queue" dispatches it to worker
+# daemons (python -m app.worker) through a work queue on storage shared by all hosts.
+EXECUTOR = _env_str("DFTBOPT_EXECUTOR", "local").strip().lower()
+QUEUE_DIR = _env_str("DFTBOPT_QUEUE_DIR", os.path.join(WORKSPACE_BASE, "queue"))
+# Workers renew the lease of a running task every quarter lease; tasks whose lease runs
+# out are dispatched again, at most this many times in total.
+QUEUE_LEASE_SECONDS = max(4, _env_int("DFTBOPT_QUEUE_LEASE_SECONDS", 60))
+QUEUE_MAX_ATTEMPTS = max(1, _env_int("DFTBOPT_QUEUE_MAX_ATTEMPTS", 3))
+QUEUE_POLL_SECONDS = float(_env_str("DFTBOPT_QUEUE_POLL_SECONDS", "1.0"))
+# Tasks a worker daemon runs at the same time.
+WORKER_SLOTS = max(1, _env_int("DFTBOPT_WORKER_SLOTS", MAX_CONCURRENT_RUNS))
+
+# Default and upper bound of the per-run limits (seconds, 0 = unlimited): wall-clock time
+# of a whole optimization, and CPU time of its DFTB+ processes. Stopped processes get
+# SIGTERM and, after the grace period, SIGKILL.
+RUN_WALL_TIME_LIMIT_S = max(0.0, float(_env_str("DFTBOPT_RUN_WALL_TIME_LIMIT_S", "0")))
+RUN_CPU_TIME_LIMIT_S = max(0.0, float(_env_str("DFTBOPT_RUN_CPU_TIME_LIMIT_S", "0")))
+KILL_GRACE_S = max(0.0, float(_env_str("DFTBOPT_KILL_GRACE_S", "5")))
+
+# Single-point calculations run on long-lived DFTB+ processes (socket driver) that are
+# kept warm between requests: at most SOCKET_POOL_SIZE idle processes, each for at most
+# SOCKET_IDLE_SECONDS. Their UNIX sockets live in SOCKET_DIR; keep its path short, as
+# socket paths are limited to about 100 characters.
+SOCKET_POOL_SIZE = max(0, _env_int("DFTBOPT_SOCKET_POOL_SIZE", 4))
+SOCKET_IDLE_SECONDS = max(1, _env_int("DFTBOPT_SOCKET_IDLE_SECONDS", 300))
+SOCKET_DIR = _env_str("DFTBOPT_SOCKET_DIR", os.path.join(tempfile.gettempdir(), "dftbopt-ipi"))
+SOCKET_STARTUP_TIMEOUT_S = max(1.0, float(_env_str("DFTBOPT_SOCKET_STARTUP_TIMEOUT_S", "60")))
+
+# Start-up warm-up: preload the structure I/O and, with DFTBOPT_WARMUP_CHECK_DFTB, run a
+# tiny DFTB+ calculation once; GET /ready reports ready only after it succeeded. The
+# binary check defaults to on where DFTB+ runs (local executor, worker daemons).
+WARMUP = _env_int("DFTBOPT_WARMUP", 1) != 0
+WARMUP_CHECK_DFTB = _env_int("DFTBOPT_WARMUP_CHECK_DFTB", 1 if EXECUTOR == "local" else 0) != 0
+WARMUP_TIMEOUT_S = max(1.0, float(_env_str("DFTBOPT_WARMUP_TIMEOUT_S", "60")))
+
+# Core pinning: one OpenMP thread per this many atoms, capped per run.
+ATOMS_PER_THREAD = max(1, _env_int("DFTBOPT_ATOMS_PER_THREAD", 50))
+MAX_THREADS_PER_RUN = max(1, _env_int("DFTBOPT_MAX_THREADS_PER_RUN", os.cpu_count() or 1))
+
+# OpenMP per-thread stack size handed to DFTB+ (large systems need a generous stack).
+OMP_STACKSIZE = _env_str("DFTBOPT_OMP_STACKSIZE", "1G")
+
+# Content-addressed result cache; set DFTBOPT_CACHE_MAX_BYTES=0 to disable it.
+CACHE_DIR = _env_str("DFTBOPT_CACHE_DIR", os.path.join("app", "workspace", "cache"))
+CACHE_MAX_BYTES = max(0, _env_int("DFTBOPT_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+CACHE_TOLERANCE = float(_env_str("DFTBOPT_CACHE_TOLERANCE", "1e-3"))
+
+# Restart files (final geometry, SCC charges) kept after a run for continuation.
+RUNS_BASE = _env_str("DFTBOPT_RUNS_BASE", os.path.join("app", "workspace", "runs"))
+RUNS_MAX_AGE_HOURS = max(0, _env_int("DFTBOPT_RUNS_MAX_AGE_HOURS", 72))
+
+# SQLite database indexing every finished optimization (parameters, parsed results,
+# fingerprint, timings, optimized structure) for the results endpoints; empty disables it.
+RESULTS_DB_PATH = _env_str("DFTBOPT_RESULTS_DB_PATH", os.path.join(WORKSPACE_BASE, "results.sqlite3"))
+# Largest page the results query endpoint returns.
+RESULTS_MAX_PAGE = max(1, _env_int("DFTBOPT_RESULTS_MAX_PAGE", 1000))
+
+# Optional cheap pre-relaxation stage (fixed lattice, loose fmax) before the requested run.
+PRERELAX_METHOD = _env_str("DFTBOPT_PRERELAX_METHOD", "GFN1-xTB")
+PRERELAX_FMAX = float(_env_str("DFTBOPT_PRERELAX_FMAX", "0.5"))
+PRERELAX_MAX_STEPS = max(1, _env_int("DFTBOPT_PRERELAX_MAX_STEPS", 100))
+
+# Structure checks before a run: atoms closer than MIN_DISTANCE_FACTOR times the sum of
+# their covalent radii are rejected, same-element atoms within DUPLICATE_TOLERANCE_A
+# (Angstrom; 0 keeps them) are merged, and the optional solvent removal drops molecules
+# of up to SOLVENT_MAX_ATOMS atoms.
+MIN_DISTANCE_FACTOR = float(_env_str("DFTBOPT_MIN_DISTANCE_FACTOR", "0.5"))
+DUPLICATE_TOLERANCE_A = max(0.0, float(_env_str("DFTBOPT_DUPLICATE_TOLERANCE_A", "0.1")))
+SOLVENT_MAX_ATOMS = max(1, _env_int("DFTBOPT_SOLVENT_MAX_ATOMS", 30))
+
+# Electronic structure settings chosen per structure. K-point meshes keep at most this
+# spacing (1/Angstrom, 2*pi included) along each reciprocal lattice vector; 0 samples
+# the Gamma point only. Fermi smearing is off (0 K) unless an electronic temperature
+# is set, e.g. 300 K for small-gap and metallic systems.
+K_SPACING = float(_env_str("DFTBOPT_K_SPACING", "0.5"))
+ELECTRONIC_TEMPERATURE_K = float(_env_str("DFTBOPT_ELECTRONIC_TEMPERATURE_K", "0"))
+# SCC tolerance of the (final) optimization; 0 derives it from the force threshold.
+SCC_TOLERANCE = float(_env_str("DFTBOPT_SCC_TOLERANCE", "0"))
+# Opt-in: optimizations to a threshold below SCC_COARSE_FMAX (eV/Angstrom) first run to
+# that threshold with the loose SCC_COARSE_TOLERANCE in a separate DFTB+ process. The
+# final phase restarts the optimizer without history, so this only pays off when SCC
+# cycles dominate the run time; 0 (the default) runs a single phase.
+SCC_COARSE_FMAX = float(_env_str("DFTBOPT_SCC_COARSE_FMAX", "0"))
+SCC_COARSE_TOLERANCE = float(_env_str("DFTBOPT_SCC_COARSE_TOLERANCE", "1e-4"))
+
+# Floating point type of stored trajectories ("float64", or "float32" for half the size).
+TRAJECTORY_DTYPE = _env_str("DFTBOPT_TRAJECTORY_DTYPE", "float64")
+if TRAJECTORY_DTYPE not in ("float32", "float64"):
+    raise ValueError("DFTBOPT_TRAJECTORY_DTYPE must be 'float32' or 'float64'")
+
+
+def _physical_memory_mb() -> int:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 1024 ** 2
+    except (AttributeError, ValueError, OSError):
+        return 0
+
+
+# Admission control: DFTB+ runs start only while their predicted memory fits into the
+# budget; larger predictions are rejected. 0 disables the memory budget.
+MEMORY_BUDGET_MB = max(0, _env_int("DFTBOPT_MEMORY_BUDGET_MB", int(_physical_memory_mb() * 0.8)))
+# Runs predicted above this size go through the large-memory lane, which admits only a
+# few at a time so they cannot crowd out each other.
+LARGE_RUN_MB = max(0, _env_int("DFTBOPT_LARGE_RUN_MB", MEMORY_BUDGET_MB // 4))
+LARGE_LANE_CONCURRENCY = max(1, _env_int("DFTBOPT_LARGE_LANE_CONCURRENCY", 1))
+# Observed memory and CPU time of finished runs, used to calibrate the predictions.
+ADMISSION_MODEL_PATH = _env_str("DFTBOPT_ADMISSION_MODEL_PATH", os.path.join(WORKSPACE_BASE, "admission_model.json"))
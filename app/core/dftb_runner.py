@@ -6,11 +6,114 @@
 
 
 import os
+import abc
+import math
+import time
+import signal
+import asyncio
+import logging
+import threading
+import contextvars
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import config
+from app.core import metrics
+from app.core.admission import AdmissionRejected, memory_admission, resource_model
+from app.core.hsd_settings import n_kpoints, select_settings
+from app.core.run_limits import CPU_TIME, RunLimitExceeded, charge_cpu_time, cpu_time_limit, remaining_cpu_time
+from app.utils.file_convertor import read_gen_file
 from app.utils.logger import console
 
-def generate_hsd_content(method: str, fmax: float, input_gen_file: str) -> str:
-    """Dynamically generate the content of the dftb_in.hsd file."""
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+STDOUT_FILE = "dftb_stdout.log"
+STDERR_FILE = "dftb_stderr.log"
+
+def _kpoints_block(settings: Optional[Dict[str, Any]]) -> str:
+    if settings is None:
+        return """
+  KPointsAndWeights = {
+    0.0 0.0 0.0 1.0
+  }"""
+    mesh = settings.get("kpoints")
+    if mesh is None:
+        # Non-periodic structure: no k-point sampling
+        return ""
+    shift = settings["kpoint_shift"]
+    return f"""
+  KPointsAndWeights = SupercellFolding {{
+    {mesh[0]} 0 0
+    0 {mesh[1]} 0
+    0 0 {mesh[2]}
+    {shift[0]} {shift[1]} {shift[2]}
+  }}"""
+
+def _scc_block(settings: Optional[Dict[str, Any]]) -> str:
+    if settings is None:
+        return ""
+    block = f"""
+  SccTolerance = {settings["scc_tolerance"]:.1e}
+  MaxSccIterations = {settings["max_scc_iterations"]}
+  Mixer = {settings["mixer"]} {{
+    MixingParameter = {settings["mixing_parameter"]}
+  }}"""
+    if settings.get("electronic_temperature_K"):
+        block += f"""
+  Filling = Fermi {{
+    Temperature [Kelvin] = {settings["electronic_temperature_K"]}
+  }}"""
+    return block
+
+def _driver_block(fmax: float, lattice_opt: bool, max_steps: int, socket_path: Optional[str]) -> str:
+    if socket_path is not None:
+        # DFTB+ joins Prefix and File into the socket path; MaxSteps = -1 serves
+        # geometries until the server sends EXIT.
+        return f"""Driver = Socket {{
+  File = "{os.path.basename(socket_path)}"
+  Prefix = "{os.path.dirname(socket_path)}/"
+  Protocol = i-PI {{}}
+  MaxSteps = -1
+  Verbosity = 0
+}}"""
+    return f"""Driver = GeometryOptimisation {{
+  Optimiser = LBFGS {{}}
+  LatticeOpt = {"Yes" if lattice_opt else "No"}
+  Convergence = {{
+    GradElem [eV/Angstrom] = {fmax}
+  }}
+  MaxSteps = {max_steps}
+  AppendGeometries = Yes
+}}"""
+
+def generate_hsd_content(
+    method: str,
+    fmax: float,
+    input_gen_file: str,
+    read_initial_charges: bool = False,
+    lattice_opt: bool = True,
+    max_steps: int = 200,
+    settings: Optional[Dict[str, Any]] = None,
+    socket_path: Optional[str] = None,
+) -> str:
+    """
+    Dynamically generate the content of the dftb_in.hsd file.
+
+    With read_initial_charges the SCC starts from the charges.bin of a previous run,
+    which must be present in the working directory. lattice_opt and max_steps control
+    the geometry optimisation driver. settings, as returned by
+    hsd_settings.select_settings, set the k-point mesh, SCC tolerance, mixer and
+    smearing; without them DFTB+ samples the Gamma point with its default SCC settings.
+
+    With socket_path, DFTB+ does not optimize but connects to that UNIX socket and
+    computes energies and forces for the geometries it receives (i-PI protocol) until
+    it is told to exit; fmax, lattice_opt and max_steps are ignored.
+    """
 
     if method not in ["GFN1-xTB", "GFN2-xTB"]:
         raise ValueError("Method must be 'GFN1-xTB' or 'GFN2-xTB'")
@@ -22,23 +125,13 @@ Geometry = GenFormat {{
 
 Hamiltonian = xTB {{
   Method = "{method}"
-  KPointsAndWeights = {{
-    0.0 0.0 0.0 1.0
-  }}
+  ReadInitialCharges = {"Yes" if read_initial_charges else "No"}{_kpoints_block(settings)}{_scc_block(settings)}
 }}
 
-Driver = GeometryOptimisation {{
-  Optimiser = LBFGS {{}}
-  LatticeOpt = Yes
-  Convergence = {{
-    GradElem [eV/Angstrom] = {fmax}
-  }}
-  MaxSteps = 200
-  AppendGeometries = Yes
-}}
+{_driver_block(fmax, lattice_opt, max_steps, socket_path)}
 
 Options {{
-  WriteDetailedOut = Yes
+  WriteDetailedOut = {"No" if socket_path else "Yes"}
 }}
 
 ParserOptions {{
@@ -47,9 +140,322 @@ ParserOptions {{
 """
     return hsd_template
 
+class DFTBConcurrencyLimiter:
+    """
+    Caps the number of DFTB+ processes running at the same time.
+    Callers over the limit wait in FIFO order; the queue depth is exposed via stats().
+    """
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max_concurrent
+        self.running = 0
+        self.waiting = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+        return self._semaphore
+
+    @asynccontextmanager
+    async def slot(self):
+        semaphore = self._get_semaphore()
+        if semaphore.locked():
+            console.info("All %d DFTB+ slots busy, queued (%d waiting).", self.max_concurrent, self.waiting + 1)
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "running": self.running,
+            "waiting": self.waiting,
+        }
+
+
+dftb_limiter = DFTBConcurrencyLimiter(config.MAX_CONCURRENT_RUNS)
+
+
+def _available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class CoreAllocator:
+    """
+    Hands each DFTB+ run its own set of CPU cores so concurrent OpenMP runtimes
+    do not oversubscribe the node.
+
+    The thread count of a run grows with the number of atoms. Cores are handed out
+    disjointly while free ones exist; if the node is fully booked the least loaded
+    cores are shared instead of failing the run.
+    """
+
+    def __init__(self, cpus: List[int], atoms_per_thread: int, max_threads_per_run: int):
+        self.cpus = list(cpus)
+        self.atoms_per_thread = max(1, atoms_per_thread)
+        self.max_threads_per_run = max(1, min(max_threads_per_run, len(self.cpus)))
+        self._load = {cpu: 0 for cpu in self.cpus}
+        self._lock = threading.Lock()
+
+    def threads_for(self, n_atoms: int) -> int:
+        threads = math.ceil(max(n_atoms, 1) / self.atoms_per_thread)
+        return max(1, min(threads, self.max_threads_per_run))
+
+    def acquire(self, n_atoms: int) -> List[int]:
+        wanted = self.threads_for(n_atoms)
+        with self._lock:
+            free = [cpu for cpu in self.cpus if self._load[cpu] == 0]
+            if free:
+                chosen = free[:wanted]
+            else:
+                chosen = sorted(self.cpus, key=lambda cpu: self._load[cpu])[:1]
+            for cpu in chosen:
+                self._load[cpu] += 1
+        return chosen
+
+    def release(self, cpus: List[int]):
+        with self._lock:
+            for cpu in cpus:
+                self._load[cpu] = max(0, self._load[cpu] - 1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            busy = sum(1 for load in self._load.values() if load > 0)
+        return {"total_cpus": len(self.cpus), "busy_cpus": busy}
+
+
+core_allocator = CoreAllocator(
+    _available_cpus(), config.ATOMS_PER_THREAD, config.MAX_THREADS_PER_RUN
+)
+
+metrics.registry.gauge(
+    "dftbopt_dftb_running", "DFTB+ processes currently running.",
+    callback=lambda: dftb_limiter.stats()["running"],
+)
+metrics.registry.gauge(
+    "dftbopt_dftb_waiting", "Runs waiting for a DFTB+ process slot.",
+    callback=lambda: dftb_limiter.stats()["waiting"],
+)
+metrics.registry.gauge(
+    "dftbopt_busy_cpus", "CPU cores currently assigned to DFTB+ processes.",
+    callback=lambda: core_allocator.stats()["busy_cpus"],
+)
+
+# Dedicated threads that block on DFTB+ child processes, keeping the event loop free.
+_dftb_executor = ThreadPoolExecutor(max_workers=config.MAX_CONCURRENT_RUNS, thread_name_prefix="dftb")
+
+def _write_input(workspace_dir: str, input_gen_file: str, fmax: float, method: str, **hsd_options):
+    console.info("Preparing DFTB+ calculation in %s...", workspace_dir)
+    hsd_content = generate_hsd_content(method, fmax, input_gen_file, **hsd_options)
+    hsd_path = os.path.join(workspace_dir, "dftb_in.hsd")
+    with open(hsd_path, 'w') as f:
+        f.write(hsd_content)
+    console.success("Generated dftb_in.hsd for %s with fmax=%s eV/Angstrom.", method, fmax)
+
+def count_gen_atoms(gen_path: str) -> int:
+    """Reads the atom count from the header line of a GEN file."""
+    with open(gen_path, 'r') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                return int(line.split()[0])
+    raise ValueError(f"Empty GEN file: {gen_path}")
+
+def child_environment(n_threads: int) -> Dict[str, str]:
+    env = os.environ.copy()
+    env["OMP_NUM_THREADS"] = str(n_threads)
+    env["OMP_STACKSIZE"] = config.OMP_STACKSIZE
+    # Keep threaded BLAS/LAPACK libraries within the same budget as OpenMP.
+    env["OPENBLAS_NUM_THREADS"] = str(n_threads)
+    env["MKL_NUM_THREADS"] = str(n_threads)
+    return env
+
+def _wait_with_usage(process: subprocess.Popen) -> Tuple[int, Dict[str, float]]:
+    """
+    Waits for the child and returns its exit code together with its own resource usage
+    (CPU time, peak RSS) as reported by wait4. Falls back to a plain wait where wait4
+    is unavailable.
+    """
+    if not hasattr(os, "wait4"):
+        return process.wait(), {}
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, {
+        "cpu_time_s": round(rusage.ru_utime + rusage.ru_stime, 3),
+        # ru_maxrss is reported in KiB on Linux
+        "max_rss_mb": round(rusage.ru_maxrss / 1024, 1),
+    }
+
+class ProcessControl:
+    """
+    Lets the event loop stop a DFTB+ process that a worker thread is waiting on.
+
+    The process runs in its own process group (session), so that kill() also reaches
+    anything it started. A kill requested before the process exists stops it as soon
+    as it is attached.
+    """
+
+    def __init__(self, grace_s: float):
+        self.grace_s = grace_s
+        self.kill_reason: Optional[str] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    def attach(self, process: subprocess.Popen):
+        with self._lock:
+            self._process = process
+            reason = self.kill_reason
+        if reason is not None:
+            self._terminate(process)
+
+    def kill(self, reason: str):
+        """SIGTERM to the process group, SIGKILL after the grace period if it is still running."""
+        with self._lock:
+            if self.kill_reason is None:
+                self.kill_reason = reason
+            process = self._process
+        if process is not None:
+            self._terminate(process)
+
+    def _terminate(self, process: subprocess.Popen):
+        if not _signal_group(process, signal.SIGTERM):
+            return
+        console.warning("Stopping DFTB+ process %d (%s).", process.pid, self.kill_reason)
+        timer = threading.Timer(self.grace_s, _signal_group, (process, signal.SIGKILL))
+        timer.daemon = True
+        timer.start()
+
+def _signal_group(process: subprocess.Popen, signum: int) -> bool:
+    # returncode is set once the child has been reaped; its pid may then be reused.
+    if process.returncode is not None:
+        return False
+    try:
+        os.killpg(process.pid, signum)
+    except (ProcessLookupError, PermissionError):
+        return False
+    return True
+
+def _limit_cpu_time(pid: int, seconds: float):
+    """The kernel sends SIGXCPU after `seconds` of CPU time and SIGKILL one grace period later."""
+    if resource is None or not hasattr(resource, "prlimit"):
+        console.warning("CPU-time limits are not supported on this platform.")
+        return
+    soft = max(1, math.ceil(seconds))
+    try:
+        resource.prlimit(pid, resource.RLIMIT_CPU, (soft, soft + max(1, math.ceil(config.KILL_GRACE_S))))
+        # SIGXCPU would otherwise leave a core dump in the workspace
+        resource.prlimit(pid, resource.RLIMIT_CORE, (0, 0))
+    except (OSError, ValueError) as e:
+        console.warning("Could not limit the CPU time of DFTB+ process %d: %s", pid, e)
+
+def _execute_dftb(
+    workspace_dir: str,
+    cpus: Optional[List[int]] = None,
+    usage: Optional[Dict[str, Any]] = None,
+    control: Optional[ProcessControl] = None,
+    cpu_time_limit_s: Optional[float] = None,
+) -> int:
+    """
+    Runs the dftb+ binary to completion, streaming stdout/stderr into files in the workspace.
+
+    Args:
+        workspace_dir (str): The working directory for the calculation.
+        cpus (list, optional): CPU cores the process is pinned to; its thread count matches.
+        usage (dict, optional): Receives the CPU time and peak memory of the process.
+        control (ProcessControl, optional): Allows another thread to stop the process.
+        cpu_time_limit_s (float, optional): CPU time after which the kernel stops the process.
+
+    Returns:
+        int: The process return code (negative signal number if it was killed).
+    """
+    env = child_environment(len(cpus)) if cpus else None
+    console.info("Starting DFTB+ process (cpus=%s)...", cpus)
+    with open(os.path.join(workspace_dir, STDOUT_FILE), 'w') as stdout, \
+         open(os.path.join(workspace_dir, STDERR_FILE), 'w') as stderr:
+        process = subprocess.Popen(
+            ['dftb+'],
+            cwd=workspace_dir,
+            stdout=stdout,
+            stderr=stderr,
+            env=env,
+            start_new_session=True,
+        )
+        if cpu_time_limit_s is not None:
+            _limit_cpu_time(process.pid, cpu_time_limit_s)
+        if control is not None:
+            control.attach(process)
+        if cpus and hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(process.pid, cpus)
+            except OSError as e:
+                console.warning("Could not pin DFTB+ process %d to cpus %s: %s", process.pid, cpus, e)
+        with metrics.STAGE_DURATION.time(stage="run_dftb"):
+            returncode, child_usage = _wait_with_usage(process)
+
+    metrics.DFTB_EXIT_CODES.inc(code=str(returncode))
+    if child_usage:
+        metrics.DFTB_CPU_SECONDS.observe(child_usage["cpu_time_s"])
+        metrics.DFTB_MAX_RSS.observe(child_usage["max_rss_mb"] * 1024 * 1024)
+    if usage is not None:
+        usage.update(child_usage)
+    return returncode
+
+def _hit_cpu_time_limit(returncode: int, usage: Dict[str, Any], limit_s: Optional[float]) -> bool:
+    if limit_s is None or returncode >= 0:
+        return False
+    if returncode == -signal.SIGXCPU:
+        return True
+    return returncode == -signal.SIGKILL and usage.get("cpu_time_s", 0.0) >= limit_s
+
+def _resource_assignment(n_atoms: int, cpus: List[int]) -> Dict[str, Any]:
+    return {
+        "n_atoms": n_atoms,
+        "cpus": cpus,
+        "omp_num_threads": len(cpus),
+        "omp_stacksize": config.OMP_STACKSIZE,
+    }
+
+def read_log_tail(path: str, max_chars: int) -> str:
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - max_chars))
+            return f.read().decode('utf-8', errors='replace')
+    except FileNotFoundError:
+        return ""
+
+def _report_result(workspace_dir: str, returncode: int) -> bool:
+    if returncode != 0:
+        console.error("DFTB+ process failed with return code %d.", returncode)
+        console.display_text_in_panel(
+            read_log_tail(os.path.join(workspace_dir, STDERR_FILE), 20000), "DFTB+ Stderr"
+        )
+        return False
+
+    console.success("DFTB+ process completed successfully.")
+    # Reading the log tail costs file I/O on every run, so only do it when it is shown.
+    if console.is_enabled_for(logging.DEBUG):
+        console.debug("DFTB+ stdout:\n%s", read_log_tail(os.path.join(workspace_dir, STDOUT_FILE), 500))
+    return True
+
 def run_dftb(workspace_dir: str, input_gen_file: str, fmax: float, method: str) -> bool:
     """
     Prepare and run DFTB+ calculations in the given working directory.
+    This call blocks until DFTB+ exits; use run_dftb_async from coroutines.
     
     Args:
         workspace_dir (str): The working directory for the calculation.
@@ -60,34 +466,154 @@ def run_dftb(workspace_dir: str, input_gen_file: str, fmax: float, method: str)
     Returns:
         bool: Returns True if the calculation completes successfully, otherwise False.
     """
-    console.info(f"Preparing DFTB+ calculation in {workspace_dir}...")
-    hsd_content = generate_hsd_content(method, fmax, input_gen_file)
-    hsd_path = os.path.join(workspace_dir, "dftb_in.hsd")
-
     try:
-        with open(hsd_path, 'w') as f:
-            f.write(hsd_content)
-        console.success(f"Generated dftb_in.hsd for {method} with fmax={fmax} eV/Angstrom.")
+        atoms = read_gen_file(os.path.join(workspace_dir, input_gen_file))
+        _write_input(workspace_dir, input_gen_file, fmax, method, settings=select_settings(atoms, fmax))
+        cpus = core_allocator.acquire(len(atoms))
+        try:
+            returncode = _execute_dftb(workspace_dir, cpus)
+        finally:
+            core_allocator.release(cpus)
+        return _report_result(workspace_dir, returncode)
 
-        console.info("Starting DFTB+ process...")
-        result = subprocess.run(
-            ['dftb+'],
-            cwd=workspace_dir,
-            capture_output=True,
-            text=True,
-            check=False  
-        )
+    except Exception as e:
+        console.exception("An error occurred while running DFTB+: %s", e)
+        return False
+
+class DFTBExecutor(abc.ABC):
+    """
+    Runs DFTB+ on a prepared workspace (dftb_in.hsd and its input files).
+
+    Implementations decide where the process runs; afterwards the outputs are in the
+    workspace as if DFTB+ had run there, and run_info["execution"] describes the run.
+    """
 
-        if result.returncode != 0:
-            console.error("DFTB+ process failed!")
-            console.error(f"Return Code: {result.returncode}")
-            console.display_text_in_panel(result.stderr, "DFTB+ Stderr")
-            return False
+    name = "base"
 
-        console.success("DFTB+ process completed successfully.")
-        console.info(f"DFTB+ stdout:\n{result.stdout[-500:]}") 
-        return True
+    @abc.abstractmethod
+    async def execute(self, workspace_dir: str, estimate: Dict[str, Any], run_info: Dict[str, Any]) -> int:
+        """Runs DFTB+ to completion and returns its exit code."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"executor": self.name}
+
+
+class LocalExecutor(DFTBExecutor):
+    """
+    Runs DFTB+ as a child process of this host. The run waits until memory_admission
+    can fit its predicted memory and dftb_limiter has a free slot, is pinned to its own
+    cores by core_allocator, and is waited on in a dedicated thread pool.
+
+    The remaining CPU-time budget of the run (see run_limits) is enforced by the kernel.
+    If the waiting coroutine is cancelled, the process group is killed and the cores and
+    slot are handed back as soon as it has exited.
+    """
+
+    name = "local"
+
+    def __init__(self):
+        self._controls: set = set()
 
+    async def execute(self, workspace_dir: str, estimate: Dict[str, Any], run_info: Dict[str, Any]) -> int:
+        n_atoms = estimate["n_atoms"]
+        queued = time.perf_counter()
+        async with memory_admission.reserve(estimate), dftb_limiter.slot():
+            cpus = core_allocator.acquire(n_atoms)
+            started = time.perf_counter()
+            metrics.DFTB_QUEUE_WAIT.observe(started - queued)
+            run_info["execution"] = _resource_assignment(n_atoms, cpus)
+            run_info["execution"]["queue_wait_s"] = round(started - queued, 3)
+            usage: Dict[str, Any] = {}
+            cpu_limit = remaining_cpu_time()
+            control = ProcessControl(config.KILL_GRACE_S)
+            self._controls.add(control)
+            try:
+                loop = asyncio.get_running_loop()
+                # Run in a copy of the current context so log records keep the request id.
+                context = contextvars.copy_context()
+                future = loop.run_in_executor(
+                    _dftb_executor, context.run, _execute_dftb, workspace_dir, cpus, usage, control, cpu_limit
+                )
+                try:
+                    returncode = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    control.kill("cancelled")
+                    # Keep the cores and the slot until the process has exited.
+                    await asyncio.wait([future])
+                    raise
+                if _hit_cpu_time_limit(returncode, usage, cpu_limit):
+                    run_info["execution"]["terminated"] = CPU_TIME
+                return returncode
+            finally:
+                self._controls.discard(control)
+                core_allocator.release(cpus)
+                run_info["execution"]["wall_time_s"] = round(time.perf_counter() - started, 3)
+                run_info["execution"].update(usage)
+
+    def kill_all(self, reason: str):
+        """Stops every DFTB+ process this executor is running (e.g. on shutdown)."""
+        for control in list(self._controls):
+            control.kill(reason)
+
+
+local_executor = LocalExecutor()
+
+async def run_dftb_async(
+    workspace_dir: str,
+    input_gen_file: str,
+    fmax: float,
+    method: str,
+    executor: Optional[DFTBExecutor] = None,
+    scc_tolerance: Optional[float] = None,
+    **hsd_options,
+) -> Tuple[bool, Dict[str, Any]]:
+    """
+    Asyncio-native counterpart of run_dftb.
+
+    The k-point mesh, SCC and smearing settings are chosen for the structure (see
+    hsd_settings; scc_tolerance overrides the SCC tolerance), the input is written and
+    the run's memory predicted, then the prepared workspace is handed to the executor
+    (local_executor by default), which may run DFTB+ on this host or on a remote
+    worker. Extra keyword arguments are passed on to generate_hsd_content.
+
+    Returns:
+        tuple: (success, run_info) where run_info["execution"] describes where and
+        with which resources the run was executed, run_info["settings"] the chosen
+        electronic structure settings and run_info["admission"] the predicted resources.
+
+    Raises:
+        AdmissionRejected: If the structure can never fit into the memory budget.
+        RunLimitExceeded: If the CPU-time budget of the optimization is used up.
+    """
+    executor = executor or local_executor
+    run_info: Dict[str, Any] = {}
+    try:
+        atoms = read_gen_file(os.path.join(workspace_dir, input_gen_file))
+        settings = select_settings(atoms, fmax)
+        if scc_tolerance is not None:
+            settings["scc_tolerance"] = scc_tolerance
+        run_info["settings"] = settings
+        _write_input(workspace_dir, input_gen_file, fmax, method, settings=settings, **hsd_options)
+        estimate = resource_model.estimate(
+            atoms, method, threads=core_allocator.threads_for(len(atoms)),
+            max_steps=hsd_options.get("max_steps", 200), kpoints=n_kpoints(settings),
+        )
+        estimate["lane"] = memory_admission.lane(estimate)
+        run_info["admission"] = estimate
+        memory_admission.check(estimate)
+        remaining = remaining_cpu_time()
+        if remaining is not None and remaining < 1:
+            raise RunLimitExceeded(CPU_TIME, cpu_time_limit())
+
+        returncode = await executor.execute(workspace_dir, estimate, run_info)
+        execution = run_info.get("execution", {})
+        charge_cpu_time(execution.get("cpu_time_s", 0.0))
+        if execution.get("terminated") == CPU_TIME:
+            raise RunLimitExceeded(CPU_TIME, cpu_time_limit() or 0.0)
+        return _report_result(workspace_dir, returncode), run_info
+
+    except (AdmissionRejected, RunLimitExceeded):
+        raise
     except Exception as e:
-        console.exception(f"An error occurred while running DFTB+: {e}")
-        return False
+        console.exception("An error occurred while running DFTB+: %s", e)
+        return False, run_info
@@ -0,0 +1,22 @@
+# app/core/executors.py
+# Selects where DFTB+ runs are executed: on this host or on worker daemons via the work queue.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+from app.core import config
+from app.core.dftb_runner import DFTBExecutor, local_executor
+from app.core.work_queue import QueueExecutor, work_queue
+
+EXECUTORS = ("local", "queue")
+
+
+def create_executor(name: str) -> DFTBExecutor:
+    if name == "local":
+        return local_executor
+    if name == "queue":
+        return QueueExecutor(work_queue, config.QUEUE_POLL_SECONDS)
+    raise ValueError(f"Unknown executor '{name}'; expected one of {', '.join(EXECUTORS)}.")
+
+
+executor = create_executor(config.EXECUTOR)
@@ -0,0 +1,113 @@
+# app/core/hsd_settings.py
+# Derives k-point sampling, SCC tolerance, charge mixer and smearing of a DFTB+ run from the structure.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from ase import Atoms
+
+from app.core import config
+
+# Final SCC tolerance per eV/Angstrom of the force threshold, and its bounds. Errors in
+# the SCC charges show up in the forces, so tighter force thresholds need tighter SCC.
+SCC_TOLERANCE_PER_FMAX = 1e-4
+SCC_TOLERANCE_BOUNDS = (1e-7, 1e-5)
+
+# (largest atom count, Broyden mixing parameter, MaxSccIterations). Large cells are
+# prone to charge sloshing; smaller mixing steps keep the SCC cycle from oscillating.
+MIXER_TIERS: Tuple[Tuple[Optional[int], float, int], ...] = (
+    (200, 0.2, 100),
+    (1000, 0.1, 200),
+    (None, 0.05, 300),
+)
+
+
+def kpoint_mesh(atoms: Atoms, k_spacing: float) -> Optional[List[int]]:
+    """
+    Monkhorst-Pack mesh with at most `k_spacing` (1/Angstrom, including the 2*pi factor)
+    between k-points along each periodic reciprocal lattice vector. Non-periodic
+    directions get one k-point; None for non-periodic structures.
+    """
+    if atoms.cell.rank < 3 or not atoms.pbc.any():
+        return None
+    if k_spacing <= 0:
+        return [1, 1, 1]
+    lengths = 2 * math.pi * np.linalg.norm(atoms.cell.reciprocal(), axis=1)
+    return [
+        max(1, math.ceil(length / k_spacing - 1e-6)) if periodic else 1
+        for length, periodic in zip(lengths, atoms.pbc)
+    ]
+
+
+def kpoint_shift(mesh: List[int]) -> List[float]:
+    """Shifts for DFTB+ SupercellFolding that give the symmetric Monkhorst-Pack set."""
+    return [0.5 if n % 2 == 0 else 0.0 for n in mesh]
+
+
+def scc_tolerance_for(fmax: float) -> float:
+    low, high = SCC_TOLERANCE_BOUNDS
+    return float(min(high, max(low, fmax * SCC_TOLERANCE_PER_FMAX)))
+
+
+def mixer_for(n_atoms: int) -> Tuple[float, int]:
+    """(Broyden mixing parameter, MaxSccIterations) for a system size."""
+    for max_atoms, mixing_parameter, max_iterations in MIXER_TIERS:
+        if max_atoms is None or n_atoms <= max_atoms:
+            return mixing_parameter, max_iterations
+    raise AssertionError("MIXER_TIERS must end with an unbounded tier")
+
+
+def select_settings(
+    atoms: Atoms,
+    fmax: float,
+    k_spacing: Optional[float] = None,
+    electronic_temperature: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Electronic structure settings for an optimization of `atoms` down to `fmax`.
+    k_spacing and electronic_temperature default to DFTBOPT_K_SPACING and
+    DFTBOPT_ELECTRONIC_TEMPERATURE_K.
+
+    The returned dictionary is understood by generate_hsd_content and reported in
+    run_info["settings"].
+    """
+    if k_spacing is None:
+        k_spacing = config.K_SPACING
+    if electronic_temperature is None:
+        electronic_temperature = config.ELECTRONIC_TEMPERATURE_K
+    mesh = kpoint_mesh(atoms, k_spacing)
+    mixing_parameter, max_iterations = mixer_for(len(atoms))
+    return {
+        "kpoints": mesh,
+        "kpoint_shift": kpoint_shift(mesh) if mesh is not None else None,
+        "scc_tolerance": config.SCC_TOLERANCE or scc_tolerance_for(fmax),
+        "mixer": "Broyden",
+        "mixing_parameter": mixing_parameter,
+        "max_scc_iterations": max_iterations,
+        "electronic_temperature_K": electronic_temperature,
+    }
+
+
+def n_kpoints(settings: Optional[Dict[str, Any]]) -> int:
+    """Number of k-points in the full mesh (before symmetry reduction)."""
+    if not settings or not settings.get("kpoints"):
+        return 1
+    return int(np.prod(settings["kpoints"]))
+
+
+def coarse_scc_stage(fmax: float) -> Optional[Tuple[float, float]]:
+    """
+    (force threshold, SCC tolerance) of the loose first phase of a two-phase optimization,
+    or None if the requested threshold is already loose enough to run in one phase.
+
+    Far from the minimum the forces are large and the geometry changes a lot per step,
+    so converging every SCC cycle tightly is wasted work; the tight phase then starts
+    from the coarse geometry and its converged charges.
+    """
+    if config.SCC_COARSE_FMAX <= 0 or fmax >= config.SCC_COARSE_FMAX:
+        return None
+    return config.SCC_COARSE_FMAX, max(config.SCC_COARSE_TOLERANCE, scc_tolerance_for(fmax))
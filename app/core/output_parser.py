@@ -5,13 +5,67 @@
 # Version: 0.1.0
 
 import re
-from typing import Dict, Any
+from typing import BinaryIO, Dict, Any, Iterator, Tuple
+
+FINAL_BLOCK_MARKER = b"Total Mermin free energy"
+
+# Files are scanned in chunks of this many bytes, cut back to the last line break.
+CHUNK_SIZE = 4 * 1024 * 1024
+
+WARNING_PATTERN = re.compile(rb"Warning: (.*)")
+FERMI_PATTERN = re.compile(rb"Fermi level:\s*([-\d\.E\+]+)\s*H\s*([-\d\.E\+]+)\s*eV")
+CHARGE_PATTERN = re.compile(rb"Total charge:\s*([-\d\.]+)")
+DIPOLE_PATTERN = re.compile(rb"Dipole moment:\s*([-\d\.E\+]+)\s*([-\d\.E\+]+)\s*([-\d\.E\+]+)\s*Debye")
+ENERGY_PATTERN = re.compile(rb"^\s*(.+?):\s*([-\d\.E\+]+)\s*H\s*([-\d\.E\+]+)\s*eV", re.MULTILINE)
+
+ENERGY_KEY_MAP = {
+    "Band energy": "band_energy", "Band free energy (E-TS)": "band_free_energy",
+    "Energy H0": "energy_h0", "Energy SCC": "energy_scc",
+    "Total Electronic energy": "total_electronic_energy",
+    "Repulsive energy": "repulsive_energy", "Total energy": "total_energy",
+    "Total Mermin free energy": "total_mermin_free_energy",
+    "Force related energy": "force_related_energy"
+}
+
+
+def _iter_chunks(f: BinaryIO, start: int = 0) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yields (offset, chunk) pairs from `start` to the end of the file. Every chunk
+    except the last ends with a line break, so single-line patterns never straddle
+    two chunks. Offsets are byte positions in the file.
+    """
+    f.seek(start)
+    offset = start
+    carry = b""
+    while True:
+        data = f.read(CHUNK_SIZE)
+        if not data:
+            break
+        data = carry + data
+        cut = data.rfind(b"\n") + 1
+        if cut == 0:
+            carry = data
+            continue
+        chunk, carry = data[:cut], data[cut:]
+        yield offset, chunk
+        offset += len(chunk)
+    if carry:
+        yield offset, carry
+
+
+def _decode(value: bytes) -> str:
+    return value.decode("utf-8", errors="replace")
+
 
 def parse_detailed_out(file_path: str) -> Dict[str, Any]:
     """
     Parses a DFTB+ detailed.out file for key summary information.
-    This version is optimized to locate the final results block first
-    and then extract the required data, improving efficiency.
+
+    The file is streamed in fixed-size chunks so memory stays bounded however large it
+    grows (AppendGeometries runs on big cells can produce hundreds of MB). A first pass
+    collects file-wide information (warnings, convergence, dipole) and remembers where
+    the last "Total Mermin free energy" marker is; a second pass reads only the final
+    results block after that marker.
 
     Args:
         file_path (str): The path to the detailed.out file.
@@ -28,35 +82,50 @@ def parse_detailed_out(file_path: str) -> Dict[str, Any]:
     }
 
     try:
-        with open(file_path, 'r') as f:
-            content = f.read()
-
-        results['summary']['warnings'] = re.findall(r"Warning: (.*)", content)
-        results['summary']['convergence_status'] = "Geometry converged" if "Geometry converged" in content else "Not converged"
-        results['summary']['calculation_status'] = 'Success'
-
-
-        final_block_marker = "Total Mermin free energy"
-        blocks = content.split(final_block_marker)
-        
-        if len(blocks) > 1:
-            final_block = blocks[-1]
-        else:
-            final_block = content
-
+        with open(file_path, 'rb') as f:
+            warnings = []
+            geometry_converged = False
+            dipole_match = None
+            final_block_start = 0
+
+            for offset, chunk in _iter_chunks(f):
+                warnings.extend(_decode(w.rstrip(b"\r")) for w in WARNING_PATTERN.findall(chunk))
+                if not geometry_converged:
+                    geometry_converged = b"Geometry converged" in chunk
+                if dipole_match is None:
+                    dipole_match = DIPOLE_PATTERN.search(chunk)
+                marker_pos = chunk.rfind(FINAL_BLOCK_MARKER)
+                if marker_pos >= 0:
+                    final_block_start = offset + marker_pos + len(FINAL_BLOCK_MARKER)
+
+            results['summary']['warnings'] = warnings
+            results['summary']['convergence_status'] = "Geometry converged" if geometry_converged else "Not converged"
+            results['summary']['calculation_status'] = 'Success'
+
+            scc_converged = False
+            fermi_match = None
+            charge_match = None
+            for _, chunk in _iter_chunks(f, final_block_start):
+                scc_converged = scc_converged or b"SCC converged" in chunk
+                if fermi_match is None:
+                    fermi_match = FERMI_PATTERN.search(chunk)
+                if charge_match is None:
+                    charge_match = CHARGE_PATTERN.search(chunk)
+                for match in ENERGY_PATTERN.finditer(chunk):
+                    key = _decode(match.group(1)).strip()
+                    if key in ENERGY_KEY_MAP:
+                        json_key = ENERGY_KEY_MAP[key]
+                        results['energies_hartree'][json_key] = float(match.group(2))
+                        results['energies_eV'][json_key] = float(match.group(3))
+
+        results['convergence_info']['scc_converged'] = scc_converged
 
-        scc_converged = re.search(r"SCC converged", final_block)
-        results['convergence_info']['scc_converged'] = bool(scc_converged)
-
-        fermi_match = re.search(r"Fermi level:\s*([-\d\.E\+]+)\s*H\s*([-\d\.E\+]+)\s*eV", final_block)
         if fermi_match:
             results['electronic_properties']['fermi_level_eV'] = float(fermi_match.group(2))
 
-        charge_match = re.search(r"Total charge:\s*([-\d\.]+)", final_block)
         if charge_match:
             results['electronic_properties']['total_charge'] = float(charge_match.group(1))
-            
-        dipole_match = re.search(r"Dipole moment:\s*([-\d\.E\+]+)\s*([-\d\.E\+]+)\s*([-\d\.E\+]+)\s*Debye", content)
+
         if dipole_match:
             results['electronic_properties']['dipole_moment_debye'] = {
                 "x": float(dipole_match.group(1)),
@@ -64,24 +133,6 @@ def parse_detailed_out(file_path: str) -> Dict[str, Any]:
                 "z": float(dipole_match.group(3)),
             }
 
-
-        energy_pattern = re.compile(r"^\s*(.+?):\s*([-\d\.E\+]+)\s*H\s*([-\d\.E\+]+)\s*eV", re.MULTILINE)
-        energy_key_map = {
-            "Band energy": "band_energy", "Band free energy (E-TS)": "band_free_energy",
-            "Energy H0": "energy_h0", "Energy SCC": "energy_scc",
-            "Total Electronic energy": "total_electronic_energy",
-            "Repulsive energy": "repulsive_energy", "Total energy": "total_energy",
-            "Total Mermin free energy": "total_mermin_free_energy",
-            "Force related energy": "force_related_energy"
-        }
-
-        for match in energy_pattern.finditer(final_block):
-            key = match.group(1).strip()
-            if key in energy_key_map:
-                json_key = energy_key_map[key]
-                results['energies_hartree'][json_key] = float(match.group(2))
-                results['energies_eV'][json_key] = float(match.group(3))
-
     except FileNotFoundError:
         results['summary']['calculation_status'] = 'Failed'
         results['summary']['error'] = f"File not found: {file_path}"
@@ -0,0 +1,228 @@
+# app/core/preprocessing.py
+# Cheap structure checks and clean-up that run before any DFTB+ input is written.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from ase import Atoms
+from ase.data import chemical_symbols, covalent_radii
+
+from app.core import config
+from app.utils.file_convertor import StructureInput, as_atoms
+
+# Elements with GFN-xTB parameters: both methods cover H to Rn.
+METHOD_ELEMENTS = {
+    "GFN1-xTB": range(1, 87),
+    "GFN2-xTB": range(1, 87),
+}
+
+# Atoms are bonded when closer than this multiple of the sum of their covalent radii.
+BOND_FACTOR = 1.2
+
+# Smallest volume per atom (Angstrom^3) of a sane periodic cell; condensed matter has 5-50.
+MIN_VOLUME_PER_ATOM = 1.0
+
+# Solvent molecules consist of these elements only; lone metal ions are never dropped.
+SOLVENT_ELEMENTS = frozenset(["H", "B", "C", "N", "O", "F", "Si", "P", "S", "Cl", "Br", "I"])
+
+
+class StructureRejected(ValueError):
+    """The structure cannot give a meaningful DFTB+ run; `reason` says why."""
+
+    def __init__(self, message: str, reason: str, details: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.reason = reason
+        self.details = details or {}
+
+
+def read_structure(structure: StructureInput) -> Atoms:
+    """
+    Parses the input like as_atoms, turning parser errors into StructureRejected.
+    """
+    try:
+        atoms = as_atoms(structure)
+    except Exception as e:
+        raise StructureRejected(
+            f"The structure file could not be read: {str(e) or type(e).__name__}", "unreadable"
+        ) from None
+    if len(atoms) == 0:
+        raise StructureRejected("The structure contains no atoms.", "empty")
+    return atoms
+
+
+def _check_geometry(atoms: Atoms):
+    if not np.isfinite(atoms.positions).all():
+        raise StructureRejected("The structure has non-finite atomic coordinates.", "invalid_coordinates")
+    if not atoms.pbc.any():
+        return
+    if atoms.cell.rank < 3:
+        raise StructureRejected(
+            "The structure is periodic but its cell is missing or degenerate.", "degenerate_cell",
+            {"cell": atoms.cell.array.tolist()},
+        )
+    volume_per_atom = abs(atoms.cell.volume) / len(atoms)
+    if volume_per_atom < MIN_VOLUME_PER_ATOM:
+        raise StructureRejected(
+            f"The cell holds {volume_per_atom:.3f} A^3 per atom; its parameters are probably wrong.",
+            "degenerate_cell", {"volume_per_atom_A3": round(volume_per_atom, 4)},
+        )
+
+
+def _check_species(atoms: Atoms, method: str):
+    covered = METHOD_ELEMENTS.get(method)
+    if covered is None:
+        return
+    unsupported = sorted({int(z) for z in atoms.numbers if z not in covered})
+    if unsupported:
+        symbols = [chemical_symbols[z] for z in unsupported]
+        raise StructureRejected(
+            f"{method} has no parameters for {', '.join(symbols)}.", "unsupported_elements",
+            {"elements": symbols},
+        )
+
+
+def _pairs(atoms: Atoms, cutoff) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Each neighbour pair once (i <= j, periodic images included) with its distance."""
+    # Deferred: ase.neighborlist pulls in scipy, which is slow to import
+    from ase.neighborlist import neighbor_list
+
+    i, j, d = neighbor_list("ijd", atoms, cutoff, self_interaction=False)
+    keep = i <= j
+    return i[keep], j[keep], d[keep]
+
+
+def _drop_duplicates(atoms: Atoms, tolerance: float) -> Tuple[Atoms, int]:
+    """Removes atoms that sit on an atom of the same element (e.g. CIF symmetry copies)."""
+    if tolerance <= 0 or len(atoms) < 2:
+        return atoms, 0
+    i, j, _ = _pairs(atoms, tolerance)
+    same = (i != j) & (atoms.numbers[i] == atoms.numbers[j])
+    duplicates = np.unique(j[same])
+    if len(duplicates) == 0:
+        return atoms, 0
+    keep = np.ones(len(atoms), dtype=bool)
+    keep[duplicates] = False
+    return atoms[keep], len(duplicates)
+
+
+def _primitive_cell(atoms: Atoms) -> Atoms:
+    """Primitive cell found by spglib (an optional dependency), without idealizing positions."""
+    try:
+        import spglib
+    except ImportError:
+        raise StructureRejected(
+            "Reducing to the primitive cell needs the optional 'spglib' package.", "primitive_unavailable"
+        ) from None
+    cell = (atoms.cell.array, atoms.get_scaled_positions(), atoms.numbers)
+    reduced = spglib.standardize_cell(cell, to_primitive=True, no_idealize=True, symprec=1e-3)
+    if reduced is None or len(reduced[2]) >= len(atoms):
+        return atoms
+    lattice, scaled_positions, numbers = reduced
+    return Atoms(numbers=numbers, scaled_positions=scaled_positions, cell=lattice, pbc=True)
+
+
+def _drop_solvent(atoms: Atoms, max_atoms: int) -> Tuple[Atoms, int]:
+    """
+    Removes small molecules made of non-metal atoms only (solvent, guests) from a
+    structure that also holds a larger fragment (framework, host). Nothing is removed
+    if every fragment is small, as in a molecular crystal.
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    radii = covalent_radii[atoms.numbers] * BOND_FACTOR
+    i, j, _ = _pairs(atoms, radii)
+    graph = coo_matrix((np.ones(len(i)), (i, j)), shape=(len(atoms), len(atoms)))
+    n_fragments, labels = connected_components(graph, directed=False)
+    sizes = np.bincount(labels, minlength=n_fragments)
+    if sizes.max() <= max_atoms:
+        return atoms, 0
+    non_metal = np.array([symbol in SOLVENT_ELEMENTS for symbol in atoms.get_chemical_symbols()])
+    drop = np.zeros(len(atoms), dtype=bool)
+    for fragment in np.flatnonzero(sizes <= max_atoms):
+        members = labels == fragment
+        if non_metal[members].all():
+            drop |= members
+    return atoms[~drop], int(drop.sum())
+
+
+def _check_distances(atoms: Atoms, factor: float) -> Optional[float]:
+    """
+    Rejects atoms closer than `factor` times the sum of their covalent radii, including
+    periodic images of an atom itself. Returns the shortest interatomic distance.
+    """
+    radii = covalent_radii[atoms.numbers]
+    i, j, d = _pairs(atoms, radii * max(factor, BOND_FACTOR))
+    if len(d) == 0:
+        return None
+    clash = d < factor * (radii[i] + radii[j])
+    if clash.any():
+        worst = np.flatnonzero(clash)[np.argmin(d[clash])]
+        a, b = int(i[worst]), int(j[worst])
+        symbols = atoms.get_chemical_symbols()
+        raise StructureRejected(
+            f"Atoms {a} ({symbols[a]}) and {b} ({symbols[b]}) are only {d[worst]:.3f} A apart "
+            f"({int(clash.sum())} overlapping pair(s)).", "overlapping_atoms",
+            {"atoms": [a, b], "distance_A": round(float(d[worst]), 4), "overlapping_pairs": int(clash.sum())},
+        )
+    return float(d.min())
+
+
+def validate_structure(atoms: Atoms, method: str) -> Optional[float]:
+    """
+    The checks of preprocess_structure without any clean-up, for structures that must
+    be computed exactly as given. Returns the shortest interatomic distance.
+
+    Raises:
+        StructureRejected: If the structure is unusable.
+    """
+    _check_geometry(atoms)
+    _check_species(atoms, method)
+    return _check_distances(atoms, config.MIN_DISTANCE_FACTOR)
+
+
+def preprocess_structure(
+    atoms: Atoms,
+    method: str,
+    primitive_cell: bool = False,
+    remove_solvent: bool = False,
+) -> Tuple[Atoms, Dict[str, Any]]:
+    """
+    Validates a structure and reduces it to what DFTB+ has to compute, in milliseconds
+    and before any process is started.
+
+    Checks the coordinates and cell, the element coverage of `method` and, on a
+    neighbour list under periodic boundary conditions, that no atoms overlap.
+    Duplicate atoms within DFTBOPT_DUPLICATE_TOLERANCE_A are always dropped; with
+    primitive_cell the cell is reduced to the primitive one, and with remove_solvent
+    small non-metal molecules (up to DFTBOPT_SOLVENT_MAX_ATOMS atoms) are removed.
+
+    Returns:
+        (the structure to optimize, report of what was changed)
+
+    Raises:
+        StructureRejected: If the structure is unusable.
+    """
+    n_input = len(atoms)
+    _check_geometry(atoms)
+    _check_species(atoms, method)
+
+    atoms, duplicates = _drop_duplicates(atoms, config.DUPLICATE_TOLERANCE_A)
+    if primitive_cell and atoms.pbc.all():
+        atoms = _primitive_cell(atoms)
+    solvent = None
+    if remove_solvent:
+        atoms, solvent = _drop_solvent(atoms, config.SOLVENT_MAX_ATOMS)
+    min_distance = _check_distances(atoms, config.MIN_DISTANCE_FACTOR)
+
+    return atoms, {
+        "n_atoms_input": n_input,
+        "n_atoms": len(atoms),
+        "duplicates_removed": duplicates,
+        "primitive_cell": bool(primitive_cell and atoms.pbc.all()),
+        "solvent_atoms_removed": solvent,
+        "min_distance_A": round(min_distance, 4) if min_distance is not None else None,
+    }
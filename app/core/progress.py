@@ -0,0 +1,212 @@
+# app/core/progress.py
+# Incremental parsing of DFTB+ stdout into per-step geometry optimization records.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import os
+import re
+import time
+import asyncio
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+GEOMETRY_STEP_PATTERN = re.compile(r"Geometry step:\s*(\d+)")
+SCC_ITERATION_PATTERN = re.compile(r"^\s*\d+\s+[-+]?\d*\.\d+E[-+]\d+")
+TOTAL_ENERGY_PATTERN = re.compile(r"Total Energy:\s*([-\d\.E\+]+)\s*H\s*([-\d\.E\+]+)\s*eV", re.IGNORECASE)
+MAX_GRADIENT_PATTERN = re.compile(
+    r"(?:Maximal force component|Maximal derivative component|Max force for moved atoms):?\s*([-\d\.E\+]+)"
+)
+MAX_LATTICE_GRADIENT_PATTERN = re.compile(r"Maximal Lattice force component:?\s*([-\d\.E\+]+)")
+
+# Upper bound on the bytes read from a followed log per poll.
+READ_SIZE = 1024 * 1024
+
+
+class StepProgressParser:
+    """
+    Turns DFTB+ stdout lines into one record per geometry optimization step.
+
+    Lines are fed one at a time; a step's record is emitted when the next step
+    starts, or when finish() is called at the end of the run.
+    """
+
+    def __init__(self):
+        self._current: Optional[Dict[str, Any]] = None
+        self._step_started: Optional[float] = None
+
+    def _new_record(self, step: int) -> Dict[str, Any]:
+        return {
+            "step": step,
+            "total_energy_eV": None,
+            "max_gradient": None,
+            "max_lattice_gradient": None,
+            "scc_iterations": 0,
+            "wall_time_s": None,
+        }
+
+    def _close_current(self, now: Optional[float]) -> List[Dict[str, Any]]:
+        if self._current is None:
+            return []
+        record = self._current
+        if now is not None and self._step_started is not None:
+            record["wall_time_s"] = round(now - self._step_started, 3)
+        self._current = None
+        return [record]
+
+    def feed(self, line: str, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Processes one stdout line.
+
+        Args:
+            line: A single line of DFTB+ stdout.
+            now: Time the line was observed (time.monotonic()), or None when replaying
+                 output whose timing is unknown.
+
+        Returns:
+            Records for steps that completed with this line (usually empty).
+        """
+        step_match = GEOMETRY_STEP_PATTERN.search(line)
+        if step_match:
+            completed = self._close_current(now)
+            self._current = self._new_record(int(step_match.group(1)))
+            self._step_started = now
+            return completed
+
+        record = self._current
+        if record is None:
+            return []
+
+        if SCC_ITERATION_PATTERN.match(line):
+            record["scc_iterations"] += 1
+        elif "Energy" in line or "energy" in line:
+            energy_match = TOTAL_ENERGY_PATTERN.search(line)
+            if energy_match:
+                record["total_energy_eV"] = float(energy_match.group(2))
+        elif "Lattice force" in line:
+            lattice_match = MAX_LATTICE_GRADIENT_PATTERN.search(line)
+            if lattice_match:
+                record["max_lattice_gradient"] = float(lattice_match.group(1))
+        elif "force" in line or "derivative" in line:
+            gradient_match = MAX_GRADIENT_PATTERN.search(line)
+            if gradient_match:
+                record["max_gradient"] = float(gradient_match.group(1))
+        return []
+
+    def finish(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Emits the record of the last, still open step."""
+        return self._close_current(now)
+
+
+def summarize_stdout(path: str) -> List[Dict[str, Any]]:
+    """Parses a complete DFTB+ stdout log into its per-step records."""
+    parser = StepProgressParser()
+    records: List[Dict[str, Any]] = []
+    try:
+        with open(path, "r", errors="replace") as f:
+            for line in f:
+                records.extend(parser.feed(line))
+    except FileNotFoundError:
+        return records
+    records.extend(parser.finish())
+    return records
+
+
+async def follow_step_records(
+    find_log: Callable[[], Optional[str]],
+    is_finished: Callable[[], bool],
+    poll_interval: float = 0.5,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Follows a growing DFTB+ stdout log and yields per-step records as they appear.
+
+    Only newly appended bytes are read on every poll, so following many runs at once
+    stays cheap. Steps already written when following starts are replayed without
+    wall times.
+
+    Args:
+        find_log: Returns the current path of the log, or None while it does not exist yet.
+        is_finished: Returns True once the run will not write any more output.
+        poll_interval: Seconds to wait between polls for new output.
+    """
+    parser = StepProgressParser()
+
+    path = find_log()
+    while path is None:
+        if is_finished():
+            return
+        await asyncio.sleep(poll_interval)
+        path = find_log()
+
+    # The open handle keeps following the same file even if it is moved afterwards.
+    with open(path, "rb") as f:
+        partial = b""
+        caught_up = False
+        while True:
+            finished = is_finished()
+            data = f.read(READ_SIZE)
+            if data:
+                now = time.monotonic() if caught_up else None
+                lines = (partial + data).split(b"\n")
+                partial = lines.pop()
+                for raw in lines:
+                    for record in parser.feed(raw.decode("utf-8", errors="replace"), now):
+                        yield record
+            elif finished:
+                break
+            else:
+                caught_up = True
+                await asyncio.sleep(poll_interval)
+
+        now = time.monotonic() if caught_up else None
+        if partial:
+            for record in parser.feed(partial.decode("utf-8", errors="replace"), now):
+                yield record
+        for record in parser.finish(now):
+            yield record
+
+
+async def follow_stage_records(
+    find_logs: Callable[[], List[Tuple[str, Optional[str]]]],
+    is_finished: Callable[[], bool],
+    poll_interval: float = 0.5,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Follows the DFTB+ stdout logs of a multi-stage run one after the other and yields
+    their per-step records, tagged with the stage they belong to. A stage's log is
+    followed until a later stage has started or the run is finished; stages that never
+    wrote a log are skipped.
+
+    Args:
+        find_logs: Returns (stage, current path of its log or None) for every stage,
+            in execution order.
+        is_finished: Returns True once the run will not write any more output.
+        poll_interval: Seconds to wait between polls for new output.
+    """
+    next_stage = 0
+    while True:
+        finished = is_finished()
+        logs = find_logs()
+        started = [index for index in range(next_stage, len(logs)) if logs[index][1] is not None]
+        if not started:
+            if finished:
+                return
+            await asyncio.sleep(poll_interval)
+            continue
+
+        index = started[0]
+        stage, path = logs[index]
+
+        def stage_done() -> bool:
+            return is_finished() or any(later is not None for _, later in find_logs()[index + 1:])
+
+        async for record in follow_step_records(lambda: path, stage_done, poll_interval):
+            yield {"stage": stage, **record}
+        next_stage = index + 1
+
+
+def log_path_if_exists(*candidates: str) -> Optional[str]:
+    """Returns the first existing path among the candidates."""
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    return None
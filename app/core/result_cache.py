@@ -0,0 +1,148 @@
+# app/core/result_cache.py
+# Content-addressed on-disk cache of finished optimizations.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from ase import Atoms
+
+from app.core import config
+from app.utils.logger import console
+
+RESULTS_FILE = "results.json"
+CIF_FILE = "geo_end.cif"
+
+
+def structure_fingerprint(atoms: Atoms, tolerance: float = 1e-3) -> str:
+    """
+    Computes a canonical hash of a structure.
+
+    The hash depends only on the species, the cell parameters and the wrapped atomic
+    positions, each rounded to `tolerance` (Angstrom / degrees). It is independent of
+    atom order, cell orientation and the formatting of the source file.
+
+    Args:
+        atoms (Atoms): The structure to fingerprint.
+        tolerance (float): Rounding tolerance for positions and cell parameters.
+
+    Returns:
+        str: Hex-encoded SHA-256 digest.
+    """
+    cellpar = atoms.cell.cellpar()
+    pbc = [bool(p) for p in atoms.pbc]
+
+    if atoms.cell.rank == 3:
+        lengths = cellpar[:3]
+        # Integer grid along each axis; positions on the grid are wrapped periodically.
+        grid = np.maximum(np.rint(lengths / tolerance), 1).astype(np.int64)
+        scaled = atoms.get_scaled_positions(wrap=True)
+        quantized = np.rint(scaled * grid).astype(np.int64) % grid
+    else:
+        quantized = np.rint(atoms.get_positions() / tolerance).astype(np.int64)
+
+    rows = np.column_stack([atoms.get_atomic_numbers().astype(np.int64), quantized])
+    rows = rows[np.lexsort(rows.T[::-1])]
+
+    canonical = {
+        "numbers_positions": rows.tolist(),
+        "cellpar": np.rint(cellpar / tolerance).astype(np.int64).tolist(),
+        "pbc": pbc,
+    }
+    return hashlib.sha256(json.dumps(canonical, separators=(",", ":")).encode()).hexdigest()
+
+
+def cache_key(fingerprint: str, hsd_parameters: str) -> str:
+    """Combines a structure fingerprint with the DFTB+ input that would be used for it."""
+    return hashlib.sha256(f"{fingerprint}\n{hsd_parameters}".encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Stores parsed detailed.out results and optimized CIF files on disk, one directory
+    per cache key, and evicts least recently used entries beyond `max_bytes`.
+    """
+
+    def __init__(self, base_dir: str, max_bytes: int):
+        self.base_dir = base_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.base_dir, key)
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """
+        Returns (parsed_results, cif_content) on a hit, otherwise None.
+        A hit refreshes the entry's position in the LRU order.
+        """
+        if not self.enabled:
+            return None
+        entry_dir = self._entry_dir(key)
+        results_path = os.path.join(entry_dir, RESULTS_FILE)
+        cif_path = os.path.join(entry_dir, CIF_FILE)
+        with self._lock:
+            try:
+                with open(results_path, "r") as f:
+                    parsed_data = json.load(f)
+                with open(cif_path, "rb") as f:
+                    cif_content = f.read()
+            except (FileNotFoundError, json.JSONDecodeError):
+                return None
+            os.utime(entry_dir)
+        return parsed_data, cif_content
+
+    def put(self, key: str, parsed_data: Dict[str, Any], cif_content: bytes):
+        if not self.enabled:
+            return
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with self._lock:
+            os.makedirs(tmp_dir, exist_ok=True)
+            with open(os.path.join(tmp_dir, RESULTS_FILE), "w") as f:
+                json.dump(parsed_data, f)
+            with open(os.path.join(tmp_dir, CIF_FILE), "wb") as f:
+                f.write(cif_content)
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir)
+            os.replace(tmp_dir, entry_dir)
+            self._evict()
+
+    def _entry_size(self, entry_dir: str) -> int:
+        total = 0
+        for name in os.listdir(entry_dir):
+            try:
+                total += os.path.getsize(os.path.join(entry_dir, name))
+            except OSError:
+                pass
+        return total
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.base_dir):
+            path = os.path.join(self.base_dir, name)
+            if ".tmp-" in name or not os.path.isdir(path):
+                continue
+            entries.append((os.path.getmtime(path), self._entry_size(path), path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            console.info("Evicted result cache entry %s", os.path.basename(path))
+
+
+result_cache = ResultCache(config.CACHE_DIR, config.CACHE_MAX_BYTES)
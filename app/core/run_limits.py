@@ -0,0 +1,118 @@
+# app/core/run_limits.py
+# Wall-clock and CPU-time limits of optimization runs.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, Iterator, Optional, TypeVar
+
+WALL_TIME = "wall_time"
+CPU_TIME = "cpu_time"
+LIMIT_NAMES = {WALL_TIME: "wall-clock", CPU_TIME: "CPU-time"}
+
+T = TypeVar("T")
+
+# CPU-time budget of the optimization running in the current context. All DFTB+ runs of
+# its stages draw from the same budget.
+_cpu_budget: ContextVar[Optional[Dict[str, float]]] = ContextVar("cpu_budget", default=None)
+# Wall-clock deadline (an asyncio.Timeout) of the optimization running in the current context.
+_wall_clock: ContextVar[Optional[Any]] = ContextVar("wall_clock", default=None)
+
+
+class RunLimitExceeded(Exception):
+    """An optimization was stopped because it used up its wall-clock or CPU-time limit."""
+
+    def __init__(self, limit: str, seconds: float):
+        self.limit = limit
+        self.seconds = seconds
+        super().__init__(f"The run exceeded its {LIMIT_NAMES[limit]} limit of {seconds:g} s.")
+
+
+def resolve_limit(requested: Optional[float], maximum: float) -> Optional[float]:
+    """
+    Effective limit of a run: the requested one, capped at the configured maximum.
+    Without a request the maximum applies; None (or 0) means unlimited.
+    """
+    if requested is not None and requested <= 0:
+        requested = None
+    if maximum > 0:
+        return maximum if requested is None else min(requested, maximum)
+    return requested
+
+
+@contextmanager
+def cpu_time_budget(seconds: Optional[float]) -> Iterator[None]:
+    """Gives the DFTB+ runs started within the block `seconds` of CPU time in total."""
+    token = _cpu_budget.set({"limit_s": seconds, "used_s": 0.0} if seconds else None)
+    try:
+        yield
+    finally:
+        _cpu_budget.reset(token)
+
+
+def cpu_time_limit() -> Optional[float]:
+    budget = _cpu_budget.get()
+    return budget["limit_s"] if budget is not None else None
+
+
+def remaining_cpu_time() -> Optional[float]:
+    """CPU seconds left in the current budget, or None without a limit."""
+    budget = _cpu_budget.get()
+    if budget is None:
+        return None
+    return max(0.0, budget["limit_s"] - budget["used_s"])
+
+
+def charge_cpu_time(seconds: float):
+    budget = _cpu_budget.get()
+    if budget is not None:
+        budget["used_s"] += seconds
+
+
+@contextmanager
+def wall_clock_paused() -> Iterator[None]:
+    """
+    Stops the wall-clock limit of the current optimization for the duration of the block,
+    e.g. while it waits in the scheduler queue, so time spent waiting for a turn is not
+    held against the run.
+    """
+    timeout = _wall_clock.get()
+    if timeout is None or timeout.when() is None or timeout.expired():
+        yield
+        return
+    loop = asyncio.get_running_loop()
+    remaining = timeout.when() - loop.time()
+    timeout.reschedule(None)
+    try:
+        yield
+    finally:
+        timeout.reschedule(loop.time() + remaining)
+
+
+async def enforce_limits(
+    optimization: Awaitable[T], wall_time_s: Optional[float] = None, cpu_time_s: Optional[float] = None
+) -> T:
+    """
+    Awaits an optimization within a CPU-time budget and a wall-clock deadline. At the
+    deadline the optimization is cancelled, which stops its DFTB+ process. The clock does
+    not run while the optimization waits for a scheduler slot (see wall_clock_paused).
+
+    Raises:
+        RunLimitExceeded: If the deadline passed (or, from the runner, the budget ran out).
+    """
+    with cpu_time_budget(cpu_time_s):
+        timeout = asyncio.timeout(wall_time_s)
+        try:
+            async with timeout:
+                token = _wall_clock.set(timeout)
+                try:
+                    return await optimization
+                finally:
+                    _wall_clock.reset(token)
+        except TimeoutError:
+            if not timeout.expired():
+                raise
+            raise RunLimitExceeded(WALL_TIME, wall_time_s) from None
@@ -0,0 +1,349 @@
+# app/core/scheduler.py
+# Fair-share, size-aware scheduling of optimizations across clients (tenants) and priority classes.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import time
+import asyncio
+from collections import deque
+from itertools import accumulate
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from app.core import config
+from app.core import metrics
+from app.core.run_limits import wall_clock_paused
+from app.utils.logger import console
+
+PRIORITY_HIGH = "high"
+PRIORITY_NORMAL = "normal"
+PRIORITY_LOW = "low"
+# Best class first; the index is the rank a ticket starts with.
+PRIORITY_CLASSES = (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+
+DEFAULT_TENANT = "anonymous"
+
+# What a started ticket reports to its holder (and the optimization's run_info).
+TICKET_FIELDS = ("tenant", "priority", "n_atoms", "expected_s", "queue_wait_s")
+
+# Expected run times below this are rounded up, so tiny structures do not get an
+# unbounded response ratio.
+MIN_EXPECTED_S = 1.0
+# Idle tenants (nothing waiting or running) are forgotten after this long.
+TENANT_RETENTION_S = 24 * 3600.0
+# Queue positions are recomputed when tickets arrive, start or finish, and otherwise at
+# most this often (waiting times shift the order slowly through aging and response ratios).
+ORDER_REFRESH_S = 1.0
+
+# Tenant and priority class of the optimization running in the current context.
+_scheduling: ContextVar[Optional[Dict[str, str]]] = ContextVar("scheduling", default=None)
+# Ticket of the slot held by the current context; nested slot() calls pass through.
+_held: ContextVar[Optional[Dict[str, Any]]] = ContextVar("held_slot", default=None)
+
+
+@contextmanager
+def scheduling(tenant: Optional[str], priority: str = PRIORITY_NORMAL) -> Iterator[None]:
+    """Schedules the optimizations started within the block for `tenant` in the `priority` class."""
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"Unknown priority '{priority}'; expected one of {', '.join(PRIORITY_CLASSES)}.")
+    token = _scheduling.set({"tenant": tenant or DEFAULT_TENANT, "priority": priority})
+    try:
+        yield
+    finally:
+        _scheduling.reset(token)
+
+
+def current_scheduling() -> Dict[str, str]:
+    return dict(_scheduling.get() or {"tenant": DEFAULT_TENANT, "priority": PRIORITY_NORMAL})
+
+
+class _Tenant:
+    """Counters of one tenant; usage is slot time that decays with the scheduler's half-life."""
+
+    def __init__(self, now: float):
+        self.waiting = 0
+        self.running = 0
+        self.started = 0
+        self.finished = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+        self.turnaround_total_s = 0.0
+        self.usage_s = 0.0
+        self.usage_stamp = now
+        self.last_active = now
+        self.finish_times: Deque[float] = deque()
+
+
+class FairShareScheduler:
+    """
+    Hands a fixed number of slots to waiting work. When a slot frees, the next ticket is
+    chosen in three steps:
+
+    1. Priority class: high before normal before low. Every `aging_s` seconds of waiting
+       move a ticket up one class, so low-priority work is never starved.
+    2. Fair share: among the tenants with tickets in that class, the one holding the
+       fewest slots, then the one with the least recent usage (slot seconds, halved
+       every `usage_half_life_s`), so one client's backlog cannot crowd out the others.
+    3. Size: within the tenant, the highest response ratio (waited + expected) / expected,
+       i.e. the shortest expected run first while long waits catch up.
+
+    Without contention a ticket starts right away. With no slots configured the
+    scheduler admits everything immediately and only keeps statistics. Work that already
+    holds a slot (of any scheduler, e.g. a job admitted by the job queue) is not queued
+    again.
+    """
+
+    def __init__(self, name: str, slots: int, aging_s: float, usage_half_life_s: float, stats_window_s: float):
+        self.name = name
+        self.slots = slots
+        self.aging_s = aging_s
+        self.usage_half_life_s = usage_half_life_s
+        self.stats_window_s = stats_window_s
+        self.running = 0
+        self._waiting: List[Dict[str, Any]] = []
+        self._tenants: Dict[str, _Tenant] = {}
+        self._sequence = 0
+        self._positions: Optional[Dict[Optional[str], int]] = None
+        self._positions_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.slots > 0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    def _tenant(self, name: str, now: float) -> _Tenant:
+        tenant = self._tenants.get(name)
+        if tenant is None:
+            for idle_name, idle in list(self._tenants.items()):
+                if not idle.waiting and not idle.running and now - idle.last_active > TENANT_RETENTION_S:
+                    del self._tenants[idle_name]
+            tenant = self._tenants[name] = _Tenant(now)
+        return tenant
+
+    def _usage(self, name: str, now: float) -> float:
+        tenant = self._tenants[name]
+        if self.usage_half_life_s <= 0:
+            return tenant.usage_s
+        return tenant.usage_s * 0.5 ** ((now - tenant.usage_stamp) / self.usage_half_life_s)
+
+    def _rank(self, ticket: Dict[str, Any], now: float) -> int:
+        rank = PRIORITY_CLASSES.index(ticket["priority"])
+        if self.aging_s > 0:
+            rank -= int((now - ticket["enqueued"]) // self.aging_s)
+        return max(0, rank)
+
+    @staticmethod
+    def _response_ratio(ticket: Dict[str, Any], now: float) -> float:
+        expected = max(ticket["expected_s"], MIN_EXPECTED_S)
+        return (now - ticket["enqueued"] + expected) / expected
+
+    def _select(self, candidates: List[Dict[str, Any]], running: Dict[str, int], now: float) -> Dict[str, Any]:
+        ranks = [self._rank(ticket, now) for ticket in candidates]
+        best = min(ranks)
+        pool = [ticket for ticket, rank in zip(candidates, ranks) if rank == best]
+        oldest: Dict[str, float] = {}
+        for ticket in pool:
+            oldest[ticket["tenant"]] = min(oldest.get(ticket["tenant"], ticket["enqueued"]), ticket["enqueued"])
+        tenant = min(oldest, key=lambda name: (running.get(name, 0), self._usage(name, now), oldest[name]))
+        return max(
+            (ticket for ticket in pool if ticket["tenant"] == tenant),
+            key=lambda ticket: (self._response_ratio(ticket, now), -ticket["sequence"]),
+        )
+
+    def _order(self, now: float) -> List[Dict[str, Any]]:
+        """
+        The waiting tickets in the order they would start if nothing else arrived, i.e.
+        _select applied repeatedly. Ranks and response ratios are fixed at `now`, so each
+        (rank, tenant) lane is sorted once and only the tenant choice is repeated.
+        """
+        lanes_by_rank: Dict[int, Dict[str, List[Dict[str, Any]]]] = {}
+        for ticket in self._waiting:
+            if not ticket["future"].done():
+                lanes_by_rank.setdefault(self._rank(ticket, now), {}).setdefault(ticket["tenant"], []).append(ticket)
+        running = {name: tenant.running for name, tenant in self._tenants.items()}
+        usage = {name: self._usage(name, now) for name in self._tenants}
+        order: List[Dict[str, Any]] = []
+        for rank in sorted(lanes_by_rank):
+            lanes = {}
+            for name, tickets in lanes_by_rank[rank].items():
+                tickets.sort(key=lambda ticket: (-self._response_ratio(ticket, now), ticket["sequence"]))
+                # Oldest arrival among the tickets from each index on (the lane is consumed from the front)
+                oldest = list(accumulate(reversed([ticket["enqueued"] for ticket in tickets]), min))[::-1]
+                lanes[name] = [tickets, oldest, 0]
+            while lanes:
+                name = min(lanes, key=lambda n: (running.get(n, 0), usage[n], lanes[n][1][lanes[n][2]]))
+                tickets, _, index = lanes[name]
+                order.append(tickets[index])
+                running[name] = running.get(name, 0) + 1
+                lanes[name][2] += 1
+                if lanes[name][2] == len(tickets):
+                    del lanes[name]
+        return order
+
+    def queue_position(self, key: str) -> Optional[int]:
+        """
+        Estimated number of tickets that start before the one with this key. Building the
+        order is quadratic in the queue length, so it is cached (see ORDER_REFRESH_S).
+        """
+        now = time.monotonic()
+        if self._positions is None or now - self._positions_at > ORDER_REFRESH_S:
+            self._positions = {}
+            for position, ticket in enumerate(self._order(now)):
+                self._positions.setdefault(ticket["key"], position)
+            self._positions_at = now
+        return self._positions.get(key)
+
+    def _start(self, ticket: Dict[str, Any], now: float):
+        tenant = self._tenants[ticket["tenant"]]
+        waited = now - ticket["enqueued"]
+        ticket["started"] = now
+        ticket["queue_wait_s"] = round(waited, 3)
+        self._positions = None
+        self.running += 1
+        tenant.running += 1
+        tenant.started += 1
+        tenant.wait_total_s += waited
+        tenant.wait_max_s = max(tenant.wait_max_s, waited)
+        tenant.last_active = now
+        SCHEDULER_QUEUE_WAIT.observe(waited, queue=self.name, priority=ticket["priority"])
+
+    def _finish(self, ticket: Dict[str, Any]):
+        now = time.monotonic()
+        tenant = self._tenants[ticket["tenant"]]
+        self._positions = None
+        self.running -= 1
+        tenant.running -= 1
+        tenant.finished += 1
+        tenant.turnaround_total_s += now - ticket["enqueued"]
+        tenant.usage_s = self._usage(ticket["tenant"], now) + (now - ticket["started"])
+        tenant.usage_stamp = now
+        tenant.last_active = now
+        tenant.finish_times.append(now)
+        self._dispatch()
+
+    def _dispatch(self):
+        now = time.monotonic()
+        while self.running < self.slots:
+            candidates = [ticket for ticket in self._waiting if not ticket["future"].done()]
+            if not candidates:
+                break
+            running = {name: tenant.running for name, tenant in self._tenants.items()}
+            ticket = self._select(candidates, running, now)
+            self._remove(ticket)
+            self._start(ticket, now)
+            ticket["future"].set_result(None)
+
+    def _remove(self, ticket: Dict[str, Any]):
+        self._waiting.remove(ticket)
+        self._tenants[ticket["tenant"]].waiting -= 1
+        self._positions = None
+
+    @asynccontextmanager
+    async def slot(self, n_atoms: int, expected_s: float, key: Optional[str] = None):
+        """
+        Holds a slot for the duration of the with-block, on behalf of the tenant and in the
+        priority class of the current context (see scheduling()). Yields the TICKET_FIELDS
+        of the ticket, including how long it waited. Within a block that already holds a
+        slot, the outer ticket is yielded without waiting. The wall-clock limit of the
+        optimization does not run while the ticket waits.
+        """
+        held = _held.get()
+        if held is not None:
+            yield dict(held)
+            return
+        now = time.monotonic()
+        self._sequence += 1
+        ticket: Dict[str, Any] = {
+            **current_scheduling(),
+            "key": key,
+            "n_atoms": n_atoms,
+            "expected_s": expected_s,
+            "enqueued": now,
+            "sequence": self._sequence,
+            "future": None,
+        }
+        tenant = self._tenant(ticket["tenant"], now)
+        tenant.last_active = now
+        if not self.enabled or (self.running < self.slots and not self._waiting):
+            self._start(ticket, now)
+        else:
+            ticket["future"] = asyncio.get_running_loop().create_future()
+            self._waiting.append(ticket)
+            tenant.waiting += 1
+            self._positions = None
+            console.info(
+                "All %d %s slots busy; queued for tenant %s (%s priority, %d atoms, %d waiting).",
+                self.slots, self.name, ticket["tenant"], ticket["priority"], n_atoms, len(self._waiting),
+            )
+            try:
+                with wall_clock_paused():
+                    await ticket["future"]
+            except asyncio.CancelledError:
+                if ticket["future"].done() and not ticket["future"].cancelled():
+                    self._finish(ticket)
+                else:
+                    self._remove(ticket)
+                    self._dispatch()
+                raise
+        token = _held.set({field: ticket[field] for field in TICKET_FIELDS})
+        try:
+            yield _held.get()
+        finally:
+            _held.reset(token)
+            self._finish(ticket)
+
+    def stats(self, tenants: bool = True) -> Dict[str, Any]:
+        now = time.monotonic()
+        report: Dict[str, Any] = {
+            "slots": self.slots,
+            "running": self.running,
+            "waiting": len(self._waiting),
+            "waiting_by_priority": {
+                priority: sum(1 for ticket in self._waiting if ticket["priority"] == priority)
+                for priority in PRIORITY_CLASSES
+            },
+        }
+        if not tenants:
+            return report
+        per_tenant = {}
+        for name, tenant in sorted(self._tenants.items()):
+            while tenant.finish_times and now - tenant.finish_times[0] > self.stats_window_s:
+                tenant.finish_times.popleft()
+            per_tenant[name] = {
+                "waiting": tenant.waiting,
+                "running": tenant.running,
+                "started": tenant.started,
+                "finished": tenant.finished,
+                "mean_queue_wait_s": round(tenant.wait_total_s / tenant.started, 3) if tenant.started else None,
+                "max_queue_wait_s": round(tenant.wait_max_s, 3),
+                "mean_turnaround_s": round(tenant.turnaround_total_s / tenant.finished, 3) if tenant.finished else None,
+                "throughput_per_min": round(60.0 * len(tenant.finish_times) / self.stats_window_s, 3),
+                "usage_s": round(self._usage(name, now), 1),
+            }
+        report["stats_window_s"] = self.stats_window_s
+        report["tenants"] = per_tenant
+        return report
+
+
+SCHEDULER_QUEUE_WAIT = metrics.registry.histogram(
+    "dftbopt_scheduler_queue_wait_seconds",
+    "Time work waited in a fair-share scheduler queue before it started.",
+    ("queue", "priority"),
+)
+
+# DFTB+ work of synchronous, batch and continued optimizations passes through here; jobs
+# hold a slot of the job queue instead.
+scheduler = FairShareScheduler(
+    "optimization", config.SCHEDULER_SLOTS, config.SCHEDULER_AGING_S,
+    config.SCHEDULER_USAGE_HALF_LIFE_S, config.SCHEDULER_STATS_WINDOW_S,
+)
+
+metrics.registry.gauge(
+    "dftbopt_scheduler_waiting", "Optimizations waiting in the fair-share scheduler.",
+    callback=lambda: scheduler.waiting,
+)
@@ -0,0 +1,392 @@
+# app/core/socket_driver.py
+# Long-lived DFTB+ processes driven over UNIX sockets (i-PI protocol) for repeated single points.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import threading
+import contextvars
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from ase import Atoms
+
+from app.core import config
+from app.core import metrics
+from app.core.admission import memory_admission, resource_model
+from app.core.dftb_runner import (
+    STDERR_FILE, STDOUT_FILE, ProcessControl, child_environment, core_allocator, dftb_limiter,
+    generate_hsd_content, read_log_tail,
+)
+from app.core.hsd_settings import n_kpoints, select_settings
+from app.core.workspace import workspace_manager
+from app.utils.file_convertor import write_gen_file
+from app.utils.logger import console
+
+# Force accuracy (eV/Angstrom) the SCC tolerance of single points is chosen for.
+SINGLE_POINT_FMAX = 0.01
+
+SINGLE_POINTS = metrics.registry.counter(
+    "dftbopt_single_points_total", "Single-point calculations, by whether the DFTB+ process was warm.",
+    ("process",),
+)
+
+# Threads that block on the sockets of warm DFTB+ processes.
+_socket_executor = ThreadPoolExecutor(max_workers=config.MAX_CONCURRENT_RUNS, thread_name_prefix="dftb-socket")
+
+
+def session_key(atoms: Atoms, method: str, settings: Dict[str, Any]) -> str:
+    """
+    Structures with the same key can share a DFTB+ process: the socket driver only
+    accepts new positions and cells, so method, species order, periodicity and the
+    electronic settings (k-point mesh included) are fixed when the process starts.
+    """
+    return json.dumps([method, atoms.numbers.tolist(), atoms.pbc.tolist(), settings], sort_keys=True)
+
+
+def _pin_threads(pid: int, cpus: List[int]):
+    """Pins every thread of a running process; OpenMP threads already exist by now."""
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        tids = [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        tids = [pid]
+    for tid in tids:
+        try:
+            os.sched_setaffinity(tid, cpus)
+        except OSError:
+            pass
+
+
+class SocketSession:
+    """
+    One DFTB+ process running the socket driver. It reads the first geometry from its
+    input, then computes every geometry sent over its UNIX socket, starting each SCC
+    from the charges of the previous one. All methods block; call them from threads.
+    """
+
+    def __init__(self, key: str, method: str, settings: Dict[str, Any]):
+        self.key = key
+        self.method = method
+        self.settings = settings
+        self.id = uuid.uuid4().hex[:12]
+        self.socket_path = os.path.join(config.SOCKET_DIR, self.id)
+        self.control = ProcessControl(config.KILL_GRACE_S)
+        self.workspace_dir: Optional[str] = None
+        self.process: Optional[subprocess.Popen] = None
+        self.protocol: Optional[Any] = None
+        self.calculations = 0
+        self.last_used = time.monotonic()
+        self._server: Optional[socket.socket] = None
+        self._connection: Optional[socket.socket] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, atoms: Atoms, threads: int):
+        """Starts DFTB+ on `atoms` and waits until it has connected to the socket."""
+        self.workspace_dir = workspace_manager.acquire()
+        write_gen_file(atoms, os.path.join(self.workspace_dir, "input.gen"))
+        with open(os.path.join(self.workspace_dir, "dftb_in.hsd"), "w") as f:
+            f.write(generate_hsd_content(
+                self.method, SINGLE_POINT_FMAX, "input.gen", settings=self.settings, socket_path=self.socket_path
+            ))
+
+        os.makedirs(config.SOCKET_DIR, exist_ok=True)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.socket_path)
+        self._server.listen(1)
+        self._server.settimeout(0.5)
+
+        with open(os.path.join(self.workspace_dir, STDOUT_FILE), "w") as stdout, \
+             open(os.path.join(self.workspace_dir, STDERR_FILE), "w") as stderr:
+            self.process = subprocess.Popen(
+                ["dftb+"],
+                cwd=self.workspace_dir,
+                stdout=stdout,
+                stderr=stderr,
+                env=child_environment(threads),
+                start_new_session=True,
+            )
+        self.control.attach(self.process)
+        console.info("Started socket-driven DFTB+ process %d (%d atoms).", self.process.pid, len(atoms))
+
+        # DFTB+ sets up the Hamiltonian before it connects; a broken input makes it exit instead.
+        deadline = time.monotonic() + config.SOCKET_STARTUP_TIMEOUT_S
+        while self._connection is None:
+            try:
+                self._connection, _ = self._server.accept()
+            except socket.timeout:
+                if self.process.poll() is not None:
+                    raise RuntimeError(
+                        f"DFTB+ exited with code {self.process.returncode} before connecting: "
+                        f"{self._stderr_tail()}"
+                    )
+                if time.monotonic() > deadline:
+                    raise RuntimeError(
+                        f"DFTB+ did not connect within {config.SOCKET_STARTUP_TIMEOUT_S:g} s."
+                    )
+        self._connection.settimeout(None)
+        # Deferred: ase.calculators pulls in most of ASE
+        from ase.calculators.socketio import IPIProtocol
+
+        self.protocol = IPIProtocol(self._connection)
+
+    def pin(self, cpus: List[int]):
+        if self.process is not None:
+            _pin_threads(self.process.pid, cpus)
+
+    def calculate(self, atoms: Atoms) -> Dict[str, Any]:
+        """Energy, forces and (for periodic structures) stress of one geometry."""
+        assert self.protocol is not None
+        warm_start = self.calculations > 0
+        started = time.perf_counter()
+        try:
+            result = self.protocol.calculate(atoms.get_positions(), atoms.cell.array)
+        except (OSError, AssertionError) as e:
+            raise RuntimeError(
+                f"Socket-driven DFTB+ process failed ({type(e).__name__}): {self._stderr_tail()}"
+            ) from None
+        self.calculations += 1
+        self.last_used = time.monotonic()
+        record = {
+            "energy_eV": float(result["energy"]),
+            "forces_eV_A": result["forces"],
+            "stress_eV_A3": None,
+            "scc_warm_start": warm_start,
+            "wall_time_s": round(time.perf_counter() - started, 4),
+        }
+        if atoms.pbc.all():
+            from ase.stress import full_3x3_to_voigt_6_stress
+
+            record["stress_eV_A3"] = -full_3x3_to_voigt_6_stress(result["virial"] / atoms.get_volume())
+        return record
+
+    def close(self, reason: str, failed: bool = False):
+        """
+        Asks DFTB+ to exit (or, after a failure or once it is being killed, stops its
+        process group) and releases the workspace; failed workspaces are kept as failed runs.
+        """
+        if self.process is not None:
+            if self.alive and not failed and self.control.kill_reason is None and self.protocol is not None:
+                try:
+                    self.protocol.end()
+                except OSError:
+                    pass
+            else:
+                self.control.kill(reason)
+            try:
+                self.process.wait(timeout=config.KILL_GRACE_S + 1)
+            except subprocess.TimeoutExpired:
+                self.control.kill(reason)
+                self.process.wait()
+        for sock in (self._connection, self._server):
+            if sock is not None:
+                sock.close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        if self.workspace_dir is not None:
+            workspace_manager.release(self.workspace_dir, f"socket-{self.id}", failed=failed)
+            self.workspace_dir = None
+        console.info("Closed socket-driven DFTB+ session %s (%s, %d geometries).", self.id, reason, self.calculations)
+
+    def _stderr_tail(self) -> str:
+        if self.workspace_dir is None:
+            return ""
+        return read_log_tail(os.path.join(self.workspace_dir, STDERR_FILE), 2000).strip()
+
+
+class SocketPool:
+    """
+    Keeps socket-driven DFTB+ processes warm between requests.
+
+    Structures are grouped by session_key; each group runs on an idle process of its
+    key if there is one, otherwise on a newly started one. While it computes, a group
+    holds a DFTB+ slot, its predicted memory and its cores like any other run. Idle
+    processes are kept up to max_idle (least recently used are stopped first) and for
+    at most idle_seconds.
+    """
+
+    def __init__(self, max_idle: int, idle_seconds: float):
+        self.max_idle = max_idle
+        self.idle_seconds = idle_seconds
+        self.started = 0
+        self.reused = 0
+        self._idle: List[SocketSession] = []
+        self._busy: set = set()
+        self._lock = threading.Lock()
+        self._janitor: Optional[threading.Thread] = None
+
+    async def evaluate(self, frames: List[Atoms], method: str) -> List[Dict[str, Any]]:
+        """
+        Computes energies, forces and stresses of all frames; groups of compatible
+        frames run concurrently, the frames of a group in order on one process.
+
+        Returns:
+            One result per frame, in input order.
+
+        Raises:
+            AdmissionRejected: If a structure can never fit into the memory budget.
+            RuntimeError: If a DFTB+ process fails.
+        """
+        groups: Dict[str, Tuple[Dict[str, Any], List[int]]] = {}
+        for index, atoms in enumerate(frames):
+            settings = select_settings(atoms, SINGLE_POINT_FMAX)
+            key = session_key(atoms, method, settings)
+            groups.setdefault(key, (settings, []))[1].append(index)
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(frames)
+        tasks = [
+            asyncio.ensure_future(self._evaluate_group(key, method, settings, [frames[i] for i in indices]))
+            for key, (settings, indices) in groups.items()
+        ]
+        try:
+            for (settings, indices), records in zip(groups.values(), await asyncio.gather(*tasks)):
+                for index, record in zip(indices, records):
+                    results[index] = record
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return results
+
+    async def _evaluate_group(
+        self, key: str, method: str, settings: Dict[str, Any], frames: List[Atoms]
+    ) -> List[Dict[str, Any]]:
+        n_atoms = len(frames[0])
+        estimate = resource_model.estimate(
+            frames[0], method, threads=core_allocator.threads_for(n_atoms),
+            max_steps=len(frames), kpoints=n_kpoints(settings),
+        )
+        memory_admission.check(estimate)
+        loop = asyncio.get_running_loop()
+        async with memory_admission.reserve(estimate), dftb_limiter.slot():
+            cpus = core_allocator.acquire(n_atoms)
+            session = self._take(key)
+            warm_process = session is not None
+            if session is None:
+                session = SocketSession(key, method, settings)
+            with self._lock:
+                self._busy.add(session)
+            outcome = "failed"
+            try:
+                # Run in a copy of the current context so log records keep the request id.
+                context = contextvars.copy_context()
+                future = loop.run_in_executor(
+                    _socket_executor, context.run, self._run_frames, session, frames, cpus
+                )
+                try:
+                    records = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    outcome = "cancelled"
+                    session.control.kill(outcome)
+                    # Keep the cores and the slot until the process has exited; its
+                    # error (the socket closing under it) is expected.
+                    await asyncio.wait([future])
+                    future.exception()
+                    raise
+                outcome = "succeeded"
+            finally:
+                core_allocator.release(cpus)
+                with self._lock:
+                    self._busy.discard(session)
+                if outcome == "succeeded":
+                    self._put(session)
+                else:
+                    # Not awaited: a cancelled request should not wait for the cleanup.
+                    loop.run_in_executor(None, session.close, outcome, outcome == "failed")
+
+        SINGLE_POINTS.inc(len(frames) - 1, process="warm")
+        SINGLE_POINTS.inc(1, process="warm" if warm_process else "cold")
+        for record in records:
+            record["warm_process"] = warm_process
+            record["session"] = session.id
+            record["cpus"] = cpus
+        return records
+
+    def _run_frames(self, session: SocketSession, frames: List[Atoms], cpus: List[int]) -> List[Dict[str, Any]]:
+        if session.process is None:
+            session.start(frames[0], len(cpus))
+            with self._lock:
+                self.started += 1
+        else:
+            with self._lock:
+                self.reused += 1
+        session.pin(cpus)
+        return [session.calculate(atoms) for atoms in frames]
+
+    def _take(self, key: str) -> Optional[SocketSession]:
+        with self._lock:
+            for session in reversed(self._idle):
+                if session.key == key:
+                    self._idle.remove(session)
+                    if session.alive:
+                        return session
+                    # Died while idle (e.g. killed by the OOM killer); clean it up.
+                    threading.Thread(target=session.close, args=("exited", True), daemon=True).start()
+        return None
+
+    def _put(self, session: SocketSession):
+        with self._lock:
+            self._idle.append(session)
+            evicted = self._idle[:-self.max_idle] if self.max_idle else list(self._idle)
+            self._idle = self._idle[len(evicted):]
+            if self._janitor is None and self._idle:
+                self._janitor = threading.Thread(target=self._janitor_loop, name="socket-janitor", daemon=True)
+                self._janitor.start()
+        for stale in evicted:
+            threading.Thread(target=stale.close, args=("evicted",), daemon=True).start()
+
+    def _janitor_loop(self):
+        while True:
+            time.sleep(min(self.idle_seconds, 30))
+            self.expire()
+
+    def expire(self):
+        """Stops processes that have been idle for longer than idle_seconds."""
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            expired = [session for session in self._idle if session.last_used < cutoff]
+            self._idle = [session for session in self._idle if session.last_used >= cutoff]
+        for session in expired:
+            session.close("idle")
+
+    def close_all(self, reason: str):
+        """Stops every warm process, idle or busy (e.g. on shutdown)."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            busy = list(self._busy)
+        for session in busy:
+            session.control.kill(reason)
+        for session in idle:
+            session.close(reason)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "idle": len(self._idle),
+                "busy": len(self._busy),
+                "max_idle": self.max_idle,
+                "processes_started": self.started,
+                "processes_reused": self.reused,
+            }
+
+
+socket_pool = SocketPool(config.SOCKET_POOL_SIZE, config.SOCKET_IDLE_SECONDS)
+
+metrics.registry.gauge(
+    "dftbopt_socket_processes_idle", "Warm socket-driven DFTB+ processes waiting for work.",
+    callback=lambda: socket_pool.stats()["idle"],
+)
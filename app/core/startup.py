@@ -0,0 +1,196 @@
+# app/core/startup.py
+# Start-up warm-up: loads the deferred libraries and checks the dftb+ binary before the service reports ready.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from ase import Atoms
+
+from app.core import config
+from app.core import metrics
+from app.utils.logger import console
+
+PENDING = "pending"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Modules kept off the import path of app.main (see file_convertor, preprocessing,
+# socket_driver and the logger); importing them costs several hundred milliseconds.
+DEFERRED_MODULES = (
+    "ase.io",
+    "ase.io.cif",
+    "ase.neighborlist",
+    "scipy.sparse.csgraph",
+    "ase.calculators.socketio",
+    "ase.stress",
+)
+
+# Two-atom molecule for the binary check: a GFN1-xTB single point takes milliseconds.
+PROBE_GEN = """2 C
+H
+     1 1    0.000000000000000    0.000000000000000    0.000000000000000
+     2 1    0.000000000000000    0.000000000000000    0.740000000000000
+"""
+
+
+def _preload_modules() -> Dict[str, Any]:
+    import importlib
+
+    loaded = [name for name in DEFERRED_MODULES if name not in sys.modules]
+    for name in loaded:
+        importlib.import_module(name)
+    return {"modules_loaded": len(loaded)}
+
+
+def _exercise_structure_io() -> Dict[str, Any]:
+    """
+    Runs a small structure once through everything a request does to it, so that ASE
+    resolves its CIF reader and writer (format plugin discovery) and the neighbour
+    list and graph code are loaded before the first request needs them.
+    """
+    from app.core.dftb_runner import generate_hsd_content
+    from app.core.hsd_settings import select_settings
+    from app.core.preprocessing import preprocess_structure, read_structure
+    from app.core.result_cache import structure_fingerprint
+    from app.utils.file_convertor import atoms_to_cif_bytes, atoms_to_gen, gen_to_atoms
+
+    silicon = Atoms(
+        "Si2", scaled_positions=[[0, 0, 0], [0.25, 0.25, 0.25]],
+        cell=2.715 * np.array([[0, 1, 1], [1, 0, 1], [1, 1, 0]]), pbc=True,
+    )
+    atoms = read_structure(atoms_to_cif_bytes(silicon))
+    atoms, _ = preprocess_structure(atoms, "GFN1-xTB", remove_solvent=True)
+    round_trip = gen_to_atoms(atoms_to_gen(atoms))
+    structure_fingerprint(round_trip, config.CACHE_TOLERANCE)
+    generate_hsd_content("GFN1-xTB", 0.1, "input.gen", settings=select_settings(round_trip, 0.1))
+    return {"formats": ["cif", "gen"]}
+
+
+def _check_dftb() -> Dict[str, Any]:
+    """
+    Runs a single point of H2 with the dftb+ on PATH in a scratch directory and parses
+    its detailed.out, proving that the binary starts, finds its xTB parameters and
+    writes the output the service reads.
+    """
+    from app.core.dftb_runner import STDERR_FILE, STDOUT_FILE, child_environment, generate_hsd_content, read_log_tail
+    from app.core.output_parser import parse_detailed_out
+
+    binary = shutil.which("dftb+")
+    if binary is None:
+        raise RuntimeError("dftb+ was not found on PATH.")
+    with tempfile.TemporaryDirectory(prefix="dftbopt-warmup-") as directory:
+        with open(os.path.join(directory, "input.gen"), "w") as f:
+            f.write(PROBE_GEN)
+        with open(os.path.join(directory, "dftb_in.hsd"), "w") as f:
+            f.write(generate_hsd_content("GFN1-xTB", 0.1, "input.gen", lattice_opt=False, max_steps=0))
+        started = time.perf_counter()
+        with open(os.path.join(directory, STDOUT_FILE), "w") as stdout, \
+             open(os.path.join(directory, STDERR_FILE), "w") as stderr:
+            try:
+                returncode = subprocess.run(
+                    ["dftb+"], cwd=directory, stdout=stdout, stderr=stderr,
+                    env=child_environment(1), timeout=config.WARMUP_TIMEOUT_S,
+                ).returncode
+            except subprocess.TimeoutExpired:
+                raise RuntimeError(f"dftb+ did not finish the check within {config.WARMUP_TIMEOUT_S:g} s.") from None
+        wall_time = time.perf_counter() - started
+        if returncode != 0:
+            tail = read_log_tail(os.path.join(directory, STDERR_FILE), 2000).strip()
+            raise RuntimeError(f"dftb+ exited with code {returncode}: {tail or 'no stderr output'}")
+        parsed = parse_detailed_out(os.path.join(directory, "detailed.out"))
+    if parsed["summary"].get("error"):
+        raise RuntimeError(f"dftb+ ran but its output could not be read: {parsed['summary']['error']}")
+    return {"binary": binary, "dftb_wall_time_s": round(wall_time, 3)}
+
+
+class WarmUp:
+    """
+    State of the start-up warm-up of this process. The steps run once, in a thread, while
+    the server already accepts requests; until they have all succeeded the readiness
+    endpoint answers 503, so a load balancer sends no traffic to a cold or broken
+    instance. A failed step leaves the instance not ready for good, as restarting the
+    warm-up would not fix a missing binary or parameter set.
+    """
+
+    def __init__(self):
+        self.state = PENDING
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.duration_s: Optional[float] = None
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def _steps(self, check_dftb: bool) -> List[Tuple[str, Callable[[], Dict[str, Any]]]]:
+        steps = [("preload_modules", _preload_modules), ("structure_io", _exercise_structure_io)]
+        if check_dftb:
+            steps.append(("dftb_binary", _check_dftb))
+        return steps
+
+    def run(self, enabled: bool = config.WARMUP, check_dftb: bool = config.WARMUP_CHECK_DFTB) -> bool:
+        """
+        Runs the warm-up steps (blocking) and returns whether the process is ready.
+        With `enabled` False nothing is loaded and the process is ready right away.
+        """
+        with self._lock:
+            if self.state != PENDING:
+                return self.ready
+            self.state = WARMING
+        started = time.perf_counter()
+        state = READY
+        for name, step in (self._steps(check_dftb) if enabled else []):
+            if self._cancelled.is_set():
+                state = CANCELLED
+                break
+            step_started = time.perf_counter()
+            try:
+                detail = step()
+                self.steps[name] = {"ok": True, "duration_s": round(time.perf_counter() - step_started, 3), **detail}
+            except Exception as e:
+                self.steps[name] = {
+                    "ok": False,
+                    "duration_s": round(time.perf_counter() - step_started, 3),
+                    "error": str(e) or type(e).__name__,
+                }
+                console.error("Warm-up step %s failed: %s", name, self.steps[name]["error"])
+                state = FAILED
+                break
+        self.duration_s = round(time.perf_counter() - started, 3)
+        self.state = state
+        if state == READY:
+            console.success("Warm-up finished in %.2f s; ready.", self.duration_s)
+        return self.ready
+
+    def cancel(self):
+        """Stops the warm-up before its next step (a running step is not interrupted)."""
+        self._cancelled.set()
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "state": self.state,
+            "warmup_s": self.duration_s,
+            "steps": dict(self.steps),
+        }
+
+
+warm_up = WarmUp()
+
+metrics.registry.gauge(
+    "dftbopt_ready", "1 once the start-up warm-up has succeeded, else 0.",
+    callback=lambda: float(warm_up.ready),
+)
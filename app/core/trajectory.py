@@ -0,0 +1,228 @@
+# app/core/trajectory.py
+# Extracts optimization trajectories into NumPy arrays and stores them memory-mappable.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import os
+import json
+import shutil
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from ase import Atoms
+
+# 1 Hartree/Bohr in eV/Angstrom
+HARTREE_PER_BOHR_TO_EV_PER_ANGSTROM = 51.42208619083232
+
+METADATA_FILE = "trajectory.json"
+# Arrays with one entry per frame; each is stored as <name>.npy
+FRAME_ARRAYS = ("positions", "cells", "energies", "max_forces", "forces", "charges")
+
+
+def read_xyz_frames(path: str) -> Tuple[List[str], np.ndarray, Optional[np.ndarray]]:
+    """
+    Reads all frames of an XYZ file written by DFTB+ with AppendGeometries = Yes.
+
+    Returns:
+        (chemical symbols, positions of shape (frames, atoms, 3) in Angstrom,
+         Mulliken charges of shape (frames, atoms), or None if the file has no charge column)
+    """
+    with open(path, "r") as f:
+        lines = f.read().splitlines()
+
+    symbols: List[str] = []
+    blocks: List[List[List[str]]] = []
+    index = 0
+    while index < len(lines):
+        if not lines[index].strip():
+            index += 1
+            continue
+        n_atoms = int(lines[index].split()[0])
+        rows = [line.split() for line in lines[index + 2:index + 2 + n_atoms]]
+        if len(rows) < n_atoms:
+            # Truncated last frame of an interrupted run
+            break
+        if not symbols:
+            symbols = [row[0] for row in rows]
+        blocks.append(rows)
+        index += 2 + n_atoms
+
+    if not blocks:
+        return symbols, np.zeros((0, 0, 3)), None
+    positions = np.array([[row[1:4] for row in rows] for rows in blocks], dtype=np.float64)
+    charges = None
+    if all(len(row) > 4 for row in blocks[0]):
+        charges = np.array([[row[4] for row in rows] for rows in blocks], dtype=np.float64)
+    return symbols, positions, charges
+
+
+def read_total_forces(path: str, n_atoms: int) -> Optional[np.ndarray]:
+    """
+    Reads the last 'Total Forces' block of detailed.out, converted to eV/Angstrom.
+    The file is streamed, so large outputs are not loaded at once.
+    """
+    forces: Optional[List[List[str]]] = None
+    collecting: Optional[List[List[str]]] = None
+    try:
+        with open(path, "r", errors="replace") as f:
+            for line in f:
+                if collecting is not None:
+                    fields = line.split()
+                    if len(fields) >= 3 and len(collecting) < n_atoms:
+                        collecting.append(fields[-3:])
+                        continue
+                    if len(collecting) == n_atoms:
+                        forces = collecting
+                    collecting = None
+                if line.strip() == "Total Forces":
+                    collecting = []
+    except FileNotFoundError:
+        return None
+    if collecting is not None and len(collecting) == n_atoms:
+        forces = collecting
+    if forces is None:
+        return None
+    try:
+        return np.array(forces, dtype=np.float64) * HARTREE_PER_BOHR_TO_EV_PER_ANGSTROM
+    except ValueError:
+        return None
+
+
+def extract_trajectory(
+    xyz_path: str,
+    initial: Atoms,
+    final: Atoms,
+    step_records: List[Dict[str, Any]],
+    detailed_out_path: Optional[str] = None,
+    lattice_opt: bool = True,
+) -> Optional[Tuple[Dict[str, np.ndarray], Dict[str, Any]]]:
+    """
+    Collects the per-step data of a geometry optimization into arrays.
+
+    Positions (and Mulliken charges, if written) come from the appended geo_end.xyz;
+    energies and maximal force components from the parsed stdout step records. DFTB+
+    writes neither the lattice nor the atomic forces of intermediate steps, so cells are
+    known for the first and final frame only when the lattice was optimized (always,
+    when it was fixed), and forces for the final frame only. Unknown entries are NaN.
+
+    Returns:
+        (arrays keyed by FRAME_ARRAYS, metadata), or None if the run wrote no frames.
+    """
+    if not os.path.exists(xyz_path):
+        return None
+    symbols, positions, charges = read_xyz_frames(xyz_path)
+    n_frames = positions.shape[0]
+    if n_frames == 0:
+        return None
+    n_atoms = positions.shape[1]
+
+    cells = np.full((n_frames, 3, 3), np.nan)
+    if not lattice_opt:
+        cells[:] = initial.cell.array
+    else:
+        cells[0] = initial.cell.array
+        cells[-1] = final.cell.array
+
+    energies = np.full(n_frames, np.nan)
+    max_forces = np.full(n_frames, np.nan)
+    for frame, record in enumerate(step_records[:n_frames]):
+        if record.get("total_energy_eV") is not None:
+            energies[frame] = record["total_energy_eV"]
+        if record.get("max_gradient") is not None:
+            max_forces[frame] = record["max_gradient"]
+
+    forces = np.full((n_frames, n_atoms, 3), np.nan)
+    if detailed_out_path is not None:
+        final_forces = read_total_forces(detailed_out_path, n_atoms)
+        if final_forces is not None:
+            forces[-1] = final_forces
+
+    arrays = {
+        "positions": positions,
+        "cells": cells,
+        "energies": energies,
+        "max_forces": max_forces,
+        "forces": forces,
+        "charges": charges if charges is not None else np.full((n_frames, n_atoms), np.nan),
+    }
+    metadata = {
+        "n_frames": n_frames,
+        "n_atoms": n_atoms,
+        "symbols": symbols,
+        "pbc": [bool(p) for p in final.pbc],
+        "units": {"positions": "Angstrom", "cells": "Angstrom", "energies": "eV",
+                  "max_forces": "eV/Angstrom", "forces": "eV/Angstrom", "charges": "e"},
+    }
+    return arrays, metadata
+
+
+def concatenate_stages(
+    parts: List[Tuple[str, Tuple[Dict[str, np.ndarray], Dict[str, Any]]]]
+) -> Optional[Tuple[Dict[str, np.ndarray], Dict[str, Any]]]:
+    """
+    Joins the trajectories of consecutive optimization stages (see extract_trajectory)
+    into one. The metadata of the last stage is kept and `stages` lists the name and
+    frame range [start, stop) of every stage.
+
+    Returns:
+        (arrays, metadata), or None if no stage wrote frames.
+    """
+    if not parts:
+        return None
+    n_atoms = parts[-1][1][1]["n_atoms"]
+    parts = [(name, extracted) for name, extracted in parts if extracted[1]["n_atoms"] == n_atoms]
+    stages = []
+    start = 0
+    for name, (_, metadata) in parts:
+        stages.append({"name": name, "start": start, "stop": start + metadata["n_frames"]})
+        start += metadata["n_frames"]
+    arrays = {
+        name: np.concatenate([stage_arrays[name] for _, (stage_arrays, _) in parts])
+        for name in FRAME_ARRAYS
+    }
+    metadata = {**parts[-1][1][1], "n_frames": start, "stages": stages}
+    return arrays, metadata
+
+
+def save_trajectory(directory: str, arrays: Dict[str, np.ndarray], metadata: Dict[str, Any], dtype: str = "float64"):
+    """
+    Writes one uncompressed .npy file per array plus a JSON metadata file. Unlike the
+    members of an .npz archive, .npy files can be memory-mapped, so frame ranges are
+    later read without loading the whole trajectory.
+    """
+    tmp_dir = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name in FRAME_ARRAYS:
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(arrays[name], dtype=dtype))
+    with open(os.path.join(tmp_dir, METADATA_FILE), "w") as f:
+        json.dump({**metadata, "dtype": dtype}, f)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+
+
+def load_metadata(directory: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, METADATA_FILE), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def load_frames(
+    directory: str,
+    start: int = 0,
+    stop: Optional[int] = None,
+    step: int = 1,
+    fields: Optional[List[str]] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Reads a frame slice of the stored arrays. The files are memory-mapped, so only the
+    pages of the selected frames are read from disk.
+    """
+    sliced = {}
+    for name in fields or FRAME_ARRAYS:
+        array = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+        sliced[name] = np.array(array[start:stop:step])
+    return sliced
@@ -0,0 +1,412 @@
+# app/core/work_queue.py
+# SQLite work queue on shared storage for dispatching DFTB+ runs to worker daemons on other hosts.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import os
+import glob
+import json
+import time
+import uuid
+import socket
+import asyncio
+import sqlite3
+import tarfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from app.core import config
+from app.core import metrics
+from app.core.dftb_runner import DFTBExecutor
+from app.core.run_limits import remaining_cpu_time
+from app.utils.logger import console, request_id_var
+
+DATABASE_FILE = "queue.sqlite"
+BUNDLE_DIR = "bundles"
+
+TASK_QUEUED = "queued"
+TASK_RUNNING = "running"
+TASK_DONE = "done"
+TASK_FAILED = "failed"
+TASK_CANCELLED = "cancelled"
+FINISHED_STATES = (TASK_DONE, TASK_FAILED, TASK_CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_by_status ON tasks (status, created);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    slots INTEGER NOT NULL,
+    running INTEGER NOT NULL DEFAULT 0,
+    started REAL NOT NULL,
+    heartbeat REAL NOT NULL
+);
+"""
+
+
+def pack_bundle(directory: str, path: str, names: Optional[Iterable[str]] = None):
+    """
+    Writes the regular files at the top level of `directory` (or only `names`) into a
+    gzip-compressed tar archive. The archive appears atomically at `path`.
+    """
+    if names is None:
+        names = [entry.name for entry in os.scandir(directory) if entry.is_file(follow_symlinks=False)]
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with tarfile.open(tmp_path, "w:gz", compresslevel=6) as tar:
+        for name in sorted(names):
+            tar.add(os.path.join(directory, name), arcname=name, recursive=False)
+    os.replace(tmp_path, path)
+
+
+def unpack_bundle(path: str, directory: str) -> List[str]:
+    """Extracts a bundle into `directory`, refusing absolute paths and links; returns the file names."""
+    with tarfile.open(path, "r:gz") as tar:
+        tar.extractall(directory, filter="data")
+        return tar.getnames()
+
+
+def file_snapshot(directory: str) -> Dict[str, tuple]:
+    """(size, mtime) of the top-level files, to find out later which ones a run wrote."""
+    return {
+        entry.name: (entry.stat().st_size, entry.stat().st_mtime_ns)
+        for entry in os.scandir(directory) if entry.is_file(follow_symlinks=False)
+    }
+
+
+class WorkQueue:
+    """
+    Queue of DFTB+ runs shared by the API nodes and the worker daemons.
+
+    The queue is an SQLite database next to the input and output bundles in a directory
+    on storage all hosts mount. SQLite serialises writers with file locks, so the shared
+    filesystem must support POSIX locks (WAL mode is not used, as it does not work over
+    network filesystems).
+
+    A worker claims the oldest queued task together with a lease and keeps extending the
+    lease with heartbeats while the run lasts. Tasks whose lease expires (the worker died
+    or lost the storage) go back to the queue, until they have been dispatched
+    `max_attempts` times. Results are only accepted from the worker holding the lease.
+    """
+
+    def __init__(self, directory: str, lease_seconds: int, max_attempts: int):
+        self.directory = os.path.abspath(directory)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._initialized = False
+
+    @property
+    def database_path(self) -> str:
+        return os.path.join(self.directory, DATABASE_FILE)
+
+    def bundle_path(self, task_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, BUNDLE_DIR, f"{task_id}.{suffix}.tar.gz")
+
+    @contextmanager
+    def _connect(self, write: bool = False) -> Iterator[sqlite3.Connection]:
+        if not self._initialized:
+            os.makedirs(os.path.join(self.directory, BUNDLE_DIR), exist_ok=True)
+            with sqlite3.connect(self.database_path, timeout=60) as connection:
+                connection.executescript(SCHEMA)
+            connection.close()
+            self._initialized = True
+        connection = sqlite3.connect(self.database_path, timeout=60, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        try:
+            if write:
+                # Take the write lock up front so read-then-update sequences are atomic.
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    yield connection
+                except BaseException:
+                    connection.execute("ROLLBACK")
+                    raise
+                connection.execute("COMMIT")
+            else:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _task(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        task = dict(row)
+        task["payload"] = json.loads(task["payload"])
+        task["result"] = json.loads(task["result"]) if task["result"] else None
+        return task
+
+    # --- API side ---
+
+    def submit(self, task_id: str, payload: Dict[str, Any]):
+        """Queues a task; its input bundle must already be in place."""
+        now = time.time()
+        with self._connect(write=True) as db:
+            db.execute(
+                "INSERT INTO tasks (id, status, payload, created, updated) VALUES (?, ?, ?, ?, ?)",
+                (task_id, TASK_QUEUED, json.dumps(payload), now, now),
+            )
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as db:
+            return self._task(db.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone())
+
+    def cancel(self, task_id: str) -> bool:
+        """
+        Withdraws a task that has not finished. A queued task is deleted right away; a
+        running one is marked cancelled, its worker notices at the next heartbeat, and
+        purge deletes it once the worker is certain to have let go of it.
+        """
+        with self._connect(write=True) as db:
+            cursor = db.execute("DELETE FROM tasks WHERE id = ? AND status = ?", (task_id, TASK_QUEUED))
+            if cursor.rowcount == 0:
+                cursor = db.execute(
+                    "UPDATE tasks SET status = ?, updated = ?, lease_expires = NULL WHERE id = ? AND status = ?",
+                    (TASK_CANCELLED, time.time(), task_id, TASK_RUNNING),
+                )
+                return cursor.rowcount > 0
+        self._remove_bundles(task_id)
+        return True
+
+    def remove(self, task_id: str):
+        """Deletes a collected task together with its bundles."""
+        with self._connect(write=True) as db:
+            db.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+        self._remove_bundles(task_id)
+
+    def _remove_bundles(self, task_id: str):
+        # Output bundles of every attempt, including those of workers that lost their lease
+        paths = [self.bundle_path(task_id, "in"), *glob.glob(self.bundle_path(task_id, "out-*"))]
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # --- Worker side ---
+
+    def reap(self, db: Optional[sqlite3.Connection] = None) -> int:
+        """Re-queues running tasks whose lease expired; gives up on those out of attempts."""
+        if db is None:
+            with self._connect(write=True) as db:
+                return self.reap(db)
+        now = time.time()
+        expired = db.execute(
+            "SELECT id, worker, attempts FROM tasks WHERE status = ? AND lease_expires < ?", (TASK_RUNNING, now)
+        ).fetchall()
+        for row in expired:
+            if row["attempts"] >= self.max_attempts:
+                db.execute(
+                    "UPDATE tasks SET status = ?, updated = ?, worker = NULL, lease_expires = NULL, error = ? WHERE id = ?",
+                    (TASK_FAILED, now, f"Worker lost the run {row['attempts']} time(s); giving up.", row["id"]),
+                )
+                console.warning("Task %s failed: its worker was lost %d time(s).", row["id"], row["attempts"])
+            else:
+                db.execute(
+                    "UPDATE tasks SET status = ?, updated = ?, worker = NULL, lease_expires = NULL WHERE id = ?",
+                    (TASK_QUEUED, now, row["id"]),
+                )
+                console.warning("Lease of task %s on worker %s expired; re-dispatching.", row["id"], row["worker"])
+        return len(expired)
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Leases the oldest queued task to the worker, or returns None if there is none."""
+        with self._connect(write=True) as db:
+            self.reap(db)
+            row = db.execute(
+                "SELECT * FROM tasks WHERE status = ? ORDER BY created LIMIT 1", (TASK_QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            db.execute(
+                "UPDATE tasks SET status = ?, updated = ?, worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (TASK_RUNNING, now, worker_id, now + self.lease_seconds, row["id"]),
+            )
+            return self._task(db.execute("SELECT * FROM tasks WHERE id = ?", (row["id"],)).fetchone())
+
+    def register_worker(self, worker_id: str, slots: int):
+        now = time.time()
+        with self._connect(write=True) as db:
+            db.execute(
+                "INSERT OR REPLACE INTO workers (id, host, pid, slots, running, started, heartbeat) "
+                "VALUES (?, ?, ?, ?, 0, ?, ?)",
+                (worker_id, socket.gethostname(), os.getpid(), slots, now, now),
+            )
+
+    def unregister_worker(self, worker_id: str):
+        with self._connect(write=True) as db:
+            db.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+    def heartbeat(self, worker_id: str, task_ids: List[str]) -> List[str]:
+        """
+        Extends the leases of the worker's running tasks.
+
+        Returns:
+            The ids among task_ids the worker no longer holds (cancelled or re-dispatched).
+        """
+        now = time.time()
+        with self._connect(write=True) as db:
+            db.execute(
+                "UPDATE workers SET heartbeat = ?, running = ? WHERE id = ?", (now, len(task_ids), worker_id)
+            )
+            lost = []
+            for task_id in task_ids:
+                cursor = db.execute(
+                    "UPDATE tasks SET lease_expires = ? WHERE id = ? AND worker = ? AND status = ?",
+                    (now + self.lease_seconds, task_id, worker_id, TASK_RUNNING),
+                )
+                if cursor.rowcount == 0:
+                    lost.append(task_id)
+            return lost
+
+    def finish(
+        self, task_id: str, worker_id: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None
+    ) -> bool:
+        """Records the outcome of a run; ignored (False) if the worker no longer holds the lease."""
+        with self._connect(write=True) as db:
+            cursor = db.execute(
+                "UPDATE tasks SET status = ?, updated = ?, lease_expires = NULL, result = ?, error = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (
+                    TASK_FAILED if error is not None else TASK_DONE, time.time(),
+                    json.dumps(result) if result is not None else None, error,
+                    task_id, worker_id, TASK_RUNNING,
+                ),
+            )
+            return cursor.rowcount > 0
+
+    def purge(self, max_age_seconds: float) -> int:
+        """
+        Deletes finished tasks nobody collected (e.g. their API node went away), and
+        cancelled tasks once their worker has had two lease periods to notice.
+        """
+        now = time.time()
+        with self._connect() as db:
+            stale = [
+                row["id"] for row in db.execute(
+                    f"SELECT id FROM tasks WHERE (status IN ({','.join('?' * len(FINISHED_STATES))}) AND updated < ?) "
+                    "OR (status = ? AND updated < ?)",
+                    (*FINISHED_STATES, now - max_age_seconds, TASK_CANCELLED, now - 2 * self.lease_seconds),
+                )
+            ]
+        for task_id in stale:
+            self.remove(task_id)
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        live_after = time.time() - 2 * self.lease_seconds
+        with self._connect() as db:
+            counts = {row["status"]: row["n"] for row in db.execute(
+                "SELECT status, COUNT(*) AS n FROM tasks GROUP BY status"
+            )}
+            workers = [dict(row) for row in db.execute(
+                "SELECT id, host, slots, running, heartbeat FROM workers WHERE heartbeat >= ? ORDER BY id",
+                (live_after,),
+            )]
+        return {
+            "tasks": {state: counts.get(state, 0) for state in (TASK_QUEUED, TASK_RUNNING, *FINISHED_STATES)},
+            "workers": workers,
+            "worker_slots": sum(worker["slots"] for worker in workers),
+        }
+
+
+class QueueExecutor(DFTBExecutor):
+    """
+    Dispatches runs to worker daemons (`python -m app.worker`) through the shared
+    WorkQueue: the prepared workspace is shipped as an input bundle, and the files the
+    run wrote come back as an output bundle that is unpacked into the workspace.
+
+    Memory admission, concurrency limits, core pinning and the CPU-time limit happen on
+    the worker that runs the task. If the waiting coroutine is cancelled, the task is
+    withdrawn and the worker stops its DFTB+ process.
+    """
+
+    name = "queue"
+
+    def __init__(self, queue: "WorkQueue", poll_seconds: float):
+        self.queue = queue
+        self.poll_seconds = poll_seconds
+        self.in_flight = 0
+
+    async def execute(self, workspace_dir: str, estimate: Dict[str, Any], run_info: Dict[str, Any]) -> int:
+        loop = asyncio.get_running_loop()
+        task_id = uuid.uuid4().hex
+        submitted = time.perf_counter()
+        with metrics.STAGE_DURATION.time(stage="dispatch"):
+            await loop.run_in_executor(
+                None, pack_bundle, workspace_dir, self.queue.bundle_path(task_id, "in")
+            )
+            await loop.run_in_executor(
+                None, self.queue.submit, task_id, {
+                    "estimate": estimate,
+                    "request_id": request_id_var.get(),
+                    "cpu_time_limit_s": remaining_cpu_time(),
+                }
+            )
+        console.info("Dispatched DFTB+ run to the work queue as task %s.", task_id)
+
+        self.in_flight += 1
+        try:
+            task = await self._wait(task_id)
+        except asyncio.CancelledError:
+            await loop.run_in_executor(None, self.queue.cancel, task_id)
+            raise
+        finally:
+            self.in_flight -= 1
+
+        try:
+            turnaround = time.perf_counter() - submitted
+            if task["status"] != TASK_DONE:
+                raise RuntimeError(f"Task {task_id} {task['status']} on the work queue: {task['error']}")
+            result = task["result"]
+            with metrics.STAGE_DURATION.time(stage="collect"):
+                await loop.run_in_executor(
+                    None, unpack_bundle, os.path.join(self.queue.directory, BUNDLE_DIR, result["bundle"]), workspace_dir
+                )
+            execution = result["execution"]
+            execution["queue_wait_s"] = round(max(0.0, turnaround - execution.get("wall_time_s", 0.0)), 3)
+            execution.update({"executor": self.name, "task_id": task_id, "attempts": task["attempts"]})
+            metrics.DFTB_QUEUE_WAIT.observe(execution["queue_wait_s"])
+            run_info["execution"] = execution
+            return result["returncode"]
+        finally:
+            await loop.run_in_executor(None, self.queue.remove, task_id)
+
+    async def _wait(self, task_id: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        while True:
+            task = await loop.run_in_executor(None, self.queue.get, task_id)
+            if task is None:
+                raise RuntimeError(f"Task {task_id} disappeared from the work queue.")
+            if task["status"] in FINISHED_STATES:
+                return task
+            if task["status"] == TASK_RUNNING and task["lease_expires"] is not None \
+                    and task["lease_expires"] < time.time():
+                # Its worker stopped sending heartbeats; do not wait for another worker to notice.
+                await loop.run_in_executor(None, self.queue.reap)
+            await asyncio.sleep(self.poll_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            queue_stats = self.queue.stats()
+        except sqlite3.Error as e:
+            queue_stats = {"error": str(e)}
+        return {"executor": self.name, "dispatched": self.in_flight, **queue_stats}
+
+
+work_queue = WorkQueue(config.QUEUE_DIR, config.QUEUE_LEASE_SECONDS, config.QUEUE_MAX_ATTEMPTS)
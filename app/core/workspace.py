@@ -0,0 +1,324 @@
+# app/core/workspace.py
+# Pool of scratch workspaces for DFTB+ runs with background cleanup, disk quota and failed-run retention.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import os
+import time
+import uuid
+import queue
+import asyncio
+import shutil
+import tarfile
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from app.core import config
+from app.core import metrics
+from app.utils.logger import console
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+TRASH_DIR = "trash"
+POOL_PREFIX = "pool-"
+LOCK_FILE = ".lock"
+# How long a measurement of the scratch usage is trusted by the quota check.
+USAGE_REFRESH_S = 5.0
+
+
+class WorkspaceQuotaExceeded(Exception):
+    """The scratch directory holds more data than DFTBOPT_WORKSPACE_QUOTA_MB allows."""
+
+
+def directory_size(path: str) -> int:
+    """Bytes allocated by all files below path (without following symlinks)."""
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        total += entry.stat(follow_symlinks=False).st_blocks * 512
+                except FileNotFoundError:
+                    continue
+    return total
+
+
+class WorkspaceManager:
+    """
+    Hands out scratch directories for DFTB+ runs and removes them off the request path.
+
+    Each process owns a pool directory with `pool_size` pre-created slots under
+    `base_dir`, which is meant to be a fast local filesystem (tmpfs, local NVMe).
+    Releasing a workspace renames it into the trash (a metadata-only operation on the
+    same filesystem), re-creates the empty slot, and leaves the recursive delete to a
+    background thread. Workspaces of failed runs are archived as .tar.gz into
+    `failed_dir` for debugging and pruned by age and total size.
+
+    Pools of processes that are gone (their lock is free) are trashed on startup; without
+    fcntl (Windows) pools cannot be told apart and are left in place.
+    """
+
+    def __init__(
+        self,
+        base_dir: str,
+        pool_size: int,
+        quota_mb: int,
+        failed_dir: str,
+        failed_retention_hours: int,
+        failed_max_mb: int,
+    ):
+        self.base_dir = os.path.abspath(base_dir)
+        self.pool_size = pool_size
+        self.quota_bytes = quota_mb * 1024 ** 2
+        self.failed_dir = os.path.abspath(failed_dir)
+        self.failed_retention_hours = failed_retention_hours
+        self.failed_max_bytes = failed_max_mb * 1024 ** 2
+        self.in_use = 0
+        self._lock = threading.Lock()
+        self._free: Deque[str] = deque()
+        self._slots: set = set()
+        self._tasks: "queue.Queue[tuple]" = queue.Queue()
+        self._janitor: Optional[threading.Thread] = None
+        self._pool_dir: Optional[str] = None
+        self._lock_fd: Optional[int] = None
+        self._usage_lock = threading.Lock()
+        self._usage: Optional[int] = None
+        self._usage_at = 0.0
+
+    def _trash_path(self) -> str:
+        return os.path.join(self.base_dir, TRASH_DIR, uuid.uuid4().hex)
+
+    def start(self):
+        """Creates this process's slot pool and the cleanup thread (once)."""
+        if self._pool_dir is not None:
+            return
+        with self._lock:
+            if self._pool_dir is not None:
+                return
+            os.makedirs(os.path.join(self.base_dir, TRASH_DIR), exist_ok=True)
+            self._collect_leftovers()
+
+            pool_dir = os.path.join(self.base_dir, f"{POOL_PREFIX}{os.getpid()}-{uuid.uuid4().hex[:8]}")
+            os.makedirs(pool_dir)
+            self._lock_fd = os.open(os.path.join(pool_dir, LOCK_FILE), os.O_CREAT | os.O_WRONLY)
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            for index in range(self.pool_size):
+                slot = os.path.join(pool_dir, f"slot-{index:03d}")
+                os.makedirs(slot)
+                self._slots.add(slot)
+                self._free.append(slot)
+
+            self._janitor = threading.Thread(target=self._janitor_loop, name="workspace-janitor", daemon=True)
+            self._janitor.start()
+            self._pool_dir = pool_dir
+            console.info("Workspace pool with %d slots ready in %s", self.pool_size, pool_dir)
+
+    def _collect_leftovers(self):
+        """Queues the trash and the pools of dead processes for deletion."""
+        trash = os.path.join(self.base_dir, TRASH_DIR)
+        for name in os.listdir(trash):
+            self._tasks.put(("delete", os.path.join(trash, name), None))
+        if fcntl is None:
+            return
+        for name in os.listdir(self.base_dir):
+            path = os.path.join(self.base_dir, name)
+            if not name.startswith(POOL_PREFIX) or not os.path.isdir(path):
+                continue
+            try:
+                fd = os.open(os.path.join(path, LOCK_FILE), os.O_CREAT | os.O_WRONLY)
+            except OSError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # owned by a live process
+            finally:
+                os.close(fd)
+            target = self._trash_path()
+            os.replace(path, target)
+            self._tasks.put(("delete", target, None))
+            console.info("Removing workspace pool %s left by a previous process", name)
+
+    def usage_bytes(self, max_age: float = 0.0) -> int:
+        """Bytes below the scratch directory, measured again if the last walk is older than max_age seconds."""
+        with self._usage_lock:
+            now = time.monotonic()
+            if self._usage is None or now - self._usage_at >= max_age:
+                self._usage = directory_size(self.base_dir)
+                self._usage_at = now
+            return self._usage
+
+    def acquire(self) -> str:
+        """
+        Returns an empty workspace directory. Blocking (walks the scratch directory at
+        most every USAGE_REFRESH_S seconds when a quota is set), so call it from a worker
+        thread.
+
+        Raises:
+            WorkspaceQuotaExceeded: if the scratch directory is over its quota.
+        """
+        self.start()
+        if self.quota_bytes:
+            used = self.usage_bytes(max_age=USAGE_REFRESH_S)
+            if used >= self.quota_bytes:
+                raise WorkspaceQuotaExceeded(
+                    f"Scratch space is full ({used / 1024 ** 2:.0f} of {self.quota_bytes / 1024 ** 2:.0f} MB in use)."
+                )
+        with self._lock:
+            self.in_use += 1
+            if self._free:
+                return self._free.popleft()
+        assert self._pool_dir is not None
+        path = os.path.join(self._pool_dir, f"extra-{uuid.uuid4().hex[:12]}")
+        os.makedirs(path)
+        return path
+
+    def release(self, path: str, label: Optional[str] = None, failed: bool = False):
+        """
+        Empties a workspace without blocking: its contents are moved out of the way and
+        deleted (or, for failed runs, archived under `label`) by the background thread.
+        """
+        target = self._trash_path()
+        try:
+            os.replace(path, target)
+        except FileNotFoundError:
+            target = None
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+            if path in self._slots:
+                os.makedirs(path, exist_ok=True)
+                self._free.append(path)
+        if target is None:
+            return
+        keep = failed and self.failed_retention_hours > 0 and self.failed_max_bytes > 0
+        self._tasks.put(("archive" if keep else "delete", target, label or os.path.basename(path)))
+
+    def discard(self, path: str):
+        """Deletes any directory in the background (e.g. uploaded batch inputs)."""
+        self.start()
+        target = self._trash_path()
+        try:
+            os.replace(path, target)
+        except FileNotFoundError:
+            return
+        except OSError:
+            # Not on the scratch filesystem: a rename is not possible, delete it in place.
+            target = path
+        self._tasks.put(("delete", target, None))
+
+    async def acquire_async(self) -> str:
+        return await asyncio.get_running_loop().run_in_executor(None, self.acquire)
+
+    @asynccontextmanager
+    async def workspace(self, label: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Provides a workspace for the with-block. If the block raises, the workspace is
+        kept as a failed run (subject to the retention policy); otherwise it is deleted.
+        """
+        path = await self.acquire_async()
+        failed = False
+        try:
+            yield path
+        except asyncio.CancelledError:
+            raise
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.release(path, label, failed)
+
+    def _janitor_loop(self):
+        while True:
+            action, path, label = self._tasks.get()
+            try:
+                if action == "archive":
+                    self._archive(path, label)
+                shutil.rmtree(path, ignore_errors=True)
+                if action == "archive":
+                    self.prune_failed()
+            except Exception as e:
+                console.warning("Workspace cleanup of %s failed: %s", path, e)
+            finally:
+                self._tasks.task_done()
+
+    def _archive(self, path: str, label: str):
+        if not os.listdir(path):
+            return  # failed before anything was written
+        os.makedirs(self.failed_dir, exist_ok=True)
+        archive_path = os.path.join(self.failed_dir, f"{os.path.basename(label)}.tar.gz")
+        tmp_path = f"{archive_path}.tmp-{os.getpid()}"
+        with tarfile.open(tmp_path, "w:gz") as tar:
+            tar.add(path, arcname=os.path.basename(label))
+        os.replace(tmp_path, archive_path)
+        console.info("Archived failed workspace to %s", archive_path)
+
+    def prune_failed(self):
+        """Removes archived failed runs older than the retention time, then the oldest beyond the size limit."""
+        if not os.path.isdir(self.failed_dir):
+            return
+        cutoff = time.time() - self.failed_retention_hours * 3600
+        archives = []
+        for name in os.listdir(self.failed_dir):
+            path = os.path.join(self.failed_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime < cutoff:
+                os.remove(path)
+            else:
+                archives.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in archives)
+        for _, size, path in sorted(archives):
+            if total <= self.failed_max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def wait_idle(self):
+        """Blocks until all queued deletions and archives are done."""
+        self._tasks.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_dir": self.base_dir,
+            "slots": self.pool_size,
+            "free_slots": len(self._free),
+            "in_use": self.in_use,
+            "pending_cleanup": self._tasks.qsize(),
+            "quota_mb": self.quota_bytes // 1024 ** 2,
+        }
+
+
+workspace_manager = WorkspaceManager(
+    config.SCRATCH_BASE,
+    config.WORKSPACE_POOL_SIZE,
+    config.WORKSPACE_QUOTA_MB,
+    config.FAILED_RUNS_DIR,
+    config.FAILED_RETENTION_HOURS,
+    config.FAILED_RUNS_MAX_MB,
+)
+
+metrics.registry.gauge(
+    "dftbopt_workspaces_in_use", "Scratch workspaces currently handed out.",
+    callback=lambda: workspace_manager.in_use,
+)
+metrics.registry.gauge(
+    "dftbopt_workspace_cleanup_pending", "Released workspaces waiting for background deletion or archiving.",
+    callback=lambda: workspace_manager.stats()["pending_cleanup"],
+)
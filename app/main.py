@@ -4,18 +4,121 @@
 # Date: 2025-06-21
 # Version: 0.1.0
 
-from fastapi import FastAPI
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
 from app.api.api import api_router
+from app.core import metrics
+from app.utils.logger import set_request_id
+from app.core.dftb_runner import local_executor
+from app.core.socket_driver import socket_pool
+from app.core.startup import warm_up
+from app.core.workspace import WorkspaceQuotaExceeded, workspace_manager
+from app.services.job_manager import job_manager
+from app.services.results_store import results_store
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create the scratch workspace pool, then start the background job workers and resume
+    # any jobs left unfinished by a previous process.
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, workspace_manager.start)
+    await job_manager.start()
+    # Warm up in the background; GET /ready turns 200 once it has succeeded.
+    warm_up_done = loop.run_in_executor(None, warm_up.run)
+    yield
+    # Skip the remaining warm-up steps and wait for the running one (bounded by its timeout).
+    warm_up.cancel()
+    await warm_up_done
+    await job_manager.stop()
+    # DFTB+ runs in its own process group, so it would outlive the server otherwise.
+    local_executor.kill_all("shutdown")
+    await loop.run_in_executor(None, socket_pool.close_all, "shutdown")
+    # Let queued workspace deletions finish before the process exits.
+    await loop.run_in_executor(None, workspace_manager.wait_idle)
+    results_store.close()
 
 app = FastAPI(
     title="DFTB+ Automation Service",
     description="A modular service to run computational chemistry tasks with DFTB+.",
-    version="0.1.0" # Version updated to reflect new architecture
+    version="0.1.0", # Version updated to reflect new architecture
+    lifespan=lifespan
 )
 
 # Include the main router from the api module
 app.include_router(api_router, prefix="/api/v1")
 
+@app.exception_handler(WorkspaceQuotaExceeded)
+async def workspace_quota_exceeded(request: Request, exc: WorkspaceQuotaExceeded):
+    return JSONResponse(status_code=507, content={"detail": str(exc)})
+
+def _route_template(request: Request) -> str:
+    """Path template of the matched route, e.g. /api/v1/optimize/jobs/{job_id}."""
+    route = request.scope.get("route")
+    if route is None:
+        return "unmatched"
+    # FastAPI versions that resolve router prefixes per request keep the included route
+    # (path without its prefix) in the scope, next to the effective route with the full path.
+    effective = request.scope.get("fastapi", {}).get("effective_route_context")
+    return getattr(effective, "path", None) or route.path
+
+def _finish_request(request: Request, start: float, status_code: int):
+    metrics.HTTP_REQUESTS_IN_FLIGHT.dec()
+    # Label by route template so that ids in the path do not create new series.
+    metrics.HTTP_REQUEST_DURATION.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=_route_template(request),
+        status=str(status_code),
+    )
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    # A caller-supplied id tags log records until a route assigns its own request id.
+    set_request_id(request.headers.get("x-request-id"))
+    metrics.HTTP_REQUESTS_IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        _finish_request(request, start, 500)
+        raise
+
+    # The request ends with its last body chunk, which for the streamed SSE and NDJSON
+    # responses comes long after the handler returned; it stays in flight until then.
+    body = response.body_iterator
+
+    async def timed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            _finish_request(request, start, response.status_code)
+
+    response.body_iterator = timed_body()
+    return response
+
+@app.get("/metrics", tags=["Root"], include_in_schema=False)
+def read_metrics():
+    """Service metrics in the Prometheus text exposition format."""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get(
+    "/ready",
+    tags=["Root"],
+    responses={503: {"description": "The warm-up is still running or has failed."}},
+    summary="Readiness Probe",
+    description="200 once the start-up warm-up (library preloading, structure I/O, dftb+ "
+                "check) has succeeded, 503 before that or if it failed. The body lists the "
+                "warm-up steps with their durations and errors."
+)
+def read_readiness():
+    report = warm_up.report()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
 @app.get("/", tags=["Root"])
 def read_root():
     return {"message": "Welcome to the DFTB+ Automation Service!"}
\ No newline at end of file
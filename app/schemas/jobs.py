@@ -0,0 +1,34 @@
+# app/schemas/jobs.py
+# This file defines the schemas for the asynchronous job endpoints.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+from pydantic import BaseModel, Field
+from typing import Dict, Any, Optional
+
+class JobStatusSchema(BaseModel):
+    job_id: str
+    status: str = Field(..., description="One of 'queued', 'running', 'succeeded', 'failed' or 'cancelled'.")
+    stage: Optional[str] = Field(
+        None, description="Current workflow stage of a running job (e.g. 'running_dftb')."
+    )
+    queue_position: Optional[int] = Field(
+        None, description="Estimated number of jobs that start before this one while it is queued."
+    )
+    scheduling: Optional[Dict[str, Any]] = Field(
+        None, description="Client, priority class, atom count and predicted run time that place the job in the queue."
+    )
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    input_parameters: Dict[str, Any]
+    restart_from: Optional[str] = Field(None, description="Id of the run this job continues, if any.")
+    error: Optional[str] = None
+    cancel_requested: bool = Field(False, description="Cancellation was requested; a running job stops shortly.")
+    termination: Optional[str] = Field(
+        None, description="Why the job was stopped early: 'cancelled', 'wall_time_limit' or 'cpu_time_limit'."
+    )
+    partial_progress: Optional[Dict[str, Any]] = Field(
+        None, description="For stopped jobs: the stage that ran last, its geometry steps and its last step record."
+    )
@@ -33,12 +33,83 @@ class DetailedResultsSchema(BaseModel):
     energies_eV: Dict[str, float]
     energies_hartree: Dict[str, float]
 
+class ExecutionResourcesSchema(BaseModel):
+    n_atoms: int
+    cpus: List[int] = Field(..., description="CPU cores the DFTB+ process was pinned to.")
+    omp_num_threads: int
+    omp_stacksize: str
+    wall_time_s: Optional[float] = Field(None, description="Run time of the DFTB+ process.")
+    queue_wait_s: Optional[float] = Field(None, description="Time spent waiting for a DFTB+ slot.")
+    cpu_time_s: Optional[float] = Field(None, description="User plus system CPU time of the DFTB+ process.")
+    max_rss_mb: Optional[float] = Field(None, description="Peak resident memory of the DFTB+ process.")
+    executor: Optional[str] = Field(None, description="'queue' if the run was dispatched to a worker daemon.")
+    worker: Optional[str] = Field(None, description="Id of the worker daemon that ran the task.")
+    host: Optional[str] = Field(None, description="Host name of that worker.")
+    task_id: Optional[str] = Field(None, description="Id of the task on the work queue.")
+    attempts: Optional[int] = Field(None, description="How often the task was dispatched.")
+
+class StageSchema(BaseModel):
+    name: str = Field(
+        ..., description="'prerelax' for the cheap first stage, 'coarse_scc' for the loose-SCC phase, "
+                         "'final' for the requested one."
+    )
+    method: str
+    fmax_eV_A: float
+    lattice_opt: bool
+    scc_tolerance: Optional[float] = None
+    success: bool
+    wall_time_s: Optional[float] = None
+    geometry_steps: int
+    scc_iterations: Optional[int] = Field(None, description="SCC iterations summed over all geometry steps.")
+
+class RunInfoSchema(BaseModel):
+    cache_hit: bool = Field(False, description="True if the result was served from the result cache.")
+    execution: Optional[ExecutionResourcesSchema] = None
+    restart_available: bool = Field(
+        False, description="True if the run can be continued via the continue endpoint."
+    )
+    restarted_from: Optional[str] = Field(None, description="Id of the run this one continued.")
+    charges_reused: Optional[bool] = Field(
+        None, description="Whether SCC charges of the previous run were used as the starting guess."
+    )
+    stages: List[StageSchema] = Field(
+        default_factory=list, description="Wall time and geometry steps of every DFTB+ stage."
+    )
+    trajectory_frames: Optional[int] = Field(
+        None, description="Number of stored trajectory frames, served by the trajectory endpoint."
+    )
+    settings: Optional[Dict[str, Any]] = Field(
+        None, description="K-point mesh, SCC tolerance, mixer and electronic temperature of the final stage."
+    )
+    admission: Optional[Dict[str, Any]] = Field(
+        None, description="Structure size features and the predicted memory and run time of the DFTB+ run."
+    )
+    preprocessing: Optional[Dict[str, Any]] = Field(
+        None, description="Atom counts before and after the structure clean-up and the shortest interatomic distance."
+    )
+    structure: Optional[Dict[str, Any]] = Field(
+        None, description="Formula, atom count and canonical fingerprint of the structure the run started from."
+    )
+    scheduling: Optional[Dict[str, Any]] = Field(
+        None, description="Client, priority class, predicted run time and scheduler queue wait of the run."
+    )
+
 class OptimizationResponseSchema(BaseModel):
     status: str
     request_id: str
     input_parameters: Dict[str, Any]
     detailed_results: DetailedResultsSchema
-    optimized_structure_cif_b64: str = Field(
-        ..., 
-        description="The optimized structure in CIF format, encoded as a Base64 string."
-    )
\ No newline at end of file
+    optimized_structure_cif_b64: Optional[str] = Field(
+        None,
+        description="The optimized structure in CIF format, encoded as a Base64 string "
+                    "(response_mode 'inline')."
+    )
+    artifacts: Optional[Dict[str, str]] = Field(
+        None,
+        description="Download URLs of the stored artifacts ('cif', 'gen', 'trajectory') "
+                    "(response_mode 'artifacts')."
+    )
+    run_info: RunInfoSchema = Field(
+        default_factory=RunInfoSchema,
+        description="How the calculation was executed (cache hit, resource assignment)."
+    )
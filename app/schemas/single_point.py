@@ -0,0 +1,33 @@
+# app/schemas/single_point.py
+# This file defines the schemas for the single-point (energy and forces) endpoint.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+
+class SinglePointResultSchema(BaseModel):
+    index: int = Field(..., description="Position of the structure among all uploaded frames.")
+    filename: str
+    frame: int = Field(..., description="Index of the data block within its CIF file.")
+    formula: str
+    n_atoms: int
+    energy_eV: float = Field(..., description="Mermin free energy reported by DFTB+.")
+    max_force_eV_A: float
+    forces_eV_A: Optional[List[List[float]]] = Field(None, description="Per-atom forces, in input order.")
+    stress_eV_A3: Optional[List[float]] = Field(
+        None, description="Stress in Voigt order (xx, yy, zz, yz, xz, xy) for periodic structures."
+    )
+    warm_process: bool = Field(..., description="True if the DFTB+ process was already running before this request.")
+    scc_warm_start: bool = Field(..., description="True if the SCC started from the charges of the previous geometry.")
+    wall_time_s: float
+
+class SinglePointResponseSchema(BaseModel):
+    status: str
+    request_id: str
+    method: str
+    n_structures: int
+    wall_time_s: float
+    results: List[SinglePointResultSchema]
+    pool: Dict[str, Any] = Field(..., description="Idle and busy warm DFTB+ processes after the request.")
@@ -0,0 +1,247 @@
+# app/services/batch_service.py
+# Batch optimization of many structures with results streamed as they finish.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import os
+import shutil
+import asyncio
+import tarfile
+import zipfile
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from app.core import config
+from app.core.preprocessing import StructureRejected
+from app.core.run_limits import RunLimitExceeded, enforce_limits, resolve_limit
+from app.core.scheduler import PRIORITY_LOW, scheduling
+from app.core.workspace import WorkspaceQuotaExceeded, workspace_manager
+from app.services import dftb_service
+from app.utils.logger import console, set_request_id
+
+SUPPORTED_METHODS = ["GFN1-xTB", "GFN2-xTB"]
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz")
+
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _unique_path(target_dir: str, name: str) -> str:
+    base, ext = os.path.splitext(name)
+    candidate = os.path.join(target_dir, name)
+    counter = 1
+    while os.path.exists(candidate):
+        candidate = os.path.join(target_dir, f"{base}_{counter}{ext}")
+        counter += 1
+    return candidate
+
+
+def extract_archive(archive_path: str, target_dir: str) -> List[str]:
+    """
+    Extracts every .cif member of a zip or tar archive into target_dir.
+    Directory structure inside the archive is flattened; members are never
+    written outside target_dir.
+
+    Returns:
+        Paths of the extracted CIF files, in archive order.
+    """
+    extracted = []
+    if archive_path.lower().endswith(".zip"):
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                name = os.path.basename(member.filename)
+                if member.is_dir() or not name.lower().endswith(".cif"):
+                    continue
+                path = _unique_path(target_dir, name)
+                with archive.open(member) as src, open(path, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                extracted.append(path)
+    else:
+        with tarfile.open(archive_path) as archive:
+            for member in archive:
+                name = os.path.basename(member.name)
+                if not member.isfile() or not name.lower().endswith(".cif"):
+                    continue
+                src = archive.extractfile(member)
+                if src is None:
+                    continue
+                path = _unique_path(target_dir, name)
+                with src, open(path, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                extracted.append(path)
+    return extracted
+
+
+def collect_structures(
+    files: List[UploadFile], archive: Optional[UploadFile], inputs_dir: str
+) -> List[str]:
+    """
+    Saves uploaded CIF files and the contents of an optional archive into inputs_dir.
+    Non-CIF uploads are kept so that they can be reported as per-structure failures.
+    """
+    paths = []
+    for upload in files:
+        path = _unique_path(inputs_dir, os.path.basename(str(upload.filename)))
+        with open(path, "wb") as buffer:
+            shutil.copyfileobj(upload.file, buffer)
+        paths.append(path)
+
+    if archive is not None:
+        archive_path = os.path.join(inputs_dir, os.path.basename(str(archive.filename)))
+        with open(archive_path, "wb") as buffer:
+            shutil.copyfileobj(archive.file, buffer)
+        archive_dir = os.path.join(inputs_dir, "archive")
+        os.makedirs(archive_dir, exist_ok=True)
+        paths.extend(extract_archive(archive_path, archive_dir))
+        os.remove(archive_path)
+    return paths
+
+
+async def _optimize_one(
+    batch_id: str,
+    index: int,
+    input_path: str,
+    params: Dict[str, Any],
+    gate: asyncio.Semaphore,
+) -> Dict[str, Any]:
+    filename = os.path.basename(input_path)
+    fmax = params["fmax"]
+    method = params["method"]
+    prerelax = bool(params.get("prerelax", False))
+    primitive_cell = bool(params.get("primitive_cell", False))
+    remove_solvent = bool(params.get("remove_solvent", False))
+    response_mode = params.get("response_mode", dftb_service.RESPONSE_INLINE)
+    request_id = f"{batch_id}-{index}"
+    set_request_id(request_id)
+    base = {"index": index, "filename": filename, "request_id": request_id}
+
+    if not filename.lower().endswith(".cif"):
+        return {**base, "status": "failed", "error": "Invalid file type. Please upload a .cif file."}
+    if method not in SUPPORTED_METHODS:
+        return {**base, "status": "failed",
+                "error": f"Invalid method '{method}'. Please choose 'GFN1-xTB' or 'GFN2-xTB'."}
+
+    async with gate:
+        try:
+            workspace_dir = await workspace_manager.acquire_async()
+        except WorkspaceQuotaExceeded as e:
+            return {**base, "status": "failed", "error": str(e)}
+        failed = True
+        try:
+            cif_content = await run_in_threadpool(Path(input_path).read_bytes)
+            parsed_data, output_cif, run_info = await enforce_limits(
+                dftb_service.optimize_structure(
+                    cif_content, fmax, method, workspace_dir, run_id=request_id, prerelax=prerelax,
+                    primitive_cell=primitive_cell, remove_solvent=remove_solvent
+                ),
+                resolve_limit(params.get("wall_time_limit_s"), config.RUN_WALL_TIME_LIMIT_S),
+                resolve_limit(params.get("cpu_time_limit_s"), config.RUN_CPU_TIME_LIMIT_S),
+            )
+            payload = await run_in_threadpool(
+                dftb_service.build_response_payload,
+                request_id=request_id,
+                original_filename=filename,
+                method=method,
+                fmax=fmax,
+                parsed_data=parsed_data,
+                output_cif=output_cif,
+                run_info=run_info,
+                prerelax=prerelax,
+                response_mode=response_mode,
+            )
+            failed = False
+            return {**base, **payload}
+        except StructureRejected as e:
+            # Nothing ran, so there is no workspace worth keeping
+            failed = False
+            console.warning("Batch %s: structure %s rejected (%s): %s", batch_id, filename, e.reason, e)
+            return {**base, "status": "failed", "error": str(e), "reason": e.reason, "details": e.details}
+        except RunLimitExceeded as e:
+            console.error("Batch %s: structure %s stopped: %s", batch_id, filename, e)
+            return {**base, "status": "failed", "error": str(e), "termination": f"{e.limit}_limit",
+                    "partial_progress": dftb_service.partial_progress(workspace_dir)}
+        except asyncio.CancelledError:
+            # The client went away or the batch was stopped; the run itself did not fail
+            failed = False
+            raise
+        except Exception as e:
+            console.error("Batch %s: structure %s failed: %s", batch_id, filename, e)
+            return {**base, "status": "failed", "error": str(e) or type(e).__name__}
+        finally:
+            workspace_manager.release(workspace_dir, request_id, failed=failed)
+
+
+async def run_batch(
+    batch_id: str,
+    input_paths: List[str],
+    default_fmax: float,
+    default_method: str,
+    overrides: Dict[str, Dict[str, Any]],
+    batch_dir: str,
+    default_prerelax: bool = False,
+    response_mode: str = dftb_service.RESPONSE_INLINE,
+    default_limits: Optional[Dict[str, Optional[float]]] = None,
+    default_preprocessing: Optional[Dict[str, bool]] = None,
+    tenant: Optional[str] = None,
+    priority: str = PRIORITY_LOW,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Optimizes all structures concurrently and yields one result per structure in
+    completion order, followed by a summary record. Failures are yielded inline and
+    do not stop the batch. The batch directory is removed when iteration ends,
+    including when the consumer goes away early.
+
+    Args:
+        batch_id: Identifier of the batch, used to derive per-structure request ids.
+        input_paths: Saved input files.
+        default_fmax: Shared force threshold.
+        default_method: Shared GFN-xTB method.
+        overrides: Optional per-file parameters, keyed by file name.
+        batch_dir: Directory holding the inputs; each structure runs in its own pooled workspace.
+        default_prerelax: Shared switch for the pre-relaxation stage.
+        response_mode: "inline" (Base64 CIF) or "artifacts" (download URLs) for every result.
+        default_limits: Shared wall_time_limit_s / cpu_time_limit_s of each structure,
+            capped by the configured maximums.
+        default_preprocessing: Shared primitive_cell / remove_solvent switches.
+        tenant: Client the structures are scheduled for (see scheduler).
+        priority: Scheduling class of every structure.
+    """
+    # Bound the number of structures holding a workspace at once; their DFTB+ runs then
+    # take turns with other clients' work in the fair-share scheduler.
+    gate = asyncio.Semaphore(max(1, 2 * config.MAX_CONCURRENT_RUNS))
+    tasks = []
+    for index, path in enumerate(input_paths):
+        params = {
+            "fmax": default_fmax, "method": default_method, "prerelax": default_prerelax,
+            **(default_limits or {}), **(default_preprocessing or {}),
+        }
+        params.update(overrides.get(os.path.basename(path), {}))
+        params["response_mode"] = response_mode
+        with scheduling(tenant, priority):
+            tasks.append(asyncio.create_task(_optimize_one(batch_id, index, path, params, gate)))
+
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            if result["status"] == "success":
+                succeeded += 1
+            yield result
+        yield {
+            "batch_id": batch_id,
+            "status": "batch_finished",
+            "total": len(tasks),
+            "succeeded": succeeded,
+            "failed": len(tasks) - succeeded,
+        }
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        workspace_manager.discard(batch_dir)
+        console.info("Scheduled removal of batch directory: %s", batch_dir)
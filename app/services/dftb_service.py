@@ -6,58 +6,614 @@
 
 
 import os
+import time
 import shutil
+import base64
 from fastapi import UploadFile
-from typing import Tuple
+from fastapi.concurrency import run_in_threadpool
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from app.utils.file_convertor import cif_to_gen, gen_to_cif
+from ase import Atoms
+
+from app.utils.file_convertor import (
+    StructureInput, atoms_to_cif_bytes, read_gen_file, write_gen_file
+)
 from app.utils.logger import console
-from app.core.dftb_runner import run_dftb
+from app.core import config
+from app.core.metrics import OPTIMIZATIONS_IN_FLIGHT, STAGE_DURATION
+from app.core.admission import memory_admission, resource_model
+from app.core.dftb_runner import run_dftb_async, generate_hsd_content, core_allocator, STDOUT_FILE
+from app.core.executors import executor
+from app.core.hsd_settings import coarse_scc_stage, n_kpoints, select_settings
+from app.core.preprocessing import preprocess_structure, read_structure
+from app.core.progress import summarize_stdout
 from app.core.output_parser import parse_detailed_out
+from app.core.result_cache import result_cache, structure_fingerprint, cache_key
+from app.core.scheduler import scheduler
+from app.core import trajectory
+from app.services.run_store import TRAJECTORY_FILE, run_store
+from app.services.results_store import results_store
+
+# How the optimized structure is returned: Base64 in the JSON body, or stored with the
+# run and served by the artifact download endpoint.
+RESPONSE_INLINE = "inline"
+RESPONSE_ARTIFACTS = "artifacts"
+RESPONSE_MODES = (RESPONSE_INLINE, RESPONSE_ARTIFACTS)
+ARTIFACTS_URL_PREFIX = "/api/v1/optimize/runs"
+
+# Optimization stages in execution order and the workspace sub-directory each runs in.
+STAGE_DIRECTORIES = (("prerelax", "prerelax"), ("coarse_scc", "coarse_scc"), ("final", ""))
+
+
+def save_uploaded_file(input_file: UploadFile, target_dir: str) -> str:
+    """
+    Copies an uploaded file into the given directory.
+
+    Returns:
+        The path of the saved file.
+    """
+    input_cif_path = os.path.join(target_dir, os.path.basename(str(input_file.filename)))
+    with open(input_cif_path, "wb") as buffer:
+        shutil.copyfileobj(input_file.file, buffer)
+    console.info("Saved input file to %s", input_cif_path)
+    return input_cif_path
 
 async def perform_optimization(
-    input_file: UploadFile, fmax: float, method: str, workspace_dir: str
-) -> Tuple[dict, str]:
+    input_file: UploadFile,
+    fmax: float,
+    method: str,
+    workspace_dir: str,
+    run_id: Optional[str] = None,
+    prerelax: bool = False,
+    primitive_cell: bool = False,
+    remove_solvent: bool = False,
+) -> Tuple[dict, bytes, dict]:
     """
     Orchestrates the optimization workflow within a given directory.
-    It no longer creates or cleans up the workspace.
+    It no longer creates or cleans up the workspace. The upload is parsed in memory;
+    only the files DFTB+ needs are written to the workspace.
 
     Args:
         input_file: The uploaded file object.
         fmax: Force convergence threshold.
         method: GFN-xTB method.
         workspace_dir: The pre-existing directory to perform calculations in.
+        run_id: If given, restart files of the run are kept under this id.
+        prerelax: Run a cheap pre-relaxation stage before the requested optimization.
+        primitive_cell: Reduce the structure to its primitive cell first.
+        remove_solvent: Remove small solvent molecules first.
 
     Returns:
-        A tuple containing: (parsed_results_dict, output_cif_path)
+        A tuple containing: (parsed_results_dict, optimized_cif_bytes, run_info)
     """
-    # Save uploaded file
-    input_cif_path = os.path.join(workspace_dir, str(input_file.filename))
-    with open(input_cif_path, "wb") as buffer:
-        shutil.copyfileobj(input_file.file, buffer)
-    console.info(f"Saved input file to {input_cif_path}")
+    with STAGE_DURATION.time(stage="perform_optimization"):
+        with STAGE_DURATION.time(stage="read_upload"):
+            cif_content = await input_file.read()
+        console.info("Received input file %s (%d bytes)", input_file.filename, len(cif_content))
+        return await optimize_structure(
+            cif_content, fmax, method, workspace_dir, run_id=run_id, prerelax=prerelax,
+            primitive_cell=primitive_cell, remove_solvent=remove_solvent
+        )
+
+async def optimize_structure(
+    structure: StructureInput,
+    fmax: float,
+    method: str,
+    workspace_dir: str,
+    on_stage: Optional[Callable[[str], None]] = None,
+    run_id: Optional[str] = None,
+    prerelax: bool = False,
+    primitive_cell: bool = False,
+    remove_solvent: bool = False,
+) -> Tuple[dict, bytes, dict]:
+    """
+    Runs the optimization workflow for a structure held in memory.
+
+    The structure is validated and cleaned up first (see preprocessing.preprocess_structure),
+    so unusable inputs fail with StructureRejected before DFTB+ is started.
+
+    Args:
+        structure: CIF content as bytes, or an already parsed ase.Atoms object.
+        fmax: Force convergence threshold.
+        method: GFN-xTB method.
+        workspace_dir: The pre-existing directory to perform calculations in.
+        on_stage: Optional callback notified with the name of each workflow stage.
+        run_id: If given, restart files of the run are kept under this id.
+        prerelax: First relax the atoms cheaply (GFN1-xTB, loose fmax, fixed lattice)
+            and start the requested optimization from that geometry.
+        primitive_cell: Reduce the structure to its primitive cell (needs spglib).
+        remove_solvent: Remove small non-metal molecules (solvent, guests) from a framework.
+
+    Returns:
+        A tuple containing: (parsed_results_dict, optimized_cif_bytes, run_info)
+    """
+    with OPTIMIZATIONS_IN_FLIGHT.track_inprogress():
+        return await _optimize_atoms(
+            structure, fmax, method, workspace_dir, on_stage, run_id, prerelax, primitive_cell, remove_solvent
+        )
+
+async def _optimize_atoms(
+    structure: StructureInput,
+    fmax: float,
+    method: str,
+    workspace_dir: str,
+    on_stage: Optional[Callable[[str], None]],
+    run_id: Optional[str],
+    prerelax: bool,
+    primitive_cell: bool,
+    remove_solvent: bool,
+) -> Tuple[dict, bytes, dict]:
+    report = _stage_reporter(on_stage)
+
+    # Parse the input once; cache lookup and GEN conversion share the result
+    report("converting_input")
+    with STAGE_DURATION.time(stage="parse_input"):
+        atoms = await run_in_threadpool(read_structure, structure)
+
+    # Reject unusable structures and reduce the rest before anything costly happens
+    report("validating_structure")
+    with STAGE_DURATION.time(stage="preprocess"):
+        atoms, preprocessing = await run_in_threadpool(
+            preprocess_structure, atoms, method, primitive_cell, remove_solvent
+        )
+    identity = structure_identity(atoms)
+
+    # Look up an identical earlier calculation
+    key = None
+    if result_cache.enabled:
+        report("checking_cache")
+        with STAGE_DURATION.time(stage="cache_lookup"):
+            key = optimization_cache_key(atoms, fmax, method, prerelax, fingerprint=identity["fingerprint"])
+            cached = await run_in_threadpool(result_cache.get, key)
+        if cached is not None:
+            parsed_data, output_cif = cached
+            console.success("Result cache hit for %s (%s).", identity["formula"], key[:12])
+            # Nothing ran, so there are no restart files or trajectory to serve
+            return parsed_data, output_cif, {
+                "cache_hit": True, "restart_available": False, "trajectory_frames": None,
+                "preprocessing": preprocessing, "structure": identity,
+            }
+
+    # Turn away structures that can never fit into memory before anything is written
+    estimate = run_estimate(atoms, method, fmax)
+    memory_admission.check(estimate)
+
+    # Wait for a turn in fair-share order; the predicted run time puts small structures first
+    report("waiting_for_slot")
+    async with scheduler.slot(len(atoms), estimate["estimated_wall_time_s"], key=run_id) as ticket:
+        # Only the geometry DFTB+ reads is written to disk
+        input_gen_name = "input.gen"
+        with STAGE_DURATION.time(stage="write_gen"):
+            write_gen_file(atoms, os.path.join(workspace_dir, input_gen_name))
+
+        stages = []
+        reuse_charges = False
+        if prerelax:
+            report("prerelaxing")
+            input_gen_name, reuse_charges, stage = await _prerelax(workspace_dir, input_gen_name, fmax, method)
+            stages.append(stage)
+
+        parsed_data, output_cif, run_info = await _run_and_collect(
+            workspace_dir, input_gen_name, fmax, method, report,
+            run_id=run_id, result_cache_key=key, stages=stages, read_initial_charges=reuse_charges
+        )
+    run_info["preprocessing"] = preprocessing
+    run_info["structure"] = identity
+    run_info["scheduling"] = ticket
+    return parsed_data, output_cif, run_info
+
+async def _prerelax(
+    workspace_dir: str, input_gen_name: str, fmax: float, method: str
+) -> Tuple[str, bool, dict]:
+    """
+    Cheap first stage: GFN1-xTB with a loose force threshold and a fixed lattice.
+
+    Returns:
+        (gen file to start the final stage from, whether its SCC charges can be reused, stage record)
+    """
+    stage_method = config.PRERELAX_METHOD
+    stage_fmax = max(fmax, config.PRERELAX_FMAX)
+    prerelaxed_name, reuse_charges, stage = await _run_substage(
+        "prerelax", workspace_dir, input_gen_name, stage_fmax, stage_method,
+        keep_charges=stage_method == method, lattice_opt=False, max_steps=config.PRERELAX_MAX_STEPS
+    )
+    if prerelaxed_name is None:
+        console.warning("Pre-relaxation failed; continuing from the original geometry.")
+        return input_gen_name, False, stage
+    console.success(
+        "Pre-relaxation finished in %s s after %d step(s).", stage["wall_time_s"], stage["geometry_steps"]
+    )
+    return prerelaxed_name, reuse_charges, stage
+
+async def _run_substage(
+    name: str,
+    workspace_dir: str,
+    input_gen_name: str,
+    fmax: float,
+    method: str,
+    keep_charges: bool = True,
+    **hsd_options,
+) -> Tuple[Optional[str], bool, dict]:
+    """
+    Runs an intermediate stage in a sub-directory of the workspace and copies its final
+    geometry (as <name>_end.gen) and, with keep_charges, its SCC charges back into the
+    workspace for the next stage.
+
+    Returns:
+        (gen file of the stage result or None if the stage failed, whether charges.bin
+         was taken over, stage record)
+    """
+    stage_dir = os.path.join(workspace_dir, name)
+    os.makedirs(stage_dir, exist_ok=True)
+    shutil.copyfile(os.path.join(workspace_dir, input_gen_name), os.path.join(stage_dir, input_gen_name))
+    if hsd_options.get("read_initial_charges"):
+        shutil.copyfile(os.path.join(workspace_dir, "charges.bin"), os.path.join(stage_dir, "charges.bin"))
+
+    success, _, stage = await _run_stage(name, stage_dir, input_gen_name, fmax, method, **hsd_options)
+    stage_geometry = os.path.join(stage_dir, "geo_end.gen")
+    if not success or not os.path.exists(stage_geometry):
+        return None, False, stage
+
+    result_name = f"{name}_end.gen"
+    shutil.copyfile(stage_geometry, os.path.join(workspace_dir, result_name))
+    stage_charges = os.path.join(stage_dir, "charges.bin")
+    take_charges = keep_charges and os.path.exists(stage_charges)
+    if take_charges:
+        shutil.copyfile(stage_charges, os.path.join(workspace_dir, "charges.bin"))
+    return result_name, take_charges, stage
+
+async def _run_stage(
+    name: str, workspace_dir: str, input_gen_name: str, fmax: float, method: str, **hsd_options
+) -> Tuple[bool, dict, dict]:
+    """
+    Runs one DFTB+ optimization stage and describes it (wall time, geometry steps).
+
+    Returns:
+        (success, run_info from the runner, stage record)
+    """
+    started = time.perf_counter()
+    success, run_info = await run_dftb_async(
+        workspace_dir, input_gen_name, fmax, method, executor=executor, **hsd_options
+    )
+    execution = run_info.get("execution", {})
+    steps = await run_in_threadpool(summarize_stdout, os.path.join(workspace_dir, STDOUT_FILE))
+    stage = {
+        "name": name,
+        "method": method,
+        "fmax_eV_A": fmax,
+        "lattice_opt": hsd_options.get("lattice_opt", True),
+        "scc_tolerance": run_info.get("settings", {}).get("scc_tolerance"),
+        "success": success,
+        "wall_time_s": execution.get("wall_time_s", round(time.perf_counter() - started, 3)),
+        "geometry_steps": len(steps),
+        "scc_iterations": sum(step["scc_iterations"] for step in steps),
+    }
+    # Calibrate the memory/run-time predictions with what the run actually used; the
+    # pre-relaxation and coarse SCC stages run at other settings than the predicted run
+    if name == "final" and success and "max_rss_mb" in execution and "admission" in run_info:
+        resource_model.observe(
+            method, run_info["admission"], execution["max_rss_mb"], execution["cpu_time_s"], stage["geometry_steps"]
+        )
+        await run_in_threadpool(resource_model.flush)
+    return success, run_info, stage
+
+async def continue_optimization(
+    restart_from: str,
+    fmax: float,
+    method: str,
+    workspace_dir: str,
+    on_stage: Optional[Callable[[str], None]] = None,
+    run_id: Optional[str] = None,
+) -> Tuple[dict, bytes, dict]:
+    """
+    Resumes an earlier run from its final geometry, reusing its SCC charges when the
+    method is unchanged. Useful for unconverged runs or for tightening fmax.
+
+    Args:
+        restart_from: Id of the stored run to continue.
+        fmax: Force convergence threshold for the new run.
+        method: GFN-xTB method for the new run.
+        workspace_dir: The pre-existing directory to perform calculations in.
+        on_stage: Optional callback notified with the name of each workflow stage.
+        run_id: If given, restart files of the new run are kept under this id.
+
+    Returns:
+        A tuple containing: (parsed_results_dict, optimized_cif_bytes, run_info)
+    """
+    report = _stage_reporter(on_stage)
+
+    previous = run_store.load(restart_from)
+    files = run_store.restart_files(restart_from)
+    if previous is None or files["geometry"] is None:
+        raise LookupError(f"No restart data stored for run '{restart_from}'.")
+
+    report("preparing_restart")
+    input_gen_name = "restart_input.gen"
+    shutil.copyfile(files["geometry"], os.path.join(workspace_dir, input_gen_name))
+    reuse_charges = files["charges"] is not None and previous.get("method") == method
+    if reuse_charges:
+        shutil.copyfile(files["charges"], os.path.join(workspace_dir, "charges.bin"))
+    console.info("Continuing run %s (reusing SCC charges: %s).", restart_from, reuse_charges)
+
+    atoms = read_gen_file(files["geometry"])
+    with OPTIMIZATIONS_IN_FLIGHT.track_inprogress():
+        report("waiting_for_slot")
+        expected_s = run_estimate(atoms, method, fmax)["estimated_wall_time_s"]
+        async with scheduler.slot(len(atoms), expected_s, key=run_id) as ticket:
+            parsed_data, output_cif, run_info = await _run_and_collect(
+                workspace_dir, input_gen_name, fmax, method, report,
+                run_id=run_id, read_initial_charges=reuse_charges
+            )
+    run_info["structure"] = structure_identity(atoms)
+    run_info["scheduling"] = ticket
+    run_info["restarted_from"] = restart_from
+    run_info["charges_reused"] = reuse_charges
+    return parsed_data, output_cif, run_info
+
+def partial_progress(workspace_dir: str) -> Optional[dict]:
+    """
+    How far an optimization got before it was stopped: the stage that ran last, its
+    number of geometry steps and its last step record (energy, max gradient), read
+    from the DFTB+ stdout in the workspace. None if DFTB+ never started.
+    """
+    logs = []
+    for stage, directory in STAGE_DIRECTORIES:
+        path = os.path.join(workspace_dir, directory, STDOUT_FILE)
+        try:
+            logs.append((os.path.getmtime(path), stage, path))
+        except OSError:
+            continue
+    if not logs:
+        return None
+    _, stage, path = max(logs)
+    steps = summarize_stdout(path)
+    return {
+        "stage": stage,
+        "geometry_steps": len(steps),
+        "last_step": steps[-1] if steps else None,
+    }
+
+def _stage_reporter(on_stage: Optional[Callable[[str], None]]) -> Callable[[str], None]:
+    def report(stage: str):
+        if on_stage is not None:
+            on_stage(stage)
+    return report
+
+async def _run_and_collect(
+    workspace_dir: str,
+    input_gen_name: str,
+    fmax: float,
+    method: str,
+    report: Callable[[str], None],
+    run_id: Optional[str] = None,
+    result_cache_key: Optional[str] = None,
+    stages: Optional[list] = None,
+    **hsd_options,
+) -> Tuple[dict, bytes, dict]:
+    """
+    Runs DFTB+ on a prepared GEN file, then parses, converts, caches and keeps restart files.
+    Records of earlier stages, if any, are reported together with the final stage.
+
+    Tight force thresholds are reached in two phases: a coarse one with a loose SCC
+    tolerance, then the final one from its geometry and charges (see
+    hsd_settings.coarse_scc_stage).
+    """
+    stages = list(stages or [])
+    # Geometry each stage started from; the pre-relaxation keeps the lattice fixed, so
+    # its result (or the original structure, if it failed) has the cell it ran with.
+    stage_inputs = {stage["name"]: input_gen_name for stage in stages}
+    coarse = coarse_scc_stage(fmax)
+    if coarse is not None:
+        report("coarse_scc")
+        coarse_fmax, coarse_tolerance = coarse
+        stage_inputs["coarse_scc"] = input_gen_name
+        coarse_gen_name, charges_taken, stage = await _run_substage(
+            "coarse_scc", workspace_dir, input_gen_name, coarse_fmax, method,
+            scc_tolerance=coarse_tolerance, **hsd_options
+        )
+        stages.append(stage)
+        if coarse_gen_name is not None:
+            input_gen_name = coarse_gen_name
+            hsd_options["read_initial_charges"] = hsd_options.get("read_initial_charges", False) or charges_taken
+        else:
+            console.warning("Coarse SCC phase failed; running the final phase from the original geometry.")
 
-    # Convert CIF to GEN
-    cif_to_gen(input_cif_path)
-    input_gen_name = os.path.basename(os.path.splitext(input_cif_path)[0] + ".gen")
-    
     # Run DFTB+ calculation
-    success = run_dftb(workspace_dir, input_gen_name, fmax, method)
+    report("running_dftb")
+    stage_inputs["final"] = input_gen_name
+    success, run_info, stage = await _run_stage(
+        "final", workspace_dir, input_gen_name, fmax, method, **hsd_options
+    )
     if not success:
         raise RuntimeError("DFTB+ calculation process failed.")
+    run_info["cache_hit"] = False
+    run_info["stages"] = stages + [stage]
+
+    # Process output files in a worker thread; detailed.out can be hundreds of MB
+    report("parsing_results")
+    parsed_data = await run_in_threadpool(_parse_outputs, workspace_dir)
+
+    report("converting_output")
+    output_cif = await run_in_threadpool(
+        _store_outputs, workspace_dir, fmax, method, parsed_data, run_info, stage_inputs, run_id, result_cache_key
+    )
+
+    # Return data, the final CIF content and how the run was executed
+    return parsed_data, output_cif, run_info
 
-    # Process output files
+def _parse_outputs(workspace_dir: str) -> dict:
+    """Parses detailed.out of the final stage. Blocking."""
     detailed_out_path = os.path.join(workspace_dir, "detailed.out")
     geo_end_gen_path = os.path.join(workspace_dir, "geo_end.gen")
     if not os.path.exists(detailed_out_path) or not os.path.exists(geo_end_gen_path):
         raise FileNotFoundError("Required output files (detailed.out, geo_end.gen) are missing.")
-        
-    # Parse results
-    parsed_data = parse_detailed_out(detailed_out_path)
-    
-    # Convert final structure
-    gen_to_cif(geo_end_gen_path)
-    output_cif_path = os.path.join(workspace_dir, "geo_end.cif")
-    
-    # Return data and the path to the final CIF file
-    return parsed_data, output_cif_path
\ No newline at end of file
+
+    with STAGE_DURATION.time(stage="parse_detailed_out"):
+        return parse_detailed_out(detailed_out_path)
+
+def _store_outputs(
+    workspace_dir: str,
+    fmax: float,
+    method: str,
+    parsed_data: dict,
+    run_info: dict,
+    stage_inputs: Dict[str, str],
+    run_id: Optional[str],
+    result_cache_key: Optional[str],
+) -> bytes:
+    """
+    Converts the final geometry to CIF, caches the result and keeps the restart files
+    and trajectory of the run (recorded in run_info). Blocking.
+    """
+    # Convert final structure in memory
+    with STAGE_DURATION.time(stage="convert_output"):
+        final_atoms = read_gen_file(os.path.join(workspace_dir, "geo_end.gen"))
+        output_cif = atoms_to_cif_bytes(final_atoms)
+
+    # Unconverged geometries are not worth serving again; a new request may get further
+    summary = parsed_data['summary']
+    if (result_cache_key is not None and summary.get('calculation_status') == 'Success'
+            and summary.get('convergence_status') == 'Geometry converged'):
+        result_cache.put(result_cache_key, parsed_data, output_cif)
+
+    # Keep the final geometry and SCC charges so the run can be continued later
+    run_info["restart_available"] = run_id is not None and run_store.save(run_id, workspace_dir, {
+        "method": method,
+        "fmax_eV_A": fmax,
+        "convergence_status": summary.get('convergence_status'),
+    })
+    if run_info["restart_available"]:
+        run_info["trajectory_frames"] = _store_trajectory(
+            run_id, workspace_dir, run_info["stages"], stage_inputs, final_atoms
+        )
+    return output_cif
+
+def _store_trajectory(
+    run_id: str, workspace_dir: str, stages: List[dict], stage_inputs: Dict[str, str], final_atoms: Atoms
+) -> Optional[int]:
+    """
+    Stores the per-step positions, cells, energies and forces of the run as arrays next
+    to its restart files, the frames of all successful stages joined in execution order
+    and tagged by stage. Returns the number of frames, or None if none were written.
+    A failure here does not fail the optimization.
+    """
+    directories = dict(STAGE_DIRECTORIES)
+    try:
+        with STAGE_DURATION.time(stage="store_trajectory"):
+            parts = []
+            for stage in stages:
+                if not stage["success"]:
+                    continue  # the next stage started over from this stage's input
+                stage_dir = os.path.join(workspace_dir, directories[stage["name"]])
+                initial = read_gen_file(os.path.join(workspace_dir, stage_inputs[stage["name"]]))
+                if stage["name"] == "final":
+                    final = final_atoms
+                else:
+                    final = read_gen_file(os.path.join(stage_dir, "geo_end.gen"))
+                extracted = trajectory.extract_trajectory(
+                    os.path.join(stage_dir, TRAJECTORY_FILE),
+                    initial,
+                    final,
+                    summarize_stdout(os.path.join(stage_dir, STDOUT_FILE)),
+                    detailed_out_path=os.path.join(stage_dir, "detailed.out"),
+                    lattice_opt=stage["lattice_opt"],
+                )
+                if extracted is not None:
+                    parts.append((stage["name"], extracted))
+            extracted = trajectory.concatenate_stages(parts)
+            if extracted is None:
+                return None
+            arrays, metadata = extracted
+            trajectory.save_trajectory(run_store.trajectory_dir(run_id), arrays, metadata, config.TRAJECTORY_DTYPE)
+    except Exception as e:
+        console.warning("Could not store the trajectory of run %s: %s", run_id, e)
+        return None
+    return metadata["n_frames"]
+
+def run_estimate(atoms: Atoms, method: str, fmax: float) -> Dict[str, Any]:
+    """
+    Predicted memory and run time of optimizing the structure (see admission.ResourceModel),
+    with the threads and k-points its run will get. The memory decides admission, the wall
+    time the structure's place in the scheduler queue.
+    """
+    return resource_model.estimate(
+        atoms, method, threads=core_allocator.threads_for(len(atoms)),
+        kpoints=n_kpoints(select_settings(atoms, fmax)),
+    )
+
+def structure_identity(atoms: Atoms) -> Dict[str, Any]:
+    """
+    Formula, atom count and canonical fingerprint (see result_cache.structure_fingerprint)
+    of the structure a run starts from; stored with its result for lookups.
+    """
+    return {
+        "formula": atoms.get_chemical_formula(),
+        "n_atoms": len(atoms),
+        "fingerprint": structure_fingerprint(atoms, config.CACHE_TOLERANCE),
+    }
+
+def optimization_cache_key(
+    atoms: Atoms, fmax: float, method: str, prerelax: bool = False, fingerprint: Optional[str] = None
+) -> str:
+    """
+    Result cache key: canonical structure fingerprint plus the DFTB+ input parameters.
+    """
+    if fingerprint is None:
+        fingerprint = structure_fingerprint(atoms, config.CACHE_TOLERANCE)
+    # The geometry file name does not influence the result, so a fixed placeholder is used.
+    parameters = generate_hsd_content(method, fmax, "input.gen", settings=select_settings(atoms, fmax))
+    coarse = coarse_scc_stage(fmax)
+    if coarse is not None:
+        parameters += f"\ncoarse_scc={coarse[0]},{coarse[1]}"
+    if prerelax:
+        # A pre-relaxation stage may lead to a different local minimum.
+        parameters += f"\nprerelax={config.PRERELAX_METHOD},{config.PRERELAX_FMAX},{config.PRERELAX_MAX_STEPS}"
+    return cache_key(fingerprint, parameters)
+
+def build_response_payload(
+    request_id: str,
+    original_filename: Optional[str],
+    method: str,
+    fmax: float,
+    parsed_data: dict,
+    output_cif: bytes,
+    run_info: Optional[dict] = None,
+    prerelax: bool = False,
+    response_mode: str = RESPONSE_INLINE,
+) -> Dict[str, Any]:
+    """
+    Builds the JSON payload described by OptimizationResponseSchema.
+
+    In the "inline" mode the optimized CIF is embedded Base64-encoded. In the "artifacts"
+    mode it is stored with the run instead, and the payload lists download URLs for the
+    CIF and any other stored artifacts (final GEN, trajectory).
+
+    Computed results (not cache hits) are also recorded in the results store.
+    """
+    payload: Dict[str, Any] = {
+        "status": "success",
+        "request_id": request_id,
+        "input_parameters": {
+            "original_filename": original_filename,
+            "method": method,
+            "fmax_eV_A": fmax,
+            "prerelax": prerelax
+        },
+        "detailed_results": parsed_data,
+        "optimized_structure_cif_b64": None,
+        "artifacts": None,
+        "run_info": run_info or {},
+    }
+    with STAGE_DURATION.time(stage="encode_response"):
+        if response_mode == RESPONSE_ARTIFACTS:
+            run_store.save_structure(request_id, output_cif)
+            payload["artifacts"] = {
+                kind: f"{ARTIFACTS_URL_PREFIX}/{request_id}/artifacts/{kind}"
+                for kind in run_store.available_artifacts(request_id)
+            }
+        else:
+            payload["optimized_structure_cif_b64"] = base64.b64encode(output_cif).decode('utf-8')
+    if not payload["run_info"].get("cache_hit"):
+        with STAGE_DURATION.time(stage="record_result"):
+            results_store.record(payload, output_cif)
+    return payload
@@ -0,0 +1,532 @@
+# app/services/job_manager.py
+# Asynchronous job queue for long-running optimizations with on-disk job state.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import asyncio
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from app.core import config
+from app.core import metrics
+from app.core.dftb_runner import STDOUT_FILE
+from app.core.progress import log_path_if_exists
+from app.core.run_limits import RunLimitExceeded, enforce_limits
+from app.core.scheduler import PRIORITY_NORMAL, FairShareScheduler, scheduling
+from app.core.workspace import WorkspaceQuotaExceeded, workspace_manager
+from app.services import dftb_service
+from app.utils.logger import console, set_request_id, request_id_var
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+ACTIVE_STATES = (JOB_QUEUED, JOB_RUNNING)
+
+# How often a running job checks its record for a cancellation requested by another process.
+CANCEL_POLL_SECONDS = 2.0
+
+
+def _utcnow() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class JobStore:
+    """
+    Persists job records as JSON files so that job state survives process restarts.
+
+    Layout: <base_dir>/<job_id>/job.json, result.json, input/, dftb_stdout.log
+    (plus prerelax/ and coarse_scc/ with the logs of those stages). The DFTB+ run itself
+    uses a pooled scratch workspace recorded in the job while it runs.
+    """
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.base_dir, job_id)
+
+    def kept_stdout_log(self, job_id: str, directory: str = "") -> str:
+        return os.path.join(self.job_dir(job_id), directory, STDOUT_FILE)
+
+    def stdout_log_paths(self, job_id: str) -> List[Tuple[str, Optional[str]]]:
+        """
+        (stage, path of its DFTB+ stdout or None) for every optimization stage in execution
+        order: in the job's workspace while it runs, kept in the job directory afterwards.
+        """
+        job = self.load(job_id) or {}
+        logs = []
+        for stage, directory in dftb_service.STAGE_DIRECTORIES:
+            candidates = [self.kept_stdout_log(job_id, directory)]
+            if job.get("workspace_dir"):
+                candidates.insert(0, os.path.join(job["workspace_dir"], directory, STDOUT_FILE))
+            logs.append((stage, log_path_if_exists(*candidates)))
+        return logs
+
+    def keep_stdout_logs(self, job_id: str, workspace_dir: Optional[str]):
+        """
+        Replaces the kept logs with those of every stage in the workspace; without a
+        workspace the kept logs are only removed (e.g. before a job is run again).
+        """
+        for _, directory in dftb_service.STAGE_DIRECTORIES:
+            kept = self.kept_stdout_log(job_id, directory)
+            running_log = os.path.join(workspace_dir, directory, STDOUT_FILE) if workspace_dir else None
+            if running_log is not None and os.path.exists(running_log):
+                os.makedirs(os.path.dirname(kept), exist_ok=True)
+                shutil.copyfile(running_log, kept)
+            else:
+                try:
+                    os.remove(kept)
+                except FileNotFoundError:
+                    pass
+
+    def _write_json(self, path: str, data: Dict[str, Any]):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def create(self, job: Dict[str, Any]):
+        os.makedirs(os.path.join(self.job_dir(job["job_id"]), "input"), exist_ok=True)
+        self.save(job)
+
+    def save(self, job: Dict[str, Any]):
+        self._write_json(os.path.join(self.job_dir(job["job_id"]), "job.json"), job)
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.job_dir(os.path.basename(job_id)), "job.json")
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def update(self, job_id: str, **fields) -> Dict[str, Any]:
+        job = self.load(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        job.update(fields)
+        self.save(job)
+        return job
+
+    def save_result(self, job_id: str, payload: Dict[str, Any]):
+        self._write_json(os.path.join(self.job_dir(job_id), "result.json"), payload)
+
+    def load_result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.job_dir(os.path.basename(job_id)), "result.json")
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        jobs = []
+        if not os.path.isdir(self.base_dir):
+            return jobs
+        for name in os.listdir(self.base_dir):
+            job = self.load(name)
+            if job is not None:
+                jobs.append(job)
+        return jobs
+
+    def claim_owner(self, job_id: str) -> int:
+        """PID of the process holding the job's claim, or 0 if there is none."""
+        try:
+            with open(os.path.join(self.job_dir(job_id), "claim"), "r") as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def try_claim(self, job_id: str) -> bool:
+        """
+        Atomically marks a job as owned by this process.
+        A claim left behind by a dead process is considered stale and replaced.
+        """
+        claim_path = os.path.join(self.job_dir(job_id), "claim")
+        for _ in range(2):
+            try:
+                fd = os.open(claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                owner = self.claim_owner(job_id)
+                if owner and (owner == os.getpid() or _pid_alive(owner)):
+                    return False
+                try:
+                    os.remove(claim_path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(str(os.getpid()))
+            return True
+        return False
+
+    def release_claim(self, job_id: str):
+        try:
+            os.remove(os.path.join(self.job_dir(job_id), "claim"))
+        except FileNotFoundError:
+            pass
+
+
+class JobManager:
+    """
+    Runs submitted optimization jobs, at most `num_workers` at a time.
+
+    Queued jobs start in fair-share order (see scheduler.FairShareScheduler): by priority
+    class, then the client with the fewest running jobs and least recent usage, then the
+    smallest predicted run time. Each job runs within its wall-clock and CPU-time limits
+    and can be cancelled while queued or running; a running job is stopped by cancelling
+    its task, which kills the DFTB+ process. Cancellations of jobs running in another
+    process are passed on through the job record.
+    """
+
+    def __init__(self, store: JobStore, num_workers: int):
+        self.store = store
+        self.num_workers = num_workers
+        self.scheduler = FairShareScheduler(
+            "jobs", num_workers, config.SCHEDULER_AGING_S,
+            config.SCHEDULER_USAGE_HALF_LIFE_S, config.SCHEDULER_STATS_WINDOW_S,
+        )
+        self._started = False
+        # One task per active job: it waits for the job's turn, then runs it.
+        self._dispatchers: Dict[str, asyncio.Task] = {}
+        self._admitted: set = set()
+        self._running: Dict[str, asyncio.Task] = {}
+
+    async def start(self):
+        self._started = True
+        recovered = 0
+        for job in sorted(self.store.list_jobs(), key=lambda j: j["created_at"]):
+            if job["status"] in ACTIVE_STATES:
+                if job["status"] == JOB_RUNNING:
+                    owner = self.store.claim_owner(job["job_id"])
+                    if owner and owner != os.getpid() and _pid_alive(owner):
+                        continue  # still running in a live peer process
+                    # The owner is gone (a claim with our own PID is from a previous life)
+                    self.store.release_claim(job["job_id"])
+                    job = self.store.update(job["job_id"], status=JOB_QUEUED, stage=None)
+                self._enqueue(job["job_id"])
+                recovered += 1
+        if recovered:
+            console.info("Recovered %d unfinished job(s) from %s", recovered, self.store.base_dir)
+        console.info("Job manager started; %d job(s) run at a time.", self.num_workers)
+
+    async def stop(self):
+        tasks = list(self._dispatchers.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._dispatchers = {}
+        self._started = False
+
+    def _enqueue(self, job_id: str):
+        assert self._started, "JobManager.start() has not been called"
+        self._dispatchers[job_id] = asyncio.create_task(self._dispatch(job_id))
+
+    @property
+    def queued_count(self) -> int:
+        return self.scheduler.waiting
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        return self.scheduler.queue_position(job_id)
+
+    def _new_job(
+        self,
+        original_filename: Optional[str],
+        fmax: float,
+        method: str,
+        prerelax: bool = False,
+        response_mode: str = dftb_service.RESPONSE_INLINE,
+        wall_time_limit_s: Optional[float] = None,
+        cpu_time_limit_s: Optional[float] = None,
+        primitive_cell: bool = False,
+        remove_solvent: bool = False,
+        tenant: Optional[str] = None,
+        priority: str = PRIORITY_NORMAL,
+        estimate: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        estimate = estimate or {}
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "status": JOB_QUEUED,
+            "stage": None,
+            "created_at": _utcnow(),
+            "started_at": None,
+            "finished_at": None,
+            "input_parameters": {
+                "original_filename": original_filename,
+                "method": method,
+                "fmax_eV_A": fmax,
+                "prerelax": prerelax,
+                "primitive_cell": primitive_cell,
+                "remove_solvent": remove_solvent,
+                "response_mode": response_mode,
+                "wall_time_limit_s": wall_time_limit_s,
+                "cpu_time_limit_s": cpu_time_limit_s,
+            },
+            "scheduling": {
+                "tenant": tenant,
+                "priority": priority,
+                "n_atoms": estimate.get("n_atoms", 0),
+                "expected_s": estimate.get("estimated_wall_time_s", 0.0),
+            },
+            "input_path": None,
+            "workspace_dir": None,
+            "restart_from": None,
+            "error": None,
+            "cancel_requested": False,
+            "termination": None,
+            "partial_progress": None,
+        }
+        self.store.create(job)
+        return job
+
+    def submit(
+        self,
+        input_file: UploadFile,
+        fmax: float,
+        method: str,
+        prerelax: bool = False,
+        response_mode: str = dftb_service.RESPONSE_INLINE,
+        wall_time_limit_s: Optional[float] = None,
+        cpu_time_limit_s: Optional[float] = None,
+        primitive_cell: bool = False,
+        remove_solvent: bool = False,
+        tenant: Optional[str] = None,
+        priority: str = PRIORITY_NORMAL,
+        estimate: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Queues an optimization of the uploaded structure for `tenant` in the `priority`
+        class; `estimate` (see dftb_service.run_estimate) places it in the queue.
+        """
+        job = self._new_job(
+            input_file.filename, fmax, method, prerelax, response_mode, wall_time_limit_s, cpu_time_limit_s,
+            primitive_cell, remove_solvent, tenant, priority, estimate
+        )
+        job_id = job["job_id"]
+        set_request_id(job_id)
+        input_path = dftb_service.save_uploaded_file(
+            input_file, os.path.join(self.store.job_dir(job_id), "input")
+        )
+        job = self.store.update(job_id, input_path=input_path)
+        self._enqueue(job_id)
+        console.info("Queued job %s (%s, %s, fmax=%s)", job_id, input_file.filename, method, fmax)
+        return job
+
+    def submit_continuation(
+        self,
+        restart_from: str,
+        fmax: float,
+        method: str,
+        response_mode: str = dftb_service.RESPONSE_INLINE,
+        wall_time_limit_s: Optional[float] = None,
+        cpu_time_limit_s: Optional[float] = None,
+        tenant: Optional[str] = None,
+        priority: str = PRIORITY_NORMAL,
+        estimate: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Queues a job that continues a stored run from its final geometry and charges."""
+        job = self._new_job(
+            None, fmax, method, response_mode=response_mode,
+            wall_time_limit_s=wall_time_limit_s, cpu_time_limit_s=cpu_time_limit_s,
+            tenant=tenant, priority=priority, estimate=estimate
+        )
+        set_request_id(job["job_id"])
+        job = self.store.update(job["job_id"], restart_from=restart_from)
+        self._enqueue(job["job_id"])
+        console.info("Queued job %s continuing run %s (%s, fmax=%s)", job["job_id"], restart_from, method, fmax)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.store.load(job_id)
+        if job is not None and job["status"] == JOB_QUEUED:
+            job["queue_position"] = self.queue_position(job_id)
+        return job
+
+    def get_result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.load_result(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cancels a queued or running job. A queued job is cancelled right away; a running
+        one is stopped by its worker, which records how far it got. Finished jobs are
+        left as they are.
+
+        Returns:
+            The job record, or None for an unknown job.
+        """
+        job = self.store.load(job_id)
+        if job is None or job["status"] not in ACTIVE_STATES:
+            return job
+        # The flag also reaches a job that is being claimed, or running in another process.
+        job = self.store.update(job_id, cancel_requested=True)
+        if job["status"] == JOB_QUEUED:
+            dispatcher = self._dispatchers.get(job_id)
+            if dispatcher is not None and job_id not in self._admitted:
+                dispatcher.cancel()
+            job = self.store.update(
+                job_id, status=JOB_CANCELLED, finished_at=_utcnow(), termination="cancelled"
+            )
+            console.info("Cancelled queued job %s", job_id)
+        elif job_id in self._running:
+            self._running[job_id].cancel()
+            console.info("Cancelling running job %s", job_id)
+        return job
+
+    async def _watch_cancel_request(self, job_id: str, task: asyncio.Task):
+        while not task.done():
+            await asyncio.sleep(CANCEL_POLL_SECONDS)
+            job = self.store.load(job_id)
+            if job is not None and job.get("cancel_requested"):
+                task.cancel()
+                return
+
+    async def _dispatch(self, job_id: str):
+        """Waits for the job's turn, then runs it (unless it was cancelled or claimed meanwhile)."""
+        token = set_request_id(job_id)
+        try:
+            job = self.store.load(job_id) or {}
+            ticket = job.get("scheduling") or {}
+            with scheduling(ticket.get("tenant"), ticket.get("priority", PRIORITY_NORMAL)):
+                async with self.scheduler.slot(ticket.get("n_atoms", 0), ticket.get("expected_s", 0.0), key=job_id):
+                    self._admitted.add(job_id)
+                    if not self.store.try_claim(job_id):
+                        return
+                    try:
+                        await self._run_job(job_id)
+                    finally:
+                        self.store.release_claim(job_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            console.exception("Job dispatcher crashed while handling job %s", job_id)
+        finally:
+            request_id_var.reset(token)
+            self._admitted.discard(job_id)
+            self._dispatchers.pop(job_id, None)
+
+    async def _run_job(self, job_id: str):
+        job = self.store.load(job_id)
+        if job is None or job["status"] not in ACTIVE_STATES:
+            return
+        if job.get("cancel_requested"):
+            self.store.update(job_id, status=JOB_CANCELLED, finished_at=_utcnow(), termination="cancelled")
+            return
+
+        params = job["input_parameters"]
+        try:
+            workspace_dir = await workspace_manager.acquire_async()
+        except WorkspaceQuotaExceeded as e:
+            console.error("Job %s failed: %s", job_id, e)
+            self.store.update(job_id, status=JOB_FAILED, finished_at=_utcnow(), error=str(e))
+            return
+
+        # Logs of an earlier, interrupted attempt would be replayed as this run's progress
+        self.store.keep_stdout_logs(job_id, None)
+        started_at = _utcnow()
+        if job["status"] == JOB_QUEUED:
+            waited = datetime.fromisoformat(started_at) - datetime.fromisoformat(job["created_at"])
+            metrics.JOB_QUEUE_WAIT.observe(max(0.0, waited.total_seconds()))
+        self.store.update(
+            job_id, status=JOB_RUNNING, started_at=started_at, error=None, workspace_dir=workspace_dir
+        )
+        console.info("Starting job %s", job_id)
+
+        def on_stage(stage: str):
+            self.store.update(job_id, stage=stage)
+
+        if job.get("restart_from"):
+            optimization = dftb_service.continue_optimization(
+                job["restart_from"], params["fmax_eV_A"], params["method"], workspace_dir,
+                on_stage=on_stage, run_id=job_id
+            )
+        else:
+            cif_content = await run_in_threadpool(_read_bytes, job["input_path"])
+            optimization = dftb_service.optimize_structure(
+                cif_content, params["fmax_eV_A"], params["method"], workspace_dir,
+                on_stage=on_stage, run_id=job_id, prerelax=params.get("prerelax", False),
+                primitive_cell=params.get("primitive_cell", False),
+                remove_solvent=params.get("remove_solvent", False)
+            )
+        # A task of its own, so that cancel() stops this job but not the worker running it.
+        task = asyncio.create_task(enforce_limits(
+            optimization, params.get("wall_time_limit_s"), params.get("cpu_time_limit_s")
+        ))
+        self._running[job_id] = task
+        watcher = asyncio.create_task(self._watch_cancel_request(job_id, task))
+
+        try:
+            parsed_data, output_cif, run_info = await task
+            payload = await run_in_threadpool(
+                dftb_service.build_response_payload,
+                request_id=job_id,
+                original_filename=params["original_filename"],
+                method=params["method"],
+                fmax=params["fmax_eV_A"],
+                parsed_data=parsed_data,
+                output_cif=output_cif,
+                run_info=run_info,
+                prerelax=params.get("prerelax", False),
+                response_mode=params.get("response_mode", dftb_service.RESPONSE_INLINE),
+            )
+            await run_in_threadpool(self.store.save_result, job_id, payload)
+            self.store.update(job_id, status=JOB_SUCCEEDED, stage=None, finished_at=_utcnow())
+            console.success("Job %s finished successfully.", job_id)
+        except asyncio.CancelledError:
+            current = asyncio.current_task()
+            if not task.cancelled() or (current is not None and current.cancelling()):
+                raise  # the worker itself is shutting down; the job is resumed on restart
+            console.warning("Job %s was cancelled.", job_id)
+            self.store.update(
+                job_id, status=JOB_CANCELLED, stage=None, finished_at=_utcnow(), termination="cancelled",
+                partial_progress=dftb_service.partial_progress(workspace_dir),
+            )
+        except RunLimitExceeded as e:
+            console.error("Job %s stopped: %s", job_id, e)
+            self.store.update(
+                job_id, status=JOB_FAILED, finished_at=_utcnow(), error=str(e), termination=f"{e.limit}_limit",
+                partial_progress=dftb_service.partial_progress(workspace_dir),
+            )
+        except Exception as e:
+            console.error("Job %s failed: %s", job_id, e)
+            self.store.update(job_id, status=JOB_FAILED, finished_at=_utcnow(), error=str(e))
+        finally:
+            watcher.cancel()
+            self._running.pop(job_id, None)
+            # Keep the logs and detach the workspace from the job before the slot is reused.
+            self.store.keep_stdout_logs(job_id, workspace_dir)
+            job = self.store.update(job_id, workspace_dir=None)
+            workspace_manager.release(workspace_dir, job_id, failed=job["status"] == JOB_FAILED)
+
+
+job_manager = JobManager(JobStore(config.JOBS_BASE), config.JOB_WORKERS)
+
+metrics.registry.gauge(
+    "dftbopt_jobs_queued", "Asynchronous jobs waiting for a worker.", callback=lambda: job_manager.queued_count
+)
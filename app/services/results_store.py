@@ -0,0 +1,376 @@
+# app/services/results_store.py
+# Indexed SQLite store of finished optimizations, queried without re-running DFTB+.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import os
+import json
+import time
+import base64
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core import config
+from app.utils.logger import console
+
+SCHEMA_VERSION = 1
+
+# Columns returned by queries unless more is asked for; the JSON documents and the
+# optimized structure are only read when included.
+SUMMARY_COLUMNS = (
+    "id", "request_id", "created_at", "original_filename", "formula", "n_atoms", "fingerprint",
+    "method", "fmax_eV_A", "prerelax", "calculation_status", "convergence_status", "scc_converged",
+    "total_energy_eV", "total_mermin_free_energy_eV", "force_related_energy_eV", "band_energy_eV",
+    "fermi_level_eV", "wall_time_s", "queue_wait_s", "cpu_time_s", "max_rss_mb", "geometry_steps",
+)
+# Optional parts of a row -> column
+INCLUDES = {
+    "detailed_results": "detailed_results",
+    "run_info": "run_info",
+    "structure": "optimized_cif",
+}
+# Orderings supported by the keyset pagination; energies skip rows without that energy.
+ORDER_COLUMNS = (
+    "id", "total_energy_eV", "total_mermin_free_energy_eV", "force_related_energy_eV", "band_energy_eV",
+    "wall_time_s",
+)
+# Energy columns that can be filtered by range (min_<column>, max_<column>)
+ENERGY_COLUMNS = ORDER_COLUMNS[1:5]
+
+_CREATE = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    request_id TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL,
+    original_filename TEXT,
+    formula TEXT,
+    n_atoms INTEGER,
+    fingerprint TEXT,
+    method TEXT NOT NULL,
+    fmax_eV_A REAL,
+    prerelax INTEGER,
+    calculation_status TEXT,
+    convergence_status TEXT,
+    scc_converged INTEGER,
+    total_energy_eV REAL,
+    total_mermin_free_energy_eV REAL,
+    force_related_energy_eV REAL,
+    band_energy_eV REAL,
+    fermi_level_eV REAL,
+    wall_time_s REAL,
+    queue_wait_s REAL,
+    cpu_time_s REAL,
+    max_rss_mb REAL,
+    geometry_steps INTEGER,
+    input_parameters TEXT,
+    detailed_results TEXT,
+    run_info TEXT,
+    optimized_cif TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_results_formula ON results (formula, method);
+CREATE INDEX IF NOT EXISTS idx_results_fingerprint ON results (fingerprint, method);
+CREATE INDEX IF NOT EXISTS idx_results_method ON results (method, id);
+CREATE INDEX IF NOT EXISTS idx_results_convergence ON results (convergence_status, total_energy_eV, id);
+CREATE INDEX IF NOT EXISTS idx_results_total_energy ON results (total_energy_eV, id);
+CREATE INDEX IF NOT EXISTS idx_results_mermin_energy ON results (total_mermin_free_energy_eV, id);
+CREATE INDEX IF NOT EXISTS idx_results_force_energy ON results (force_related_energy_eV, id);
+CREATE INDEX IF NOT EXISTS idx_results_band_energy ON results (band_energy_eV, id);
+CREATE INDEX IF NOT EXISTS idx_results_wall_time ON results (wall_time_s, id);
+"""
+
+
+class InvalidQuery(ValueError):
+    """A filter, ordering or cursor of a results query is malformed."""
+
+
+def encode_cursor(order_by: str, value: Any, row_id: int) -> str:
+    """Opaque token of the last row of a page: the ordering, its value and the row id."""
+    raw = json.dumps([order_by, value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order_by: str) -> Tuple[Any, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_order, value, row_id = json.loads(raw)
+    except Exception:
+        raise InvalidQuery("Invalid cursor.") from None
+    if cursor_order != order_by:
+        raise InvalidQuery(f"The cursor belongs to a query ordered by '{cursor_order}'.")
+    return value, int(row_id)
+
+
+def _row_values(payload: Dict[str, Any], cif_content: Optional[bytes]) -> Dict[str, Any]:
+    """Flattens a response payload (see dftb_service.build_response_payload) into a row."""
+    parameters = payload.get("input_parameters", {})
+    results = payload.get("detailed_results", {})
+    run_info = payload.get("run_info") or {}
+    summary = results.get("summary", {})
+    energies = results.get("energies_eV", {})
+    structure = run_info.get("structure") or {}
+    execution = run_info.get("execution") or {}
+    stages = run_info.get("stages") or []
+
+    # Timings cover every DFTB+ stage of the run, not just the final one
+    def total(key):
+        values = [stage[key] for stage in stages if stage.get(key) is not None]
+        return round(sum(values), 3) if values else None
+
+    return {
+        "request_id": payload["request_id"],
+        "created_at": time.time(),
+        "original_filename": parameters.get("original_filename"),
+        "formula": structure.get("formula"),
+        "n_atoms": execution.get("n_atoms", structure.get("n_atoms")),
+        "fingerprint": structure.get("fingerprint"),
+        "method": parameters.get("method"),
+        "fmax_eV_A": parameters.get("fmax_eV_A"),
+        "prerelax": int(bool(parameters.get("prerelax"))),
+        "calculation_status": summary.get("calculation_status"),
+        "convergence_status": summary.get("convergence_status"),
+        "scc_converged": int(bool(results.get("convergence_info", {}).get("scc_converged"))),
+        "total_energy_eV": energies.get("total_energy"),
+        "total_mermin_free_energy_eV": energies.get("total_mermin_free_energy"),
+        "force_related_energy_eV": energies.get("force_related_energy"),
+        "band_energy_eV": energies.get("band_energy"),
+        "fermi_level_eV": results.get("electronic_properties", {}).get("fermi_level_eV"),
+        "wall_time_s": total("wall_time_s"),
+        "queue_wait_s": execution.get("queue_wait_s"),
+        "cpu_time_s": execution.get("cpu_time_s"),
+        "max_rss_mb": execution.get("max_rss_mb"),
+        "geometry_steps": total("geometry_steps"),
+        "input_parameters": json.dumps(parameters),
+        "detailed_results": json.dumps(results),
+        "run_info": json.dumps(run_info),
+        "optimized_cif": cif_content.decode("utf-8", errors="replace") if cif_content is not None else None,
+    }
+
+
+def _row_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    record = {}
+    for key in row.keys():
+        value = row[key]
+        if key in ("detailed_results", "run_info", "input_parameters") and value is not None:
+            value = json.loads(value)
+        elif key in ("prerelax", "scc_converged") and value is not None:
+            value = bool(value)
+        elif key == "optimized_cif":
+            key = "optimized_structure_cif"
+        record[key] = value
+    return record
+
+
+class ResultsStore:
+    """
+    Keeps every finished optimization in an SQLite database: input parameters, the parsed
+    detailed.out results, the structure formula and fingerprint, timings and the optimized
+    CIF. Formula, fingerprint, method, energies and convergence status are indexed, so
+    lookups and dashboards do not have to re-run or re-parse anything.
+
+    Writes go through one connection under a lock; every query opens its own read-only
+    connection, which in WAL mode is not blocked by writers.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.db_path)
+
+    def _writer(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_CREATE)
+            connection.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def record(self, payload: Dict[str, Any], cif_content: Optional[bytes] = None) -> Optional[int]:
+        """
+        Stores a finished optimization (a payload of dftb_service.build_response_payload).
+        A request id stored before is overwritten. Returns the row id, or None if the
+        store is disabled or the write failed; a failure here never fails the optimization.
+        """
+        if not self.enabled:
+            return None
+        try:
+            values = _row_values(payload, cif_content)
+            columns = ", ".join(values)
+            placeholders = ", ".join(f":{name}" for name in values)
+            with self._lock:
+                connection = self._writer()
+                with connection:
+                    cursor = connection.execute(
+                        f"INSERT OR REPLACE INTO results ({columns}) VALUES ({placeholders})", values
+                    )
+                return cursor.lastrowid
+        except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+            console.warning("Could not record result %s: %s", payload.get("request_id"), e)
+            return None
+
+    def _reader(self) -> Optional[sqlite3.Connection]:
+        if not self.enabled or not os.path.exists(self.db_path):
+            return None
+        # Rows are fetched from worker threads one page chunk at a time, never concurrently.
+        connection = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def get(self, request_id: str, include: Tuple[str, ...] = tuple(INCLUDES)) -> Optional[Dict[str, Any]]:
+        """One stored result with the given optional parts, or None."""
+        connection = self._reader()
+        if connection is None:
+            return None
+        try:
+            columns = list(SUMMARY_COLUMNS) + ["input_parameters"] + [INCLUDES[name] for name in include]
+            row = connection.execute(
+                f"SELECT {', '.join(columns)} FROM results WHERE request_id = ?", (request_id,)
+            ).fetchone()
+        finally:
+            connection.close()
+        return _row_dict(row) if row is not None else None
+
+    def structure(self, request_id: str) -> Optional[bytes]:
+        """The stored optimized CIF of a result, or None."""
+        connection = self._reader()
+        if connection is None:
+            return None
+        try:
+            row = connection.execute(
+                "SELECT optimized_cif FROM results WHERE request_id = ?", (request_id,)
+            ).fetchone()
+        finally:
+            connection.close()
+        if row is None or row["optimized_cif"] is None:
+            return None
+        return row["optimized_cif"].encode("utf-8")
+
+    def query(
+        self,
+        filters: Dict[str, Any],
+        order_by: str = "id",
+        descending: bool = False,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        include: Tuple[str, ...] = (),
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Returns an iterator over the rows of one page in order, followed by a final
+        {"next_cursor": ...} item (None on the last page). The arguments are checked
+        right away; rows are only read as the iterator is consumed. Pagination is keyset-based on (order_by, id), so pages
+        stay cheap however deep they are and rows added meanwhile do not shift them.
+
+        Supported filters: formula, method, fingerprint, convergence_status,
+        calculation_status, scc_converged, min_/max_ of the energies and created_after /
+        created_before (Unix time). None values are ignored.
+
+        Raises:
+            InvalidQuery: On an unknown ordering or include, or a foreign cursor.
+        """
+        if order_by not in ORDER_COLUMNS:
+            raise InvalidQuery(f"Invalid order_by '{order_by}'. Choose one of {list(ORDER_COLUMNS)}.")
+        unknown = set(include) - set(INCLUDES)
+        if unknown:
+            raise InvalidQuery(f"Unknown include(s) {sorted(unknown)}. Choose from {list(INCLUDES)}.")
+
+        clauses, arguments = self._where(filters)
+        if order_by != "id":
+            clauses.append(f"{order_by} IS NOT NULL")
+        if cursor is not None:
+            value, row_id = decode_cursor(cursor, order_by)
+            comparison = "<" if descending else ">"
+            if order_by == "id":
+                clauses.append(f"id {comparison} ?")
+                arguments.append(row_id)
+            else:
+                clauses.append(f"({order_by} {comparison} ? OR ({order_by} = ? AND id {comparison} ?))")
+                arguments.extend([value, value, row_id])
+
+        direction = "DESC" if descending else "ASC"
+        ordering = f"id {direction}" if order_by == "id" else f"{order_by} {direction}, id {direction}"
+        columns = list(SUMMARY_COLUMNS) + [INCLUDES[name] for name in include]
+        sql = f"SELECT {', '.join(columns)} FROM results"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {ordering} LIMIT ?"
+        arguments.append(limit)
+        return self._page(sql, arguments, order_by, limit)
+
+    def _page(self, sql: str, arguments: List[Any], order_by: str, limit: int) -> Iterator[Dict[str, Any]]:
+        connection = self._reader()
+        if connection is None:
+            yield {"next_cursor": None}
+            return
+        try:
+            count, last = 0, None
+            for row in connection.execute(sql, arguments):
+                count += 1
+                last = row
+                yield _row_dict(row)
+        finally:
+            connection.close()
+        next_cursor = None
+        if count == limit and last is not None:
+            next_cursor = encode_cursor(order_by, last[order_by], last["id"])
+        yield {"next_cursor": next_cursor}
+
+    @staticmethod
+    def _where(filters: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+        clauses, arguments = [], []
+        for name in ("formula", "method", "fingerprint", "convergence_status", "calculation_status"):
+            if filters.get(name) is not None:
+                clauses.append(f"{name} = ?")
+                arguments.append(filters[name])
+        if filters.get("scc_converged") is not None:
+            clauses.append("scc_converged = ?")
+            arguments.append(int(filters["scc_converged"]))
+        for column in ENERGY_COLUMNS:
+            for bound, operator in (("min", ">="), ("max", "<=")):
+                value = filters.get(f"{bound}_{column}")
+                if value is not None:
+                    clauses.append(f"{column} {operator} ?")
+                    arguments.append(value)
+        for name, operator in (("created_after", ">="), ("created_before", "<")):
+            if filters.get(name) is not None:
+                clauses.append(f"created_at {operator} ?")
+                arguments.append(filters[name])
+        return clauses, arguments
+
+    def stats(self) -> Dict[str, Any]:
+        """Number of stored results per method and convergence status."""
+        connection = self._reader()
+        if connection is None:
+            return {"enabled": self.enabled, "results": 0, "by_method": {}, "by_convergence_status": {}}
+        try:
+            by_method = dict(connection.execute("SELECT method, COUNT(*) FROM results GROUP BY method").fetchall())
+            by_status = dict(connection.execute(
+                "SELECT convergence_status, COUNT(*) FROM results GROUP BY convergence_status"
+            ).fetchall())
+        finally:
+            connection.close()
+        return {
+            "enabled": True,
+            "results": sum(by_method.values()),
+            "by_method": by_method,
+            "by_convergence_status": by_status,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+results_store = ResultsStore(config.RESULTS_DB_PATH)
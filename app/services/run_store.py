@@ -0,0 +1,133 @@
+# app/services/run_store.py
+# Keeps the restart files (final geometry, SCC charges) and downloadable artifacts of finished runs.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import os
+import json
+import time
+import shutil
+from typing import Any, Dict, List, Optional
+
+from app.core import config
+from app.utils.logger import console
+
+METADATA_FILE = "run.json"
+RESTART_GEOMETRY = "geo_end.gen"
+RESTART_CHARGES = "charges.bin"
+STRUCTURE_FILE = "optimized.cif"
+TRAJECTORY_FILE = "geo_end.xyz"
+TRAJECTORY_DIR = "trajectory"
+
+# Artifact kind -> (file name, media type)
+ARTIFACTS = {
+    "cif": (STRUCTURE_FILE, "chemical/x-cif"),
+    "gen": (RESTART_GEOMETRY, "text/plain"),
+    "trajectory": (TRAJECTORY_FILE, "chemical/x-xyz"),
+}
+
+
+class RunStore:
+    """
+    Persists the files needed to continue an optimization after its workspace is removed.
+
+    Layout: <base_dir>/<run_id>/run.json, geo_end.gen, charges.bin, and for download
+    optimized.cif and geo_end.xyz (all geometries of the optimization), and the parsed
+    trajectory arrays in trajectory/.
+    Entries older than `max_age_hours` are pruned whenever a new run is saved.
+    """
+
+    def __init__(self, base_dir: str, max_age_hours: int):
+        self.base_dir = base_dir
+        self.max_age_hours = max_age_hours
+
+    def run_dir(self, run_id: str) -> str:
+        return os.path.join(self.base_dir, os.path.basename(run_id))
+
+    def save(self, run_id: str, workspace_dir: str, metadata: Dict[str, Any]) -> bool:
+        """
+        Copies the restart files of a finished run out of its workspace.
+
+        Returns:
+            bool: True if a restart geometry was available and has been stored.
+        """
+        geometry = os.path.join(workspace_dir, RESTART_GEOMETRY)
+        if not os.path.exists(geometry):
+            return False
+
+        run_dir = self.run_dir(run_id)
+        os.makedirs(run_dir, exist_ok=True)
+        shutil.copyfile(geometry, os.path.join(run_dir, RESTART_GEOMETRY))
+
+        charges = os.path.join(workspace_dir, RESTART_CHARGES)
+        has_charges = os.path.exists(charges)
+        if has_charges:
+            shutil.copyfile(charges, os.path.join(run_dir, RESTART_CHARGES))
+
+        trajectory = os.path.join(workspace_dir, TRAJECTORY_FILE)
+        if os.path.exists(trajectory):
+            shutil.copyfile(trajectory, os.path.join(run_dir, TRAJECTORY_FILE))
+
+        metadata = {**metadata, "run_id": run_id, "has_charges": has_charges, "saved_at": time.time()}
+        with open(os.path.join(run_dir, METADATA_FILE), "w") as f:
+            json.dump(metadata, f)
+
+        self.prune()
+        return True
+
+    def load(self, run_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.run_dir(run_id), METADATA_FILE), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def restart_files(self, run_id: str) -> Dict[str, Optional[str]]:
+        """Paths of the stored geometry and charges (None for files that were not kept)."""
+        run_dir = self.run_dir(run_id)
+        paths = {}
+        for key, name in (("geometry", RESTART_GEOMETRY), ("charges", RESTART_CHARGES)):
+            path = os.path.join(run_dir, name)
+            paths[key] = path if os.path.exists(path) else None
+        return paths
+
+    def save_structure(self, run_id: str, cif_content: bytes):
+        """Stores the optimized CIF so it can be downloaded instead of inlined in the response."""
+        run_dir = self.run_dir(run_id)
+        os.makedirs(run_dir, exist_ok=True)
+        path = os.path.join(run_dir, STRUCTURE_FILE)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            f.write(cif_content)
+        os.replace(tmp_path, path)
+
+    def artifact_path(self, run_id: str, kind: str) -> Optional[str]:
+        """Path of a stored artifact ('cif', 'gen' or 'trajectory'), or None."""
+        if kind not in ARTIFACTS:
+            return None
+        path = os.path.join(self.run_dir(run_id), ARTIFACTS[kind][0])
+        return path if os.path.exists(path) else None
+
+    def trajectory_dir(self, run_id: str) -> str:
+        return os.path.join(self.run_dir(run_id), TRAJECTORY_DIR)
+
+    def available_artifacts(self, run_id: str) -> List[str]:
+        return [kind for kind in ARTIFACTS if self.artifact_path(run_id, kind)]
+
+    def prune(self):
+        if self.max_age_hours <= 0 or not os.path.isdir(self.base_dir):
+            return
+        cutoff = time.time() - self.max_age_hours * 3600
+        for name in os.listdir(self.base_dir):
+            path = os.path.join(self.base_dir, name)
+            try:
+                expired = os.path.getmtime(path) < cutoff
+            except OSError:
+                continue
+            if expired:
+                shutil.rmtree(path, ignore_errors=True)
+                console.info("Pruned stored run %s", name)
+
+
+run_store = RunStore(config.RUNS_BASE, config.RUNS_MAX_AGE_HOURS)
@@ -0,0 +1,97 @@
+# app/services/single_point_service.py
+# Energies and forces of many structures on warm, socket-driven DFTB+ processes.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from ase import Atoms
+
+from app.core.preprocessing import StructureRejected, validate_structure
+from app.core.socket_driver import socket_pool
+from app.utils.file_convertor import read_cif_frames
+from app.utils.logger import console
+
+
+def read_frames(files: List[Tuple[str, bytes]], method: str) -> List[Tuple[str, int, Atoms]]:
+    """
+    Parses every data block of every CIF and runs the structure checks of
+    preprocessing.validate_structure on it. Frames are computed exactly as given:
+    nothing is merged or removed, so forces line up with the input atoms.
+
+    Returns:
+        (filename, frame index within the file, structure) per frame.
+
+    Raises:
+        StructureRejected: If a file cannot be read or a frame is unusable; the message
+            names the file and frame.
+    """
+    frames = []
+    for filename, content in files:
+        try:
+            structures = read_cif_frames(content)
+        except Exception as e:
+            raise StructureRejected(
+                f"{filename}: the structure file could not be read: {str(e) or type(e).__name__}", "unreadable"
+            ) from None
+        if not structures:
+            raise StructureRejected(f"{filename}: the file contains no structures.", "empty")
+        for index, atoms in enumerate(structures):
+            if len(atoms) == 0:
+                raise StructureRejected(f"{filename}, frame {index}: the structure contains no atoms.", "empty")
+            try:
+                validate_structure(atoms, method)
+            except StructureRejected as e:
+                raise StructureRejected(f"{filename}, frame {index}: {e}", e.reason, e.details) from None
+            frames.append((filename, index, atoms))
+    return frames
+
+
+async def compute_single_points(
+    request_id: str,
+    frames: List[Tuple[str, int, Atoms]],
+    method: str,
+    include_forces: bool = True,
+) -> Dict[str, Any]:
+    """
+    Computes energy, forces and stress of every frame on the warm DFTB+ process pool
+    (see socket_driver.SocketPool) and builds the response payload.
+    """
+    started = time.perf_counter()
+    records = await socket_pool.evaluate([atoms for _, _, atoms in frames], method)
+    wall_time = time.perf_counter() - started
+
+    results = []
+    for index, ((filename, frame, atoms), record) in enumerate(zip(frames, records)):
+        forces = np.asarray(record["forces_eV_A"])
+        stress = record["stress_eV_A3"]
+        results.append({
+            "index": index,
+            "filename": filename,
+            "frame": frame,
+            "formula": atoms.get_chemical_formula(),
+            "n_atoms": len(atoms),
+            "energy_eV": record["energy_eV"],
+            "max_force_eV_A": float(np.linalg.norm(forces, axis=1).max()),
+            "forces_eV_A": forces.tolist() if include_forces else None,
+            "stress_eV_A3": stress.tolist() if stress is not None else None,
+            "warm_process": record["warm_process"],
+            "scc_warm_start": record["scc_warm_start"],
+            "wall_time_s": record["wall_time_s"],
+        })
+    warm = sum(result["warm_process"] for result in results)
+    console.success(
+        "Computed %d single point(s) in %.2f s (%d on warm processes).", len(results), wall_time, warm
+    )
+    return {
+        "status": "success",
+        "request_id": request_id,
+        "method": method,
+        "n_structures": len(results),
+        "wall_time_s": round(wall_time, 3),
+        "results": results,
+        "pool": socket_pool.stats(),
+    }
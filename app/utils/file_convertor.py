@@ -4,33 +4,155 @@
 # Version: 0.1.0
 
 
+import io
 import os
-from ase.io import read, write
+from typing import List, Union
+
+import numpy as np
+from ase import Atoms
 from app.utils.logger import console
 
+# ase.io is imported where it is used: loading it (and its format plugins) costs more
+# than the rest of the service put together, and the start-up warm-up loads it anyway.
+
+StructureInput = Union[bytes, Atoms]
+
+
+def read_cif_bytes(data: bytes) -> Atoms:
+    """
+    Parses a CIF document held in memory.
+    """
+    from ase.io import read
+
+    return read(io.BytesIO(data), format='cif')
+
+
+def read_cif_frames(data: bytes) -> List[Atoms]:
+    """
+    Parses every data block of a CIF document held in memory, e.g. the frames of a scan.
+    """
+    from ase.io import read
+
+    return read(io.BytesIO(data), format='cif', index=':')
+
+
+def atoms_to_cif_bytes(atoms: Atoms) -> bytes:
+    """
+    Serializes a structure to CIF without touching the filesystem.
+    """
+    from ase.io import write
+
+    buffer = io.BytesIO()
+    write(buffer, atoms, format='cif')
+    return buffer.getvalue()
+
+
+def as_atoms(structure: StructureInput) -> Atoms:
+    """
+    Accepts either raw CIF bytes or an already parsed structure.
+    """
+    if isinstance(structure, Atoms):
+        return structure
+    return read_cif_bytes(structure)
+
+
+def _format_rows(prefix: List[str], values: np.ndarray) -> List[str]:
+    return [
+        f"{head} {x:22.15f} {y:22.15f} {z:22.15f}"
+        for head, (x, y, z) in zip(prefix, values.tolist())
+    ]
+
+
+def atoms_to_gen(atoms: Atoms) -> str:
+    """
+    Writes a structure in DFTB+ GEN format.
+
+    Periodic structures are written as supercells ("S") with Cartesian coordinates,
+    everything else as clusters ("C"), matching what ase.io.write(format='gen') produces.
+    """
+    symbols = atoms.get_chemical_symbols()
+    species = list(dict.fromkeys(symbols))
+    species_index = {symbol: i + 1 for i, symbol in enumerate(species)}
+    periodic = bool(atoms.pbc.any())
+
+    lines = [f"{len(atoms)} {'S' if periodic else 'C'}", " ".join(species)]
+    prefix = [f"{i + 1:6d} {species_index[symbol]}" for i, symbol in enumerate(symbols)]
+    lines.extend(_format_rows(prefix, atoms.get_positions()))
+    if periodic:
+        lines.extend(_format_rows([""] * 4, np.vstack([np.zeros(3), atoms.get_cell().array])))
+    return "\n".join(lines) + "\n"
+
+
+def gen_to_atoms(text: str) -> Atoms:
+    """
+    Reads a DFTB+ GEN document (cluster "C", supercell "S" or fractional "F").
+    """
+    lines = []
+    for raw in text.splitlines():
+        line = raw.split('#', 1)[0].strip()
+        if line:
+            lines.append(line)
+    if len(lines) < 2:
+        raise ValueError("GEN data is too short.")
+
+    header = lines[0].split()
+    n_atoms, geometry_type = int(header[0]), header[1].upper()
+    if geometry_type not in ("C", "S", "F"):
+        raise ValueError(f"Unsupported GEN geometry type '{geometry_type}'.")
+    species = lines[1].split()
+
+    atom_rows = [line.split() for line in lines[2:2 + n_atoms]]
+    if len(atom_rows) != n_atoms:
+        raise ValueError(f"GEN data declares {n_atoms} atoms but lists {len(atom_rows)}.")
+    symbols = [species[int(row[1]) - 1] for row in atom_rows]
+    coordinates = np.array([row[2:5] for row in atom_rows], dtype=float)
+
+    if geometry_type == "C":
+        return Atoms(symbols=symbols, positions=coordinates, pbc=False)
+
+    cell_rows = [line.split()[:3] for line in lines[3 + n_atoms:6 + n_atoms]]
+    if len(cell_rows) != 3:
+        raise ValueError("GEN data is missing lattice vectors.")
+    cell = np.array(cell_rows, dtype=float)
+    if geometry_type == "F":
+        return Atoms(symbols=symbols, scaled_positions=coordinates, cell=cell, pbc=True)
+    return Atoms(symbols=symbols, positions=coordinates, cell=cell, pbc=True)
+
+
+def read_gen_file(path: str) -> Atoms:
+    with open(path, "r") as f:
+        return gen_to_atoms(f.read())
+
+
+def write_gen_file(atoms: Atoms, path: str):
+    with open(path, "w") as f:
+        f.write(atoms_to_gen(atoms))
+
+
 def convert_structure_file(input_file):
-    
+    from ase.io import read, write
+
     # Check if the input file exists
-    console.info(f"Starting conversion for {input_file}...")
+    console.info("Starting conversion for %s...", input_file)
     ext = os.path.splitext(input_file)[1].lower()
 
     if ext == ".cif":
-        console.info(f"Converting {input_file} to GEN format...")
+        console.info("Converting %s to GEN format...", input_file)
         output_file = os.path.splitext(input_file)[0] + ".gen"
         atoms = read(input_file)
-        write(output_file, atoms, format='gen')
-        console.success(f"{input_file} transformed to {output_file} successfully!")
+        write_gen_file(atoms, output_file)
+        console.success("%s transformed to %s successfully!", input_file, output_file)
 
     elif ext == ".gen":
-        console.info(f"Converting {input_file} to CIF format...")
+        console.info("Converting %s to CIF format...", input_file)
         output_file = os.path.splitext(input_file)[0] + ".cif"
-        atoms = read(input_file)
+        atoms = read_gen_file(input_file)
         write(output_file, atoms, format='cif')
-        console.success(f"{input_file} transformed to {output_file} successfully!")
-        
+        console.success("%s transformed to %s successfully!", input_file, output_file)
+
 
     else:
-        console.error(f"Unsupported file format: {ext}. Please provide a .cif or .gen file.")
+        console.error("Unsupported file format: %s. Please provide a .cif or .gen file.", ext)
 
 
 def cif_to_gen(input_file):
@@ -43,4 +165,4 @@ def gen_to_cif(input_file):
     """
     Convert a GEN file to CIF format.
     """
-    convert_structure_file(input_file)
\ No newline at end of file
+    convert_structure_file(input_file)
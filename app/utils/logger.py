@@ -3,13 +3,17 @@
 # date: 2025-06-21
 # Version 0.1.0
 
+import os
+import sys
+import json
+import queue
+import atexit
 import logging
-from rich.console import Console
-from rich.logging import RichHandler
-from rich.panel import Panel
-from rich.progress import track as rich_track
-from rich.table import Table
-from rich.theme import Theme
+import threading
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
 
 # Define a custom logging level for success messages
 SUCCESS_LEVEL_NUM = 25
@@ -30,26 +34,130 @@ if not hasattr(logging.Logger, 'success'):
     setattr(logging.Logger, 'success', success_log)
 
 
+# "rich" renders colourful output for development; "json" writes one JSON object per
+# line from a background thread and is meant for production.
+LOG_FORMAT = os.environ.get("DFTBOPT_LOG_FORMAT", "rich").strip().lower()
+LOG_LEVEL = os.environ.get("DFTBOPT_LOG_LEVEL", "INFO").strip().upper()
+
+# Id of the request or job a log record belongs to; set per task by the API layer.
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+
+def set_request_id(request_id: Optional[str]) -> contextvars.Token:
+    """Tags all records logged from the current context (task) with request_id."""
+    return request_id_var.set(request_id)
+
+
+class RequestIdFilter(logging.Filter):
+    """Copies the current request id onto each record while still in the logging context."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread unformatted: %-style arguments are merged and
+    the record serialised there, not on the request path. Records stay in-process, so
+    they need not be made picklable.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _LazyRichHandler(logging.Handler):
+    """
+    Stands in for the RichHandler until the first record is emitted, so that importing
+    the service does not import Rich.
+    """
+
+    def __init__(self, manager: "ConsoleManager"):
+        super().__init__()
+        self._manager = manager
+
+    def emit(self, record: logging.LogRecord):
+        self._manager._rich_handler().emit(record)
+
+
 class ConsoleManager:
     """
     This is a singleton class that manages the console output for the MOF-Advisor API.
-    It uses Rich for beautiful logging and console output.
-    """
+    It uses Rich for beautiful logging and console output in development, and queued
+    JSON lines in production (DFTBOPT_LOG_FORMAT=json).
 
-    def __init__(self):
-        custom_theme = Theme({
-            "logging.level.success": "bold green"
-        })
-        self._console = Console(theme=custom_theme)
+    Messages accept %-style arguments, which are only formatted if the record is emitted.
+    """
 
-        self._logger = self._setup_logger()
+    def __init__(self, log_format: str = LOG_FORMAT, level: str = LOG_LEVEL):
+        self.structured = log_format == "json"
+        self._console = None
+        self._rich: Optional[logging.Handler] = None
+        self._rich_lock = threading.Lock()
+        self._listener: Optional[QueueListener] = None
+        self._logger = self._setup_logger(level)
 
-    def _setup_logger(self) -> logging.Logger:
+    def _setup_logger(self, level: str) -> logging.Logger:
         logger = logging.getLogger("MOF-Advisor-API")
         if logger.hasHandlers():
             return logger
 
-        logger.setLevel(logging.INFO)
+        logger.setLevel(getattr(logging, level, logging.INFO))
+        if self.structured:
+            handler = self._setup_queue()
+        else:
+            handler = _LazyRichHandler(self)
+        handler.addFilter(RequestIdFilter())
+        logger.addHandler(handler)
+        return logger
+
+    def _setup_queue(self) -> logging.Handler:
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter())
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        self._listener = QueueListener(log_queue, output, respect_handler_level=True)
+        self._listener.start()
+        atexit.register(self._listener.stop)
+        return _DeferredQueueHandler(log_queue)
+
+    def _rich_handler(self) -> logging.Handler:
+        with self._rich_lock:
+            if self._rich is None:
+                self._rich = self._setup_rich()
+            return self._rich
+
+    def _rich_console(self):
+        """The Rich console of development output (created on first use), or None for JSON logs."""
+        if self.structured:
+            return None
+        self._rich_handler()
+        return self._console
+
+    def _setup_rich(self) -> logging.Handler:
+        from rich.console import Console
+        from rich.logging import RichHandler
+        from rich.theme import Theme
+
+        custom_theme = Theme({
+            "logging.level.success": "bold green"
+        })
+        self._console = Console(theme=custom_theme)
         handler = RichHandler(
             console=self._console,
             rich_tracebacks=True,
@@ -58,24 +166,33 @@ class ConsoleManager:
             show_path=False
         )
         handler.setFormatter(logging.Formatter(fmt="%(message)s", datefmt="[%X]"))
-        logger.addHandler(handler)
-        return logger
+        return handler
+
+    def _prefixed(self, prefix: str, message: str) -> str:
+        # The level name already carries the prefix in structured records.
+        return message if self.structured else f"{prefix} {message}"
+
+    def is_enabled_for(self, level: int) -> bool:
+        return self._logger.isEnabledFor(level)
 
     # Define logging methods with custom prefixes
-    def info(self, message: str):
-        self._logger.info(message)
+    def debug(self, message: str, *args):
+        self._logger.debug(message, *args)
 
-    def success(self, message: str):
-        self._logger.success(f"[SUCCESS] {message}") # type: ignore
+    def info(self, message: str, *args):
+        self._logger.info(message, *args)
 
-    def warning(self, message: str):
-        self._logger.warning(f"[WARNING] {message}")
+    def success(self, message: str, *args):
+        self._logger.success(self._prefixed("[SUCCESS]", message), *args) # type: ignore
 
-    def error(self, message: str):
-        self._logger.error(f"[ERROR] {message}")
+    def warning(self, message: str, *args):
+        self._logger.warning(self._prefixed("[WARNING]", message), *args)
 
-    def exception(self, message: str):
-        self._logger.exception(f"[EXCEPTION] {message}")
+    def error(self, message: str, *args):
+        self._logger.error(self._prefixed("[ERROR]", message), *args)
+
+    def exception(self, message: str, *args):
+        self._logger.exception(self._prefixed("[EXCEPTION]", message), *args)
 
     # higher-level console methods
     def rule(self, title: str, style: str = "cyan"):
@@ -85,7 +202,11 @@ class ConsoleManager:
             title (str): The title to display in the rule.
             style (str): The style of the title text.
         """
-        self._console.rule(f"[bold {style}]{title}[/bold {style}]", style=style)
+        rich_console = self._rich_console()
+        if rich_console is None:
+            self._logger.info("%s", title)
+            return
+        rich_console.rule(f"[bold {style}]{title}[/bold {style}]", style=style)
 
     def display_data_as_table(self, data: dict, title: str):
         """
@@ -94,6 +215,13 @@ class ConsoleManager:
             data (dict): The data to display in the table.
             title (str): The title of the table.
         """
+        rich_console = self._rich_console()
+        if rich_console is None:
+            self._logger.info("%s: %s", title, json.dumps(data, default=str))
+            return
+        from rich.panel import Panel
+        from rich.table import Table
+
         table = Table(show_header=True, header_style="bold magenta", box=None, show_edge=False)
         table.add_column("Parameter", style="cyan", no_wrap=True, width=20)
         table.add_column("Value", style="white")
@@ -108,7 +236,7 @@ class ConsoleManager:
                 table.add_row(key, str(value))
 
         panel = Panel(table, title=f"[bold green]✓ Extraction Success[/bold green]: {title}", border_style="green")
-        self._console.print(panel)
+        rich_console.print(panel)
 
     def display_error_panel(self, filename: str, error_message: str):
         """
@@ -117,9 +245,15 @@ class ConsoleManager:
             filename (str): The name of the file where the error occurred.
             error_message (str): The error message to display.
         """
+        rich_console = self._rich_console()
+        if rich_console is None:
+            self._logger.error("Processing error in %s: %s", filename, error_message)
+            return
+        from rich.panel import Panel
+
         panel = Panel(f"[bold]File:[/bold] {filename}\n[bold]Error:[/bold] {error_message}",
                       title="[bold red]Processing Error[/bold red]", border_style="red")
-        self._console.print(panel)
+        rich_console.print(panel)
 
     @staticmethod
     def get_progress_tracker(*args, **kwargs):
@@ -132,6 +266,8 @@ class ConsoleManager:
         Returns:
             A Rich progress tracker.
         """
+        from rich.progress import track as rich_track
+
         return rich_track(*args, **kwargs)
 
     def display_text_in_panel(self, text: str, title: str):
@@ -142,13 +278,19 @@ class ConsoleManager:
             text (str): The text content to display.
             title (str): The title of the panel.
         """
+        rich_console = self._rich_console()
+        if rich_console is None:
+            self._logger.info("%s:\n%s", title, text.strip())
+            return
+        from rich.panel import Panel
+
         panel = Panel(
             text.strip(),
             title=f"[bold yellow]{title}[/bold yellow]",
             border_style="yellow",
             expand=True
         )
-        self._console.print(panel)
+        rich_console.print(panel)
 
 
 # Create a singleton instance of ConsoleManager
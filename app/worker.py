@@ -0,0 +1,174 @@
+# app/worker.py
+# Worker daemon that runs DFTB+ tasks from the shared work queue: python -m app.worker
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import os
+import sys
+import time
+import uuid
+import signal
+import socket
+import asyncio
+from typing import Any, Dict, List
+
+from app.core import config
+from app.core.admission import AdmissionRejected
+from app.core.dftb_runner import local_executor
+from app.core.run_limits import cpu_time_budget
+from app.core.startup import warm_up
+from app.core.work_queue import WorkQueue, file_snapshot, pack_bundle, unpack_bundle, work_queue
+from app.core.workspace import workspace_manager
+from app.utils.logger import console, set_request_id
+
+# Finished tasks whose API node never collected them are deleted after this long.
+PURGE_AFTER_SECONDS = 24 * 3600
+
+
+class Worker:
+    """
+    Pulls tasks from the work queue and runs them with the local executor, so they go
+    through this host's memory admission, process limit and core pinning.
+
+    Each of the `slots` claim loops runs one task at a time. A heartbeat loop renews the
+    leases of the running tasks and stops those the queue no longer assigns to this
+    worker (cancelled, or re-dispatched after a lost lease), killing their DFTB+
+    processes. On SIGTERM/SIGINT the worker stops claiming and exits once its running
+    tasks are finished.
+
+    Before registering, the worker warms up and checks its dftb+ binary (see
+    app.core.startup); a worker whose check fails exits without claiming any task.
+    """
+
+    def __init__(self, queue: WorkQueue, slots: int):
+        self.queue = queue
+        self.slots = slots
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._running: Dict[str, asyncio.Task] = {}
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        if not self._stopping.is_set():
+            console.info("Worker %s stopping after its %d running task(s).", self.worker_id, len(self._running))
+        self._stopping.set()
+
+    async def run(self) -> bool:
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, lambda: warm_up.run(check_dftb=True)):
+            console.error("Worker %s not started: the warm-up failed.", self.worker_id)
+            return False
+        await loop.run_in_executor(None, workspace_manager.start)
+        await loop.run_in_executor(None, self.queue.register_worker, self.worker_id, self.slots)
+        console.success("Worker %s polling %s with %d slot(s).", self.worker_id, self.queue.directory, self.slots)
+        heartbeat = asyncio.create_task(self._heartbeat_loop())
+        try:
+            await asyncio.gather(*(self._claim_loop() for _ in range(self.slots)))
+        finally:
+            heartbeat.cancel()
+            await loop.run_in_executor(None, self.queue.unregister_worker, self.worker_id)
+            await loop.run_in_executor(None, workspace_manager.wait_idle)
+        return True
+
+    async def _claim_loop(self):
+        loop = asyncio.get_running_loop()
+        while not self._stopping.is_set():
+            task = await loop.run_in_executor(None, self.queue.claim, self.worker_id)
+            if task is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), config.QUEUE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            runner = asyncio.create_task(self._process(task))
+            self._running[task["id"]] = runner
+            try:
+                await runner
+            except asyncio.CancelledError:
+                if not runner.cancelled():
+                    raise
+                console.warning("Task %s was withdrawn from this worker.", task["id"])
+            finally:
+                self._running.pop(task["id"], None)
+
+    async def _heartbeat_loop(self):
+        loop = asyncio.get_running_loop()
+        interval = self.queue.lease_seconds / 4
+        last_purge = 0.0
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                lost = await loop.run_in_executor(
+                    None, self.queue.heartbeat, self.worker_id, list(self._running)
+                )
+                if time.time() - last_purge > 3600:
+                    await loop.run_in_executor(None, self.queue.purge, PURGE_AFTER_SECONDS)
+                    last_purge = time.time()
+            except Exception as e:
+                console.warning("Heartbeat of worker %s failed: %s", self.worker_id, e)
+                continue
+            for task_id in lost:
+                runner = self._running.get(task_id)
+                if runner is not None:
+                    runner.cancel()
+
+    async def _process(self, task: Dict[str, Any]):
+        loop = asyncio.get_running_loop()
+        task_id = task["id"]
+        set_request_id(task["payload"].get("request_id") or task_id)
+        if task["attempts"] > 1:
+            console.info("Running task %s again (attempt %d).", task_id, task["attempts"])
+        else:
+            console.info("Running task %s.", task_id)
+
+        error = None
+        result = None
+        try:
+            async with workspace_manager.workspace(task_id) as workspace_dir:
+                await loop.run_in_executor(
+                    None, unpack_bundle, self.queue.bundle_path(task_id, "in"), workspace_dir
+                )
+                inputs = file_snapshot(workspace_dir)
+                run_info: Dict[str, Any] = {}
+                with cpu_time_budget(task["payload"].get("cpu_time_limit_s")):
+                    returncode = await local_executor.execute(workspace_dir, task["payload"]["estimate"], run_info)
+
+                # Ship back only the files the run created or changed
+                outputs = file_snapshot(workspace_dir)
+                written: List[str] = [name for name, state in outputs.items() if inputs.get(name) != state]
+                # Named per attempt, so a worker that lost its lease cannot overwrite the result
+                bundle_path = self.queue.bundle_path(task_id, f"out-{task['attempts']}")
+                await loop.run_in_executor(None, pack_bundle, workspace_dir, bundle_path, written)
+                execution = run_info.get("execution", {})
+                execution.update({"worker": self.worker_id, "host": socket.gethostname()})
+                result = {"returncode": returncode, "execution": execution, "bundle": os.path.basename(bundle_path)}
+        except AdmissionRejected as e:
+            error = str(e)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            console.exception("Task %s failed on worker %s: %s", task_id, self.worker_id, e)
+            error = f"{type(e).__name__}: {e}"
+
+        accepted = await loop.run_in_executor(None, self.queue.finish, task_id, self.worker_id, result, error)
+        if not accepted:
+            console.warning("Result of task %s discarded: the lease is no longer held by this worker.", task_id)
+            if result is not None:
+                try:
+                    os.remove(bundle_path)
+                except FileNotFoundError:
+                    pass
+        elif error is None:
+            console.success("Task %s finished with exit code %d.", task_id, result["returncode"])
+
+
+async def main() -> int:
+    worker = Worker(work_queue, config.WORKER_SLOTS)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, worker.stop)
+    return 0 if await worker.run() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,167 @@
+# benchmarks/bench_hsd_settings.py
+# Compares fixed Gamma-point/default-SCC inputs with the adaptive settings on representative cells.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+#
+# Usage:
+#   python -m benchmarks.bench_hsd_settings --cells si-primitive nacl-cubic si-216 --fmax 0.05
+#
+# Prints the settings chosen for each cell (k-point mesh, SCC tolerance, mixer,
+# smearing, coarse phase). If a real dftb+ is on PATH (and --settings-only is not
+# given), each cell is also optimized twice through the service pipeline:
+#
+#   fixed     Gamma point only, DFTB+ default SCC tolerance and mixer, no smearing,
+#             a single phase (the previous behaviour)
+#   adaptive  the settings of app/core/hsd_settings.py
+#
+# and the geometry steps, SCC iterations (per step), wall time and final energy per atom
+# of both are reported. The cells are strained by 2% and rattled, so the optimizer has
+# work to do.
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+
+def _cells() -> Dict[str, Callable[[], Any]]:
+    from ase.build import bulk
+
+    return {
+        # Small cells where Gamma-only sampling is badly converged
+        "si-primitive": lambda: bulk("Si"),
+        "zno-wurtzite": lambda: bulk("ZnO", "wurtzite", a=3.25, c=5.21),
+        "nacl-cubic": lambda: bulk("NaCl", "rocksalt", a=5.64, cubic=True),
+        # Medium and large supercells, where the mixer settings matter more than k-points
+        "si-216": lambda: bulk("Si", cubic=True).repeat(3),
+        "cu-500": lambda: bulk("Cu", cubic=True).repeat(5),
+    }
+
+
+# DFTB+ defaults at the Gamma point, as written before adaptive settings existed
+FIXED_SETTINGS = {
+    "kpoints": [1, 1, 1],
+    "kpoint_shift": [0.0, 0.0, 0.0],
+    "scc_tolerance": 1e-5,
+    "mixer": "Broyden",
+    "mixing_parameter": 0.2,
+    "max_scc_iterations": 100,
+    "electronic_temperature_K": 0,
+}
+
+
+def _prepare(name: str, seed: int):
+    atoms = _cells()[name]()
+    atoms.set_cell(atoms.cell * 1.02, scale_atoms=True)
+    atoms.rattle(0.05, seed=seed)
+    return atoms
+
+
+def _print_settings(names: List[str], fmax: float):
+    from app.core.hsd_settings import coarse_scc_stage, n_kpoints, select_settings
+
+    print(f"{'cell':<14} {'atoms':>5} {'lengths (A)':>20} {'k-mesh':>9} {'n_k':>4} "
+          f"{'SCC tol':>8} {'mixing':>6} {'max SCC':>7} {'T (K)':>6} {'coarse phase':>16}")
+    for name in names:
+        atoms = _prepare(name, 0)
+        settings = select_settings(atoms, fmax)
+        coarse = coarse_scc_stage(fmax)
+        mesh = "x".join(map(str, settings["kpoints"] or [1, 1, 1]))
+        lengths = " ".join(f"{length:.2f}" for length in atoms.cell.lengths())
+        print(
+            f"{name:<14} {len(atoms):>5} {lengths:>20} {mesh:>9} {n_kpoints(settings):>4} "
+            f"{settings['scc_tolerance']:>8.0e} {settings['mixing_parameter']:>6} "
+            f"{settings['max_scc_iterations']:>7} {settings['electronic_temperature_K']:>6.0f} "
+            f"{'-' if coarse is None else f'{coarse[0]} / {coarse[1]:.0e}':>16}"
+        )
+
+
+async def _optimize(atoms, fmax: float, method: str, fixed: bool) -> Dict[str, Any]:
+    from app.core import config, dftb_runner
+    from app.services import dftb_service
+
+    select_settings = dftb_runner.select_settings
+    coarse_fmax = config.SCC_COARSE_FMAX
+    if fixed:
+        dftb_runner.select_settings = lambda *args, **kwargs: dict(FIXED_SETTINGS)
+        config.SCC_COARSE_FMAX = 0.0
+    workspace_dir = tempfile.mkdtemp(prefix="bench-hsd-")
+    try:
+        start = time.perf_counter()
+        parsed, _, run_info = await dftb_service.optimize_structure(atoms, fmax, method, workspace_dir)
+        wall = time.perf_counter() - start
+    finally:
+        dftb_runner.select_settings = select_settings
+        config.SCC_COARSE_FMAX = coarse_fmax
+        shutil.rmtree(workspace_dir, ignore_errors=True)
+
+    stages = run_info["stages"]
+    steps = sum(stage["geometry_steps"] for stage in stages)
+    scc = sum(stage["scc_iterations"] for stage in stages)
+    energy = parsed["energies_eV"].get("total_energy")
+    return {
+        "stages": len(stages),
+        "geometry_steps": steps,
+        "scc_iterations": scc,
+        "scc_per_step": scc / max(steps, 1),
+        "wall_s": wall,
+        "energy_per_atom_eV": energy / len(atoms) if energy is not None else None,
+        "converged": parsed["summary"].get("convergence_status"),
+    }
+
+
+async def _run(names: List[str], fmax: float, method: str) -> List[Dict[str, Any]]:
+    report = []
+    for name in names:
+        for profile in ("fixed", "adaptive"):
+            result = await _optimize(_prepare(name, 0), fmax, method, fixed=profile == "fixed")
+            report.append({"cell": name, "profile": profile, **result})
+            print(
+                f"{name:<14} {profile:<9} stages={result['stages']} steps={result['geometry_steps']:>4} "
+                f"SCC={result['scc_iterations']:>5} ({result['scc_per_step']:.1f}/step) "
+                f"wall={result['wall_s']:.1f}s E/atom={result['energy_per_atom_eV']} eV ({result['converged']})"
+            )
+    return report
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Fixed versus adaptive DFTB+ electronic settings.")
+    arg_parser.add_argument("--cells", nargs="+", default=["si-primitive", "zno-wurtzite", "nacl-cubic", "si-216"],
+                            choices=sorted(_cells()))
+    arg_parser.add_argument("--fmax", type=float, default=0.05)
+    arg_parser.add_argument("--method", default="GFN1-xTB")
+    arg_parser.add_argument("--settings-only", action="store_true", help="Only print the chosen settings.")
+    arg_parser.add_argument("--json", help="Also write the run report to this file.")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Configure the service before it is imported
+        os.environ.setdefault("DFTBOPT_WORKSPACE_BASE", os.path.join(tmp, "workspace"))
+        os.environ.setdefault("DFTBOPT_RUNS_BASE", os.path.join(tmp, "runs"))
+        os.environ["DFTBOPT_CACHE_MAX_BYTES"] = "0"
+
+        _print_settings(args.cells, args.fmax)
+        if args.settings_only:
+            return 0
+        if shutil.which("dftb+") is None:
+            print("\ndftb+ not found on PATH; skipping the optimization runs.")
+            return 0
+        print()
+        report = asyncio.run(_run(args.cells, args.fmax, args.method))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"arguments": vars(args), "runs": report}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
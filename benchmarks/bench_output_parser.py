@@ -0,0 +1,190 @@
+# benchmarks/bench_output_parser.py
+# Compares the streaming detailed.out parser with the previous whole-file implementation.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+#
+# Usage:
+#   python -m benchmarks.bench_output_parser --sizes-mb 50 200 400
+#
+# Each size generates a synthetic detailed.out made of repeated geometry-step blocks
+# (as written with AppendGeometries = Yes on a large periodic cell), checks that both
+# parsers return identical dictionaries, and reports wall time and peak memory.
+
+import argparse
+import multiprocessing
+import os
+import re
+import resource
+import tempfile
+import time
+from typing import Any, Dict
+
+from app.core.output_parser import parse_detailed_out
+
+
+def parse_detailed_out_legacy(file_path: str) -> Dict[str, Any]:
+    """The previous implementation: reads the whole file and splits it on the final-block marker."""
+    results: Dict[str, Any] = {
+        'summary': {},
+        'convergence_info': {},
+        'electronic_properties': {},
+        'energies_eV': {},
+        'energies_hartree': {}
+    }
+
+    try:
+        with open(file_path, 'r') as f:
+            content = f.read()
+
+        results['summary']['warnings'] = re.findall(r"Warning: (.*)", content)
+        results['summary']['convergence_status'] = "Geometry converged" if "Geometry converged" in content else "Not converged"
+        results['summary']['calculation_status'] = 'Success'
+
+        final_block_marker = "Total Mermin free energy"
+        blocks = content.split(final_block_marker)
+
+        if len(blocks) > 1:
+            final_block = blocks[-1]
+        else:
+            final_block = content
+
+        scc_converged = re.search(r"SCC converged", final_block)
+        results['convergence_info']['scc_converged'] = bool(scc_converged)
+
+        fermi_match = re.search(r"Fermi level:\s*([-\d\.E\+]+)\s*H\s*([-\d\.E\+]+)\s*eV", final_block)
+        if fermi_match:
+            results['electronic_properties']['fermi_level_eV'] = float(fermi_match.group(2))
+
+        charge_match = re.search(r"Total charge:\s*([-\d\.]+)", final_block)
+        if charge_match:
+            results['electronic_properties']['total_charge'] = float(charge_match.group(1))
+
+        dipole_match = re.search(r"Dipole moment:\s*([-\d\.E\+]+)\s*([-\d\.E\+]+)\s*([-\d\.E\+]+)\s*Debye", content)
+        if dipole_match:
+            results['electronic_properties']['dipole_moment_debye'] = {
+                "x": float(dipole_match.group(1)),
+                "y": float(dipole_match.group(2)),
+                "z": float(dipole_match.group(3)),
+            }
+
+        energy_pattern = re.compile(r"^\s*(.+?):\s*([-\d\.E\+]+)\s*H\s*([-\d\.E\+]+)\s*eV", re.MULTILINE)
+        energy_key_map = {
+            "Band energy": "band_energy", "Band free energy (E-TS)": "band_free_energy",
+            "Energy H0": "energy_h0", "Energy SCC": "energy_scc",
+            "Total Electronic energy": "total_electronic_energy",
+            "Repulsive energy": "repulsive_energy", "Total energy": "total_energy",
+            "Total Mermin free energy": "total_mermin_free_energy",
+            "Force related energy": "force_related_energy"
+        }
+
+        for match in energy_pattern.finditer(final_block):
+            key = match.group(1).strip()
+            if key in energy_key_map:
+                json_key = energy_key_map[key]
+                results['energies_hartree'][json_key] = float(match.group(2))
+                results['energies_eV'][json_key] = float(match.group(3))
+
+    except FileNotFoundError:
+        results['summary']['calculation_status'] = 'Failed'
+        results['summary']['error'] = f"File not found: {file_path}"
+    except Exception as e:
+        results['summary']['calculation_status'] = 'Failed'
+        results['summary']['error'] = f"An error occurred during parsing: {str(e)}"
+
+    return results
+
+
+def _step_block(step: int, n_atoms: int) -> str:
+    energy = -280.38 + 1e-4 * step
+    lines = [f"Geometry optimization step: {step}", "", "Total charge:     0.00000000", "",
+             "Atomic gross charges (e)", "Atom           Charge"]
+    lines += [f"{i + 1:5d}  {(-1) ** i * 0.123456:14.8f}" for i in range(n_atoms)]
+    lines += ["", "Atom populations (up)", " Atom       Population"]
+    lines += [f"{i + 1:5d}  {4.0 + (-1) ** i * 0.123456:14.8f}" for i in range(n_atoms)]
+    lines += [
+        "",
+        "Fermi level:                        -0.3855023462 H          -10.4900 eV",
+        f"Band energy:                       {energy / 2:.10f} H        {energy * 13.6057:.4f} eV",
+        "TS:                                  0.0000000000 H            0.0000 eV",
+        f"Band free energy (E-TS):           {energy / 2:.10f} H        {energy * 13.6057:.4f} eV",
+        "",
+        f"Energy H0:                         {energy * 0.9:.10f} H        {energy * 24.49:.4f} eV",
+        "Energy SCC:                          0.0812345678 H            2.2105 eV",
+        f"Total Electronic energy:           {energy:.10f} H        {energy * 27.2114:.4f} eV",
+        "Repulsive energy:                    0.0000000000 H            0.0000 eV",
+        f"Total energy:                      {energy:.10f} H        {energy * 27.2114:.4f} eV",
+        f"Extrapolated to 0:                 {energy:.10f} H        {energy * 27.2114:.4f} eV",
+        f"Total Mermin free energy:          {energy:.10f} H        {energy * 27.2114:.4f} eV",
+        f"Force related energy:              {energy:.10f} H        {energy * 27.2114:.4f} eV",
+        "",
+        "SCC converged",
+        "",
+        "Total Forces",
+    ]
+    lines += [f"{i + 1:5d}  0.001234  -0.000567  0.000890" for i in range(n_atoms)]
+    lines += [
+        "",
+        "Maximal derivative component:  0.123456E-02 au",
+        "",
+        "Dipole moment:   -1.18 -0.01 1.80 au",
+        "Dipole moment:   -3.01 -0.02 4.59 Debye",
+        "",
+        "Warning: dipole moment is not defined absolutely!",
+        "",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def generate_detailed_out(path: str, size_mb: float, n_atoms: int = 2000):
+    target = int(size_mb * 1024 * 1024)
+    written = 0
+    step = 0
+    with open(path, "w") as f:
+        while written < target:
+            block = _step_block(step, n_atoms)
+            f.write(block)
+            written += len(block)
+            step += 1
+        f.write("Geometry converged\n")
+
+
+def _measure(args):
+    """Runs one parser in a fresh process so that peak RSS is attributable to it."""
+    name, path = args
+    parser = parse_detailed_out if name == "streaming" else parse_detailed_out_legacy
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    result = parser(path)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return name, elapsed, max(0, peak_kb - baseline) / 1024, result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--sizes-mb", type=float, nargs="+", default=[50, 200, 400])
+    arg_parser.add_argument("--atoms", type=int, default=2000, help="Atoms per synthetic geometry step.")
+    args = arg_parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'size (MB)':>10} {'parser':>10} {'time (s)':>10} {'peak RSS growth (MB)':>22}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in args.sizes_mb:
+            path = os.path.join(tmp, "detailed.out")
+            generate_detailed_out(path, size_mb, args.atoms)
+            actual_mb = os.path.getsize(path) / 1024 / 1024
+
+            results = {}
+            for name in ("legacy", "streaming"):
+                with ctx.Pool(1) as pool:
+                    name, elapsed, peak_mb, result = pool.apply(_measure, ((name, path),))
+                results[name] = result
+                print(f"{actual_mb:10.1f} {name:>10} {elapsed:10.2f} {peak_mb:22.1f}")
+
+            if results["legacy"] != results["streaming"]:
+                raise SystemExit(f"Parsers disagree on the {size_mb} MB file.")
+
+
+if __name__ == "__main__":
+    main()
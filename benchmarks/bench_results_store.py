@@ -0,0 +1,127 @@
+# benchmarks/bench_results_store.py
+# Times inserts and indexed queries of the results store on a synthetic database.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+#
+# Usage:
+#   python -m benchmarks.bench_results_store --rows 100000 --page 100
+#
+# Fills a fresh SQLite database with synthetic optimization results (a few hundred
+# formulas, both methods, converged and unconverged runs, ~2 KB of parsed results
+# each) through app/services/results_store.py, then reports the insert rate and the
+# p50/p95 latency of typical queries: a fingerprint dedup check, a formula/method
+# lookup, the lowest-energy page, a deep page reached by cursor, and fetching one
+# result with its optimized structure.
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+
+def _payload(index: int, rng: random.Random) -> Dict[str, Any]:
+    formula = f"Si{rng.randint(1, 300)}O{rng.randint(0, 3)}"
+    energy = -100.0 * rng.uniform(1, 80)
+    converged = rng.random() < 0.9
+    return {
+        "request_id": f"bench-{index}",
+        "input_parameters": {
+            "original_filename": f"{formula}.cif",
+            "method": rng.choice(["GFN1-xTB", "GFN2-xTB"]),
+            "fmax_eV_A": 0.05,
+            "prerelax": False,
+        },
+        "detailed_results": {
+            "summary": {
+                "calculation_status": "Success",
+                "convergence_status": "Geometry converged" if converged else "Not converged",
+                "warnings": ["dipole moment is not defined absolutely!"] * 20,
+            },
+            "convergence_info": {"scc_converged": True},
+            "electronic_properties": {"fermi_level_eV": rng.uniform(-6, -3)},
+            "energies_eV": {
+                "total_energy": energy,
+                "total_mermin_free_energy": energy - 0.01,
+                "force_related_energy": energy - 0.01,
+                "band_energy": energy / 3,
+            },
+            "energies_hartree": {"total_energy": energy / 27.211},
+        },
+        "run_info": {
+            "structure": {"formula": formula, "n_atoms": 8, "fingerprint": f"{index % 50000:064x}"},
+            "execution": {"n_atoms": 8, "queue_wait_s": 0.01, "cpu_time_s": 1.2, "max_rss_mb": 80.0},
+            "stages": [{"name": "final", "wall_time_s": rng.uniform(1, 60), "geometry_steps": 12}],
+        },
+    }
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(1000 * (time.perf_counter() - start))
+    return samples
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Results store insert and query latency.")
+    arg_parser.add_argument("--rows", type=int, default=20000)
+    arg_parser.add_argument("--page", type=int, default=100)
+    arg_parser.add_argument("--repeat", type=int, default=50)
+    arg_parser.add_argument("--json", help="Also write the report to this file.")
+    args = arg_parser.parse_args()
+
+    from app.services.results_store import ResultsStore
+
+    rng = random.Random(0)
+    cif = ("data_bench\n" + "Si 0.0 0.0 0.0\n" * 64).encode()
+    report: Dict[str, Any] = {"rows": args.rows}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResultsStore(os.path.join(tmp, "results.sqlite3"))
+        start = time.perf_counter()
+        for index in range(args.rows):
+            store.record(_payload(index, rng), cif)
+        elapsed = time.perf_counter() - start
+        report["inserts_per_s"] = args.rows / elapsed
+        print(f"inserted {args.rows} rows in {elapsed:.1f} s ({args.rows / elapsed:.0f} rows/s), "
+              f"database {os.path.getsize(store.db_path) / 1024 ** 2:.1f} MB")
+
+        def deep_page():
+            cursor = None
+            for _ in range(10):
+                rows = list(store.query({}, "id", False, args.page, cursor))
+                cursor = rows[-1]["next_cursor"]
+
+        queries = {
+            "fingerprint_dedup": lambda: list(store.query({"fingerprint": f"{12345:064x}", "method": "GFN1-xTB"})),
+            "formula_method": lambda: list(store.query({"formula": "Si42O1", "method": "GFN2-xTB"}, limit=args.page)),
+            "lowest_energy_page": lambda: list(store.query(
+                {"convergence_status": "Geometry converged"}, "total_energy_eV", False, args.page
+            )),
+            "tenth_page_by_cursor": deep_page,
+            "get_with_structure": lambda: store.get(f"bench-{args.rows // 2}"),
+        }
+        report["queries_ms"] = {}
+        print(f"{'query':<22} {'p50 ms':>8} {'p95 ms':>8}")
+        for name, fn in queries.items():
+            samples = sorted(_time(fn, args.repeat))
+            p50, p95 = statistics.median(samples), samples[int(0.95 * (len(samples) - 1))]
+            report["queries_ms"][name] = {"p50": p50, "p95": p95}
+            print(f"{name:<22} {p50:8.2f} {p95:8.2f}")
+        store.close()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"arguments": vars(args), **report}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+# benchmarks/bench_scheduler.py
+# Mixed-load turnaround per client with arrival-order (FIFO) and fair-share scheduling.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+#
+# Usage:
+#   python -m benchmarks.bench_scheduler
+#   python -m benchmarks.bench_scheduler --slots 2 --bulk 16 --big-atoms 216 --interactive 3 --small 6
+#
+# One client ("bulk") submits a burst of large structures at once; a few interactive
+# clients then send small structures one after the other while the burst is running.
+# The same load runs in a fresh process per profile:
+#
+#   fifo        DFTBOPT_SCHEDULER_SLOTS=0: runs start in arrival order
+#   fair_share  the fair-share scheduler with one slot per DFTB+ process
+#
+# and the mean and p95 turnaround (request latency) per client, the mean over all
+# requests, the wall time of the whole load and the queue wait the service reports per
+# client (GET /api/v1/optimize/queue/tenants) are printed. DFTB+ is replaced by
+# benchmarks/fake_dftb.py, whose run time grows with the atom count.
+
+import argparse
+import asyncio
+import json
+import os
+import stat
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+FAKE_DFTB = os.path.join(BENCH_DIR, "fake_dftb.py")
+
+
+def _structure(n_atoms: int) -> bytes:
+    from ase.build import bulk
+    from app.utils.file_convertor import atoms_to_cif_bytes
+
+    # Diamond supercell with at least n_atoms atoms (8 atoms per conventional cell)
+    repeat = max(1, int(np.ceil((n_atoms / 8) ** (1 / 3))))
+    return atoms_to_cif_bytes(bulk("C", "diamond", a=3.567, cubic=True).repeat(repeat))
+
+
+async def _load(args) -> Dict[str, Any]:
+    import httpx
+    from app.main import app
+
+    big, small = _structure(args.big_atoms), _structure(args.small_atoms)
+    turnaround: Dict[str, List[float]] = {}
+    failures = 0
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None
+        ) as client:
+            async def optimize(tenant: str, cif: bytes, priority: str):
+                nonlocal failures
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/v1/optimize/",
+                    files={"input_file": ("bench.cif", cif, "chemical/x-cif")},
+                    data={"fmax": "0.1", "priority": priority},
+                    headers={"X-Client-Id": tenant},
+                )
+                turnaround.setdefault(tenant, []).append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    failures += 1
+
+            async def interactive(tenant: str):
+                await asyncio.sleep(args.delay)
+                for _ in range(args.small):
+                    await optimize(tenant, small, "normal")
+                    await asyncio.sleep(args.think_time)
+
+            started = time.perf_counter()
+            await asyncio.gather(
+                *(optimize("bulk", big, args.bulk_priority) for _ in range(args.bulk)),
+                *(interactive(f"interactive-{i}") for i in range(args.interactive)),
+            )
+            wall = time.perf_counter() - started
+            tenants = (await client.get("/api/v1/optimize/queue/tenants")).json()["optimizations"]["tenants"]
+
+    everything = [value for values in turnaround.values() for value in values]
+    return {
+        "wall_s": wall,
+        "failures": failures,
+        "mean_turnaround_s": statistics.mean(everything),
+        "clients": {
+            tenant: {
+                "requests": len(values),
+                "mean_turnaround_s": statistics.mean(values),
+                "p95_turnaround_s": float(np.percentile(values, 95)),
+                "mean_queue_wait_s": tenants.get(tenant, {}).get("mean_queue_wait_s"),
+            }
+            for tenant, values in sorted(turnaround.items())
+        },
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Turnaround per client under mixed load, FIFO vs fair share.")
+    arg_parser.add_argument("--slots", type=int, default=2, help="DFTB+ processes running at once.")
+    arg_parser.add_argument("--bulk", type=int, default=12, help="Large structures the bulk client submits at once.")
+    arg_parser.add_argument("--bulk-priority", choices=["high", "normal", "low"], default="normal")
+    arg_parser.add_argument("--big-atoms", type=int, default=64)
+    arg_parser.add_argument("--interactive", type=int, default=2, help="Clients sending small structures.")
+    arg_parser.add_argument("--small", type=int, default=4, help="Small structures per interactive client.")
+    arg_parser.add_argument("--small-atoms", type=int, default=8)
+    arg_parser.add_argument("--delay", type=float, default=0.3, help="Seconds before the interactive clients start.")
+    arg_parser.add_argument("--think-time", type=float, default=0.1, help="Pause between interactive requests.")
+    arg_parser.add_argument("--dftb-sleep", type=float, default=0.05, help="Fixed run time of the fake dftb+.")
+    arg_parser.add_argument("--sleep-per-atom", type=float, default=0.01, help="Run time of the fake dftb+ per atom.")
+    arg_parser.add_argument("--json", help="Also write the report to this file.")
+    arg_parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(_load(args))))
+        return 0
+
+    report: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        bin_dir = os.path.join(tmp, "bin")
+        os.makedirs(bin_dir)
+        os.chmod(FAKE_DFTB, os.stat(FAKE_DFTB).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+        os.symlink(FAKE_DFTB, os.path.join(bin_dir, "dftb+"))
+        env = dict(os.environ)
+        env.update({
+            "PATH": bin_dir + os.pathsep + env.get("PATH", ""),
+            "PYTHONPATH": os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])),
+            "DFTBOPT_MAX_CONCURRENT_RUNS": str(args.slots),
+            "DFTBOPT_CACHE_MAX_BYTES": "0",
+            "DFTBOPT_WARMUP": "0",
+            "DFTBOPT_LOG_LEVEL": "ERROR",
+            "FAKE_DFTB_SLEEP": str(args.dftb_sleep),
+            "FAKE_DFTB_SLEEP_PER_ATOM": str(args.sleep_per_atom),
+            "FAKE_DFTB_STEPS": "2",
+            "FAKE_DFTB_DETAILED_MB": "0.01",
+        })
+        for profile, slots in (("fifo", "0"), ("fair_share", str(args.slots))):
+            base = os.path.join(tmp, profile)
+            result = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_scheduler", "--child", *sys.argv[1:]],
+                cwd=REPO_DIR, capture_output=True, text=True,
+                env={
+                    **env,
+                    "DFTBOPT_SCHEDULER_SLOTS": slots,
+                    "DFTBOPT_WORKSPACE_BASE": os.path.join(base, "workspace"),
+                    "DFTBOPT_JOBS_BASE": os.path.join(base, "jobs"),
+                    "DFTBOPT_RUNS_BASE": os.path.join(base, "runs"),
+                    "DFTBOPT_RESULTS_DB_PATH": os.path.join(base, "results.sqlite3"),
+                    "DFTBOPT_ADMISSION_MODEL_PATH": os.path.join(base, "admission_model.json"),
+                },
+            )
+            if result.returncode != 0:
+                print(result.stderr[-2000:])
+                return 1
+            level = report[profile] = json.loads(result.stdout.strip().splitlines()[-1])
+
+            print(f"\n{profile}: wall {level['wall_s']:.1f} s, failures {level['failures']}, "
+                  f"mean turnaround {level['mean_turnaround_s']:.2f} s")
+            print(f"  {'client':<16} {'requests':>8} {'mean s':>8} {'p95 s':>8} {'queue wait s':>13}")
+            for tenant, stats in level["clients"].items():
+                wait = stats["mean_queue_wait_s"]
+                print(f"  {tenant:<16} {stats['requests']:>8} {stats['mean_turnaround_s']:>8.2f} "
+                      f"{stats['p95_turnaround_s']:>8.2f} {'-' if wait is None else f'{wait:.2f}':>13}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"arguments": vars(args), **report}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
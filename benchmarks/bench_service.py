@@ -0,0 +1,248 @@
+# benchmarks/bench_service.py
+# Load test of the optimization endpoint against a fake dftb+ binary.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+#
+# Usage:
+#   python -m benchmarks.bench_service --concurrency 1 4 16 --requests 32 \
+#       --atoms 500 --detailed-mb 5 --dftb-sleep 0.2
+#
+# The app is driven in-process through its ASGI interface at each concurrency level,
+# with benchmarks/fake_dftb.py standing in for dftb+ so that the service's own
+# overhead (upload, conversion, HSD generation, parsing, base64, JSON) can be told
+# apart from DFTB+ runtime. Reports request latency and per-stage latency percentiles,
+# throughput, and peak RSS of the service and of the fake DFTB+ processes. The result
+# cache is disabled so every request runs the full pipeline.
+
+import argparse
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import os
+import resource
+import stat
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FAKE_DFTB = os.path.join(BENCH_DIR, "fake_dftb.py")
+
+# Stage timings of the request currently being handled (one dict per request task).
+_request_timings: contextvars.ContextVar = contextvars.ContextVar("request_timings", default=None)
+
+
+class StageTimer:
+    """Collects wall times per stage; wraps module attributes so that callers are timed."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def record(self, stage: str, elapsed: float):
+        self.samples[stage].append(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+    def instrument(self, module, name: str, stage: str = None):
+        stage = stage or name
+        original = getattr(module, name)
+
+        if inspect.iscoroutinefunction(original):
+            @functools.wraps(original)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - start)
+        else:
+            @functools.wraps(original)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - start)
+
+        setattr(module, name, wrapper)
+
+    def instrument_request(self, module, name: str):
+        """Times the whole optimization and derives the service overhead excluding DFTB+."""
+        original = getattr(module, name)
+
+        @functools.wraps(original)
+        async def wrapper(*args, **kwargs):
+            timings: Dict[str, float] = {}
+            token = _request_timings.set(timings)
+            start = time.perf_counter()
+            try:
+                return await original(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                _request_timings.reset(token)
+                self.samples[name].append(elapsed)
+                self.samples["service_overhead"].append(elapsed - timings.get("run_dftb_async", 0.0))
+
+        setattr(module, name, wrapper)
+
+    def reset(self):
+        self.samples.clear()
+
+
+def _percentiles_ms(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples) * 1000
+    return {
+        "count": int(values.size),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+def _peak_rss_mb(who: int) -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def _install_fake_dftb(bin_dir: str):
+    os.chmod(FAKE_DFTB, os.stat(FAKE_DFTB).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.symlink(FAKE_DFTB, os.path.join(bin_dir, "dftb+"))
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+
+
+def _benchmark_structure(n_atoms: int) -> bytes:
+    from ase.build import bulk
+    from app.utils.file_convertor import atoms_to_cif_bytes
+
+    # Diamond supercell with at least n_atoms atoms (8 atoms per conventional cell)
+    repeat = max(1, int(np.ceil((n_atoms / 8) ** (1 / 3))))
+    atoms = bulk("C", "diamond", a=3.567, cubic=True).repeat(repeat)
+    return atoms_to_cif_bytes(atoms)
+
+
+async def _run_level(
+    app, cif: bytes, concurrency: int, n_requests: int, fmax: float, method: str, response_mode: str
+) -> Dict[str, Any]:
+    import httpx
+
+    latencies: List[float] = []
+    failures = 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        async def one_request():
+            nonlocal failures
+            async with gate:
+                start = time.perf_counter()
+                response = await client.post(
+                    "/api/v1/optimize/",
+                    files={"input_file": ("bench.cif", cif, "chemical/x-cif")},
+                    data={"fmax": str(fmax), "method": method, "response_mode": response_mode},
+                )
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    failures += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(n_requests)))
+        wall = time.perf_counter() - start
+
+    return {"wall_s": wall, "latencies": latencies, "failures": failures}
+
+
+async def _main_async(args, app, timer: StageTimer) -> List[Dict[str, Any]]:
+    cif = _benchmark_structure(args.atoms)
+    report = []
+    async with app.router.lifespan_context(app):
+        for concurrency in args.concurrency:
+            timer.reset()
+            level = await _run_level(
+                app, cif, concurrency, args.requests, args.fmax, args.method, args.response_mode
+            )
+            stages = {"request": _percentiles_ms(level["latencies"])}
+            stages.update({stage: _percentiles_ms(samples) for stage, samples in sorted(timer.samples.items())})
+            report.append({
+                "concurrency": concurrency,
+                "requests": args.requests,
+                "failures": level["failures"],
+                "throughput_rps": args.requests / level["wall_s"],
+                "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF),
+                "peak_child_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+                "stages_ms": stages,
+            })
+    return report
+
+
+def _print_report(report: List[Dict[str, Any]]):
+    for level in report:
+        print(
+            f"\nconcurrency={level['concurrency']}  requests={level['requests']}  "
+            f"failures={level['failures']}  throughput={level['throughput_rps']:.2f} req/s  "
+            f"peak RSS={level['peak_rss_mb']:.0f} MB (fake dftb+: {level['peak_child_rss_mb']:.0f} MB)"
+        )
+        print(f"  {'stage':<22} {'n':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+        for stage, p in level["stages_ms"].items():
+            print(f"  {stage:<22} {p['count']:>5} {p['p50']:>10.1f} {p['p95']:>10.1f} {p['p99']:>10.1f} {p['max']:>10.1f}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Load test of the optimization endpoint.")
+    arg_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    arg_parser.add_argument("--requests", type=int, default=32, help="Requests per concurrency level.")
+    arg_parser.add_argument("--atoms", type=int, default=216, help="Minimum atoms in the uploaded structure.")
+    arg_parser.add_argument("--detailed-mb", type=float, default=1.0, help="Size of the fake detailed.out.")
+    arg_parser.add_argument("--dftb-sleep", type=float, default=0.2, help="Run time of the fake dftb+ in seconds.")
+    arg_parser.add_argument("--dftb-steps", type=int, default=5, help="Geometry steps printed by the fake dftb+.")
+    arg_parser.add_argument("--fmax", type=float, default=0.1)
+    arg_parser.add_argument("--method", default="GFN1-xTB")
+    arg_parser.add_argument("--response-mode", choices=["inline", "artifacts"], default="inline",
+                            help="Embed the CIF in the response or return artifact URLs.")
+    arg_parser.add_argument("--json", help="Also write the report to this file.")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Configure the service before it is imported
+        os.environ["DFTBOPT_WORKSPACE_BASE"] = os.path.join(tmp, "workspace")
+        os.environ["DFTBOPT_JOBS_BASE"] = os.path.join(tmp, "jobs")
+        os.environ["DFTBOPT_RUNS_BASE"] = os.path.join(tmp, "runs")
+        # Fake RSS and CPU figures must not calibrate the real admission model
+        os.environ["DFTBOPT_ADMISSION_MODEL_PATH"] = os.path.join(tmp, "admission_model.json")
+        # Fake results must not end up in the results store, where later lookups would find them
+        os.environ["DFTBOPT_RESULTS_DB_PATH"] = os.path.join(tmp, "results.sqlite3")
+        os.environ["DFTBOPT_CACHE_MAX_BYTES"] = "0"
+        os.environ["FAKE_DFTB_SLEEP"] = str(args.dftb_sleep)
+        os.environ["FAKE_DFTB_STEPS"] = str(args.dftb_steps)
+        os.environ["FAKE_DFTB_DETAILED_MB"] = str(args.detailed_mb)
+        os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.dirname(BENCH_DIR), os.environ.get("PYTHONPATH")]))
+        bin_dir = os.path.join(tmp, "bin")
+        os.makedirs(bin_dir)
+        _install_fake_dftb(bin_dir)
+
+        from app.main import app
+        from app.services import dftb_service
+
+        timer = StageTimer()
+        timer.instrument_request(dftb_service, "perform_optimization")
+        for name in ("run_dftb_async", "parse_detailed_out", "read_structure", "preprocess_structure",
+                     "write_gen_file", "read_gen_file", "atoms_to_cif_bytes", "build_response_payload"):
+            timer.instrument(dftb_service, name)
+
+        report = asyncio.run(_main_async(args, app, timer))
+
+    _print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"arguments": vars(args), "levels": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+# benchmarks/bench_single_point.py
+# Compares cold DFTB+ processes per geometry with warm socket-driven processes for single points.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+#
+# Usage:
+#   python -m benchmarks.bench_single_point --geometries 20 --cell si-64
+#   python -m benchmarks.bench_single_point --fake --startup 0.5 --dftb-sleep 0.05
+#
+# A scan of rattled copies of one cell is computed three ways through
+# app/core/socket_driver.py:
+#
+#   cold     one request per geometry, no idle processes kept (a DFTB+ start per geometry)
+#   warm     one request per geometry, processes kept warm between requests
+#   batched  all geometries in one request, on one warm process
+#
+# and the wall time per geometry and the energies of each are reported. Uses the dftb+
+# on PATH, or with --fake benchmarks/fake_dftb.py, whose --startup seconds stand in for
+# the parameter loading and set-up of a real DFTB+ start.
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FAKE_DFTB = os.path.join(BENCH_DIR, "fake_dftb.py")
+
+
+def _cells():
+    from ase.build import bulk, molecule
+
+    def water_box():
+        atoms = molecule("H2O")
+        atoms.center(vacuum=4.0)
+        atoms.pbc = True
+        return atoms
+
+    return {
+        "si-8": lambda: bulk("Si", cubic=True),
+        "si-64": lambda: bulk("Si", cubic=True).repeat(2),
+        "water": water_box,
+    }
+
+
+def _scan(name: str, n: int):
+    base = _cells()[name]()
+    frames = []
+    for seed in range(n):
+        atoms = base.copy()
+        atoms.rattle(0.02, seed=seed)
+        frames.append(atoms)
+    return frames
+
+
+async def _run(frames, method: str) -> List[Dict[str, Any]]:
+    from app.core.socket_driver import SocketPool
+
+    report = []
+    for profile, max_idle, batched in (("cold", 0, False), ("warm", 4, False), ("batched", 4, True)):
+        pool = SocketPool(max_idle, 300)
+        start = time.perf_counter()
+        if batched:
+            records = await pool.evaluate(frames, method)
+        else:
+            records = [(await pool.evaluate([atoms], method))[0] for atoms in frames]
+        wall = time.perf_counter() - start
+        pool.close_all("benchmark finished")
+        stats = pool.stats()
+        report.append({
+            "profile": profile,
+            "geometries": len(frames),
+            "wall_s": wall,
+            "per_geometry_ms": 1000 * wall / len(frames),
+            "processes_started": stats["processes_started"],
+            "energies_eV": [record["energy_eV"] for record in records],
+        })
+        print(f"{profile:<8} {len(frames):>4} geometries  wall={wall:7.2f}s  "
+              f"{1000 * wall / len(frames):8.1f} ms/geometry  processes started={stats['processes_started']}")
+    return report
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Cold versus warm DFTB+ processes for single points.")
+    arg_parser.add_argument("--cell", default="si-8", choices=sorted(_cells()))
+    arg_parser.add_argument("--geometries", type=int, default=10)
+    arg_parser.add_argument("--method", default="GFN1-xTB")
+    arg_parser.add_argument("--fake", action="store_true", help="Use benchmarks/fake_dftb.py instead of dftb+.")
+    arg_parser.add_argument("--startup", type=float, default=0.5, help="Set-up time of the fake dftb+ in seconds.")
+    arg_parser.add_argument("--dftb-sleep", type=float, default=0.05, help="Time per geometry of the fake dftb+.")
+    arg_parser.add_argument("--json", help="Also write the report to this file.")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Configure the service before it is imported
+        os.environ["DFTBOPT_WORKSPACE_BASE"] = os.path.join(tmp, "workspace")
+        os.environ["DFTBOPT_SOCKET_DIR"] = os.path.join(tmp, "ipi")
+        if args.fake:
+            os.environ["FAKE_DFTB_STARTUP"] = str(args.startup)
+            os.environ["FAKE_DFTB_SLEEP"] = str(args.dftb_sleep)
+            os.environ["FAKE_DFTB_STEPS"] = "1"
+            os.environ["PYTHONPATH"] = os.pathsep.join(
+                filter(None, [os.path.dirname(BENCH_DIR), os.environ.get("PYTHONPATH")])
+            )
+            bin_dir = os.path.join(tmp, "bin")
+            os.makedirs(bin_dir)
+            os.chmod(FAKE_DFTB, os.stat(FAKE_DFTB).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+            os.symlink(FAKE_DFTB, os.path.join(bin_dir, "dftb+"))
+            os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+        elif shutil.which("dftb+") is None:
+            print("dftb+ not found on PATH; use --fake to run against benchmarks/fake_dftb.py.")
+            return 1
+
+        report = asyncio.run(_run(_scan(args.cell, args.geometries), args.method))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"arguments": vars(args), "profiles": report}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+# benchmarks/bench_startup.py
+# Measures cold-start cost: import time of app.main, time to ready and first-request latency.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+#
+# Usage:
+#   python -m benchmarks.bench_startup --runs 5
+#   python -m benchmarks.bench_startup --fake --runs 5 --importtime 15
+#
+# Every run starts a fresh Python process (as a container scaled up from zero would)
+# that imports app.main, enters the application lifespan and sends one optimization
+# request followed by a second one. Two profiles are compared:
+#
+#   no_warmup  DFTBOPT_WARMUP=0: ready as soon as the lifespan is up, libraries load on
+#              the first request
+#   warmup     the first request is sent once GET /ready answers 200
+#
+# and the median import time, lifespan start-up, time to ready (import included) and
+# the latencies of the first and second request are reported. Uses the
+# dftb+ on PATH, or with --fake benchmarks/fake_dftb.py. --importtime N also lists the
+# N slowest modules imported by app.main (python -X importtime, cumulative).
+
+import argparse
+import json
+import os
+import shutil
+import stat
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+FAKE_DFTB = os.path.join(BENCH_DIR, "fake_dftb.py")
+
+METRICS = ("import_s", "lifespan_s", "ready_s", "first_request_s", "second_request_s")
+
+# Diamond silicon (8 atoms), written out so the benchmark itself imports nothing from ASE.
+SILICON_CIF = b"""data_Si8
+_cell_length_a 5.43
+_cell_length_b 5.43
+_cell_length_c 5.43
+_cell_angle_alpha 90
+_cell_angle_beta 90
+_cell_angle_gamma 90
+_symmetry_space_group_name_H-M 'P 1'
+loop_
+_atom_site_label
+_atom_site_type_symbol
+_atom_site_fract_x
+_atom_site_fract_y
+_atom_site_fract_z
+Si1 Si 0.00 0.00 0.00
+Si2 Si 0.00 0.50 0.50
+Si3 Si 0.50 0.00 0.50
+Si4 Si 0.50 0.50 0.00
+Si5 Si 0.25 0.25 0.25
+Si6 Si 0.25 0.75 0.75
+Si7 Si 0.75 0.25 0.75
+Si8 Si 0.75 0.75 0.25
+"""
+
+
+def _child() -> Dict[str, Any]:
+    """
+    Runs in the fresh process: one cold start, reported as JSON on stdout. The test
+    client is imported after app.main and its import is not counted; ready_s is the
+    import time plus the time from entering the lifespan to a 200 from /ready.
+    """
+    started = time.perf_counter()
+    import app.main
+
+    report: Dict[str, Any] = {"import_s": time.perf_counter() - started}
+    from fastapi.testclient import TestClient
+
+    started = time.perf_counter()
+    with TestClient(app.main.app) as client:
+        report["lifespan_s"] = time.perf_counter() - started
+        while client.get("/ready").status_code != 200:
+            if app.main.warm_up.state == "failed":
+                raise RuntimeError(f"Warm-up failed: {app.main.warm_up.report()}")
+            time.sleep(0.005)
+        report["ready_s"] = report["import_s"] + time.perf_counter() - started
+        for key in ("first_request_s", "second_request_s"):
+            request_started = time.perf_counter()
+            response = client.post("/api/v1/optimize/", files={"input_file": ("si.cif", SILICON_CIF)})
+            report[key] = time.perf_counter() - request_started
+            if response.status_code != 200:
+                raise RuntimeError(f"Request failed with {response.status_code}: {response.text[:500]}")
+    return report
+
+
+def _importtime(env: Dict[str, str], top: int) -> List[Dict[str, Any]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            modules.append({"module": name.strip(), "cumulative_ms": int(cumulative) / 1000})
+    return sorted(modules, key=lambda m: m["cumulative_ms"], reverse=True)[:top]
+
+
+def main():
+    if "--child" in sys.argv:
+        print(json.dumps(_child()))
+        return 0
+
+    arg_parser = argparse.ArgumentParser(description="Cold-start import, readiness and first-request latency.")
+    arg_parser.add_argument("--runs", type=int, default=3, help="Fresh processes per profile.")
+    arg_parser.add_argument("--fake", action="store_true", help="Use benchmarks/fake_dftb.py instead of dftb+.")
+    arg_parser.add_argument("--dftb-sleep", type=float, default=0.05, help="Run time of the fake dftb+.")
+    arg_parser.add_argument("--importtime", type=int, default=0, metavar="N", help="List the N slowest imports.")
+    arg_parser.add_argument("--json", help="Also write the report to this file.")
+    args = arg_parser.parse_args()
+
+    report: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.update({
+            "PYTHONPATH": os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])),
+            "DFTBOPT_WORKSPACE_BASE": os.path.join(tmp, "workspace"),
+            "DFTBOPT_JOBS_BASE": os.path.join(tmp, "jobs"),
+            "DFTBOPT_RUNS_BASE": os.path.join(tmp, "runs"),
+            "DFTBOPT_CACHE_MAX_BYTES": "0",
+            "DFTBOPT_RESULTS_DB_PATH": os.path.join(tmp, "results.sqlite3"),
+            "DFTBOPT_ADMISSION_MODEL_PATH": os.path.join(tmp, "admission_model.json"),
+            "DFTBOPT_LOG_LEVEL": "ERROR",
+        })
+        if args.fake:
+            env.update({"FAKE_DFTB_SLEEP": str(args.dftb_sleep), "FAKE_DFTB_STEPS": "2", "FAKE_DFTB_DETAILED_MB": "0.01"})
+            bin_dir = os.path.join(tmp, "bin")
+            os.makedirs(bin_dir)
+            os.chmod(FAKE_DFTB, os.stat(FAKE_DFTB).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+            os.symlink(FAKE_DFTB, os.path.join(bin_dir, "dftb+"))
+            env["PATH"] = bin_dir + os.pathsep + env.get("PATH", "")
+        elif shutil.which("dftb+") is None:
+            print("dftb+ not found on PATH; use --fake to run against benchmarks/fake_dftb.py.")
+            return 1
+
+        print(f"{'profile':<10} " + " ".join(f"{name:>17}" for name in METRICS))
+        for profile, warmup in (("no_warmup", "0"), ("warmup", "1")):
+            runs = []
+            for _ in range(args.runs):
+                result = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_startup", "--child"],
+                    cwd=REPO_DIR, env={**env, "DFTBOPT_WARMUP": warmup}, capture_output=True, text=True,
+                )
+                if result.returncode != 0:
+                    print(result.stderr[-2000:])
+                    return 1
+                runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+            medians = {name: statistics.median(run[name] for run in runs) for name in METRICS}
+            report[profile] = {"runs": runs, "median": medians}
+            print(f"{profile:<10} " + " ".join(f"{1000 * medians[name]:14.1f} ms" for name in METRICS))
+
+        if args.importtime:
+            report["slowest_imports"] = _importtime(env, args.importtime)
+            print("\nslowest imports of app.main (cumulative):")
+            for entry in report["slowest_imports"]:
+                print(f"  {entry['cumulative_ms']:8.1f} ms  {entry['module']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"arguments": vars(args), **report}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
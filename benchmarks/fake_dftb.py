@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# benchmarks/fake_dftb.py
+# Configurable stand-in for the dftb+ executable used by the service benchmarks.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+#
+# Behaves like a DFTB+ geometry optimization from the service's point of view: it
+# reads dftb_in.hsd from the working directory, prints per-step progress to stdout,
+# and writes detailed.out, geo_end.gen, geo_end.xyz (one frame per step) and
+# charges.bin. Controlled by environment:
+#
+#   FAKE_DFTB_SLEEP         total run time in seconds, spread over the steps (default 0.5)
+#   FAKE_DFTB_SLEEP_PER_ATOM  extra run time in seconds per atom of the input (default 0)
+#   FAKE_DFTB_STEPS         number of geometry steps (default 5)
+#   FAKE_DFTB_DETAILED_MB   size of detailed.out in MB (default 1)
+#   FAKE_DFTB_EXIT_CODE     exit code to return (default 0)
+#   FAKE_DFTB_BUSY          if set to 1, burn CPU for the run time instead of sleeping
+#   FAKE_DFTB_STARTUP       set-up time in seconds before the first geometry (default 0)
+#
+# geo_end.gen has the size of the input geometry, so the structure uploaded by the
+# benchmark determines it.
+#
+# With "Driver = Socket" in the input it acts as an i-PI client instead: it connects to
+# the UNIX socket named by Prefix and File and answers every geometry with the energy
+# and forces of harmonic springs to the input positions, after FAKE_DFTB_SLEEP divided
+# by FAKE_DFTB_STEPS seconds, until it receives EXIT.
+
+import os
+import re
+import shutil
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from benchmarks.bench_output_parser import generate_detailed_out  # noqa: E402
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _serve_socket(hsd: str, atom_rows, delay: float) -> int:
+    import numpy as np
+    from ase.calculators.socketio import IPIProtocol
+
+    path = re.search(r'Prefix\s*=\s*"([^"]*)"', hsd).group(1) + re.search(r'File\s*=\s*"([^"]+)"', hsd).group(1)
+    reference = np.array([row[2:5] for row in atom_rows], dtype=float)
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(path)
+    protocol = IPIProtocol(client)
+    positions = None
+    print(f"Fake DFTB+ socket client on {path}")
+    while True:
+        message = protocol.recvmsg()
+        if message == "STATUS":
+            protocol.sendmsg("READY" if positions is None else "HAVEDATA")
+        elif message == "POSDATA":
+            _, _, positions = protocol.recvposdata()
+        elif message == "GETFORCE":
+            time.sleep(delay)
+            displacement = positions - reference
+            energy = -7629.5 + 0.5 * float((displacement ** 2).sum())
+            protocol.sendforce(energy, -displacement, np.zeros((3, 3)))
+            positions = None
+        elif message == "EXIT":
+            return 0
+        else:
+            print(f"Unexpected message {message!r}", file=sys.stderr)
+            return 1
+
+
+def main() -> int:
+    with open("dftb_in.hsd", "r") as f:
+        hsd = f.read()
+    input_gen = re.search(r'<<<\s*"([^"]+)"', hsd).group(1)
+    with open(input_gen, "r") as f:
+        gen_lines = f.read().splitlines()
+    n_atoms = int(gen_lines[0].split()[0])
+    species = gen_lines[1].split()
+    atom_rows = [line.split() for line in gen_lines[2:2 + n_atoms]]
+
+    total_sleep = _env_float("FAKE_DFTB_SLEEP", 0.5) + n_atoms * _env_float("FAKE_DFTB_SLEEP_PER_ATOM", 0)
+    steps = max(1, int(_env_float("FAKE_DFTB_STEPS", 5)))
+    detailed_mb = _env_float("FAKE_DFTB_DETAILED_MB", 1)
+    busy = os.environ.get("FAKE_DFTB_BUSY") == "1"
+    time.sleep(_env_float("FAKE_DFTB_STARTUP", 0))
+
+    if re.search(r"Driver\s*=\s*Socket", hsd):
+        return _serve_socket(hsd, atom_rows, total_sleep / steps)
+
+    print(f"Fake DFTB+ run on {n_atoms} atoms ({steps} steps)")
+    trajectory = open("geo_end.xyz", "w")
+    for step in range(steps):
+        if busy:
+            deadline = time.perf_counter() + total_sleep / steps
+            while time.perf_counter() < deadline:
+                pass
+        else:
+            time.sleep(total_sleep / steps)
+        print(f"\n  Geometry step: {step}\n")
+        print("  iSCC Total electronic         Diff electronic      SCC error")
+        for iteration in range(1, 4):
+            print(f"    {iteration}   -0.28038E+03    0.{iteration}E-04    0.{iteration}E-05")
+        print(f"  Total Energy:                    {-280.38 - 1e-4 * step:.10f} H   {-7629.5 - 2.7e-3 * step:.4f} eV")
+        print(f"  Maximal force component:          {0.05 / (step + 1):.6E}")
+        print(f"  Maximal Lattice force component:  {0.01 / (step + 1):.6E}")
+        sys.stdout.flush()
+        trajectory.write(f"{n_atoms}\nGeometry Step: {step}\n")
+        for row in atom_rows:
+            trajectory.write(f"{species[int(row[1]) - 1]} {row[2]} {row[3]} {row[4]}\n")
+    trajectory.close()
+
+    generate_detailed_out("detailed.out", detailed_mb, max(1, min(n_atoms, 2000)))
+    shutil.copyfile(input_gen, "geo_end.gen")
+    with open("charges.bin", "wb") as f:
+        f.write(b"\0" * 8 * n_atoms)
+    print("Geometry converged")
+    return int(_env_float("FAKE_DFTB_EXIT_CODE", 0))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
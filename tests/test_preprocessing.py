@@ -0,0 +1,45 @@
+# tests/test_preprocessing.py
+# Regression tests for the structure checks and reductions before a DFTB+ run.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import json
+
+import numpy as np
+import pytest
+from ase import Atoms
+
+from app.core.preprocessing import preprocess_structure
+
+
+def _silicon() -> Atoms:
+    return Atoms(
+        "Si2", scaled_positions=[[0, 0, 0], [0.25, 0.25, 0.25]],
+        cell=2.715 * np.array([[0, 1, 1], [1, 0, 1], [1, 1, 0]]), pbc=True,
+    )
+
+
+def _slab() -> Atoms:
+    """Si layer periodic in x and y only, with water on top."""
+    return Atoms(
+        "Si2OH2",
+        positions=[[0, 0, 5], [1.9, 1.9, 6.4], [1, 1, 10], [1.76, 1, 10.6], [0.76, 1.76, 10.6]],
+        cell=[3.84, 3.84, 20], pbc=[True, True, False],
+    )
+
+
+@pytest.mark.parametrize("make_atoms", [_silicon, _slab])
+@pytest.mark.parametrize("primitive_cell", [False, True])
+@pytest.mark.parametrize("remove_solvent", [False, True])
+def test_report_is_json_serializable(make_atoms, primitive_cell, remove_solvent):
+    # The report ends up in run_info, which is serialized for responses, jobs and the results store
+    if primitive_cell and make_atoms is _silicon:
+        pytest.importorskip("spglib")
+    _, report = preprocess_structure(make_atoms(), "GFN1-xTB", primitive_cell, remove_solvent)
+    assert json.loads(json.dumps(report)) == report
+
+
+def test_primitive_cell_is_not_applied_to_slabs():
+    _, report = preprocess_structure(_slab(), "GFN1-xTB", primitive_cell=True)
+    assert report["primitive_cell"] is False
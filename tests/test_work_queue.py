@@ -0,0 +1,47 @@
+# tests/test_work_queue.py
+# Regression tests for the cleanup of tasks and bundles on the shared work queue.
+# Author: Shibo Li
+# Date: 2025-06-21
+# Version: 0.1.0
+
+import os
+
+from app.core.work_queue import BUNDLE_DIR, WorkQueue
+
+
+def _submit(queue: WorkQueue, task_id: str):
+    queue.submit(task_id, {})  # also creates the bundle directory
+    open(queue.bundle_path(task_id, "in"), "wb").close()
+
+
+def _bundles(queue: WorkQueue):
+    return sorted(os.listdir(os.path.join(queue.directory, BUNDLE_DIR)))
+
+
+def test_cancelling_a_queued_task_deletes_it(tmp_path):
+    queue = WorkQueue(str(tmp_path), lease_seconds=60, max_attempts=2)
+    _submit(queue, "t1")
+    assert queue.cancel("t1")
+    assert queue.get("t1") is None
+    assert _bundles(queue) == []
+
+
+def test_cancelled_running_task_is_purged_after_its_lease(tmp_path):
+    queue = WorkQueue(str(tmp_path), lease_seconds=0, max_attempts=2)
+    _submit(queue, "t1")
+    assert queue.claim("w1")["id"] == "t1"
+    assert queue.cancel("t1")
+    assert queue.get("t1")["status"] == "cancelled"
+    assert queue.purge(max_age_seconds=3600) == 1
+    assert queue.get("t1") is None
+    assert _bundles(queue) == []
+
+
+def test_remove_deletes_output_bundles_of_every_attempt(tmp_path):
+    queue = WorkQueue(str(tmp_path), lease_seconds=60, max_attempts=3)
+    _submit(queue, "t1")
+    for attempt in (1, 2):
+        open(queue.bundle_path("t1", f"out-{attempt}"), "wb").close()
+    open(queue.bundle_path("t10", "in"), "wb").close()
+    queue.remove("t1")
+    assert _bundles(queue) == ["t10.in.tar.gz"]